@@ -19,6 +19,7 @@ if os.path.exists(job_logs_dir):
     datas.append(('job_logs', 'job_logs'))
 
 # Hidden imports for Flask and other dependencies
+# paramiko and requests are imported lazily (startup.lazy_import), so they must stay listed here
 hiddenimports = [
     'flask',
     'paramiko',
@@ -30,6 +31,7 @@ hiddenimports = [
     'datetime',
     'werkzeug',
     'werkzeug.utils',
+    'waitress',
     'concurrent.futures',
     'urllib3',
     'cryptography',
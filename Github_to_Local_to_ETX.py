@@ -1,120 +1,192 @@
 import os
 import shutil
 import zipfile
-import paramiko
-import requests
 import time
+from command_cache import command_cache
+import job_context
+import settings_store
+import metrics
+import profiling
+import fast_delete
+import file_index
+import path_filter
+from startup import lazy_import
+
+# Loaded on first use, so importing this module (and the dashboard) does not pay for them
+paramiko = lazy_import('paramiko')
+requests = lazy_import('requests')
 
 # ========== CONFIGURABLE VARIABLES ==========
-def load_settings(settings_path="settings.txt"):
-    settings = {}
-    with open(settings_path, "r") as f:
-        lines = f.readlines()
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        if not line or line.startswith("#"):
-            i += 1
-            continue
-        if line.startswith("REMOTE_COMMANDS=") or line.startswith("REMOTE_TARGET_DIRS="):
-            key = line.split("=", 1)[0].strip().upper()
-            values = []
-            val = line[len(key)+1:].strip()
-            if val:
-                values.append(val)
-            i += 1
-            while i < len(lines):
-                cmd_line = lines[i].strip()
-                if not cmd_line or cmd_line.startswith('#'):
-                    i += 1
-                    continue
-                if '=' in cmd_line and not cmd_line.startswith(' '):
-                    break
-                values.append(cmd_line)
-                i += 1
-            settings[key] = values
-            continue
-        if "=" in line:
-            key, value = line.split("=", 1)
-            settings[key.strip().upper()] = value.strip()
-        i += 1
-    # Type conversions
-    if "REMOTE_PORT" in settings:
-        settings["REMOTE_PORT"] = int(settings["REMOTE_PORT"])
-    if "DELETE_FILES" in settings:
-        settings["DELETE_FILES"] = settings["DELETE_FILES"].lower() in ("true", "1", "yes")
-    return settings
+def load_settings(settings_path=None):
+    # Shared cached parser; returns an immutable snapshot
+    return settings_store.load_settings(settings_path)
+
+DEFAULT_PROXIES = {
+    "http": "http://168.219.61.252:",
+    "https": "http://168.219.61.252:8080"
+}
+
+def download_proxies():
+    # GITHUB_PROXY=http://host:port overrides the default proxy; GITHUB_PROXY=none connects directly
+    proxy = load_settings().get("GITHUB_PROXY")
+    if proxy is None:
+        return DEFAULT_PROXIES
+    if proxy.lower() in ('', 'none', 'off'):
+        return {}
+    return {"http": proxy, "https": proxy}
 
+@profiling.traced(detail='url')
 def download_github_zip(url, dest_path):
     print(f"Downloading {url} ...")
-    proxies = {
-        "http": "http://168.219.61.252:",
-        "https": "http://168.219.61.252:8080"
-    }
+    proxies = download_proxies()
     try:
-        response = requests.get(url, proxies=proxies)
+        response = requests.get(url, proxies=proxies, stream=True)
     except requests.exceptions.SSLError as e:
         print(f"SSL error: {e}")
         print("Retrying without certificate verification (NOT SECURE).")
-        response = requests.get(url, verify=False, proxies=proxies)
-    if response.status_code == 200:
-        with open(dest_path, 'wb') as f:
-            f.write(response.content)
-        print(f"Downloaded to {dest_path}")
-    else:
-        print(f"Failed to download: {response.status_code}")
+        response = requests.get(url, verify=False, proxies=proxies, stream=True)
+    try:
+        if response.status_code == 200:
+            with metrics.stage('download'), open(dest_path, 'wb') as f:
+                # Streamed in chunks so a cancelled job stops mid-download
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    job_context.checkpoint()
+                    f.write(chunk)
+                    metrics.record('download', download_bytes=len(chunk))
+            print(f"Downloaded to {dest_path}")
+        else:
+            print(f"Failed to download: {response.status_code}")
+    finally:
+        response.close()
+
+def archive_prefix(members):
+    # GitHub archives hold one top-level folder (e.g. repo-main/); paths inside it are project paths
+    tops = {m.filename.split('/', 1)[0] for m in members}
+    return tops.pop() + '/' if len(tops) == 1 and all('/' in m.filename for m in members) else ''
 
-def unzip_file(zip_path, extract_to):
-    if os.path.exists(extract_to):
-        shutil.rmtree(extract_to)
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(os.path.dirname(extract_to))
+@profiling.traced()
+def unzip_file(zip_path, extract_to, filters=None):
+    # filters: path_filter.PathFilter; members it rejects are never decompressed
+    fast_delete.remove(extract_to)
+    skipped_files = 0
+    skipped_bytes = 0
+    with metrics.stage('unzip'), zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        members = zip_ref.infolist()
+        prefix = archive_prefix(members) if filters else ''
+        for member in members:
+            job_context.checkpoint()
+            if filters and not filters.allows(member.filename[len(prefix):], member.is_dir()):
+                if not member.is_dir():
+                    skipped_files += 1
+                    skipped_bytes += member.file_size
+                continue
+            zip_ref.extract(member, os.path.dirname(extract_to))
+            if not member.is_dir():
+                metrics.record('unzip', extracted_files=1)
+    if skipped_files:
+        print(f"Filtered out {skipped_files} archive files ({skipped_bytes / 1024 / 1024:.1f} MB uncompressed)")
     # The zip will extract to a folder, so we rename/move it to extract_to
     extracted_folder = os.path.join(os.path.dirname(extract_to), os.path.basename(zip_path).replace('.zip', ''))
     if os.path.exists(extracted_folder) and extracted_folder != extract_to:
         shutil.move(extracted_folder, extract_to)
 
-def copy_all(src, dst):
-    if os.path.exists(dst):
-        shutil.rmtree(dst)
-    shutil.copytree(src, dst)
-
-def sftp_upload_dir(sftp, local_dir, remote_dir):
-    # Recursively upload a directory to the remote server, overwriting files
-    total_files = 0
-    success_files = 0
-    failed_files = 0
-    for root, dirs, files in os.walk(local_dir):
-        rel_path = os.path.relpath(root, local_dir)
-        remote_path = os.path.join(remote_dir, rel_path).replace('\\', '/')
+@profiling.traced('copy_file', detail='src')
+def _copy_file(src, dst, *, follow_symlinks=True):
+    job_context.checkpoint()
+    result = shutil.copy2(src, dst, follow_symlinks=follow_symlinks)
+    metrics.record('copy', copied_files=1)
+    return result
+
+@profiling.traced()
+def copy_all(src, dst, filters=None):
+    fast_delete.remove(dst)
+    with metrics.stage('copy'):
+        shutil.copytree(src, dst, copy_function=_copy_file, ignore=filters.copytree_ignore(src) if filters else None)
+
+@profiling.traced(detail='remote_file')
+def sftp_upload_file(sftp, local_file, remote_file, callback=None):
+    # Upload one file and verify its size; returns True on success
+    # callback(bytes_sent, total) is passed to paramiko's put() for progress reporting
+    try:
+        sftp.put(local_file, remote_file, callback=callback)
+        # Verify file size
+        local_size = os.path.getsize(local_file)
+        remote_size = sftp.stat(remote_file).st_size
+        if local_size == remote_size:
+            print(f"Uploaded and verified: {remote_file}")
+            metrics.record('upload', uploaded_files=1, upload_bytes=local_size)
+            return True
+        print(f"WARNING: Size mismatch for {remote_file} (local: {local_size}, remote: {remote_size})")
+    except Exception as e:
+        print(f"Failed to upload {local_file} to {remote_file}: {e}")
+    return False
+
+def sftp_makedirs(sftp, remote_dir):
+    # Recursively create remote directories
+    path = ''
+    for d in remote_dir.strip('/').split('/'):
+        path += '/' + d
         try:
-            sftp.stat(remote_path)
+            sftp.stat(path)
         except FileNotFoundError:
-            sftp.mkdir(remote_path)
-        for file in files:
-            total_files += 1
-            local_file = os.path.join(root, file)
-            remote_file = os.path.join(remote_path, file).replace('\\', '/')
             try:
-                sftp.put(local_file, remote_file)
-                # Verify file size
-                local_size = os.path.getsize(local_file)
-                remote_size = sftp.stat(remote_file).st_size
-                if local_size == remote_size:
-                    print(f"Uploaded and verified: {remote_file}")
-                    success_files += 1
-                else:
-                    print(f"WARNING: Size mismatch for {remote_file} (local: {local_size}, remote: {remote_size})")
-                    failed_files += 1
+                sftp.mkdir(path)
+                print(f"Created remote directory: {path}")
             except Exception as e:
-                print(f"Failed to upload {local_file} to {remote_file}: {e}")
-                failed_files += 1
-    print(f"Upload summary: {success_files}/{total_files} files succeeded, {failed_files} failed.")
+                print(f"Failed to create remote directory {path}: {e}")
+
+@profiling.traced(detail='remote_dir')
+def sftp_upload_dir(sftp, local_dir, remote_dir, files=None, channels=None, filters=None):
+    # Recursively upload a directory to the remote server, overwriting files.
+    # files: relative POSIX paths to upload instead of walking local_dir (incremental uploads)
+    # channels: SFTP channels to upload on (default parallel_upload.UPLOAD_CHANNELS); large files are
+    # split across them (parallel_upload.py)
+    # filters: path_filter.PathFilter; files it rejects are skipped and excluded directories not entered
+    # Returns True when every file was uploaded
+    # Imported here: parallel_upload builds on this module's sftp_upload_file
+    import parallel_upload
+    sizes = {}
+    if files is None:
+        batches = []
+        for root, dirs, names in os.walk(local_dir):
+            rel_path = os.path.relpath(root, local_dir)
+            batches.append((rel_path, filters.filter_walk(rel_path, dirs, names) if filters else names))
+    else:
+        by_dir = {}
+        for rel in files:
+            if filters and not filters.allows(rel):
+                continue
+            parent, _, name = rel.rpartition('/')
+            by_dir.setdefault(parent or '.', []).append(name)
+        batches = sorted(by_dir.items())
+    with metrics.stage('upload') as stage:
+        # Directories first, top-down; the uploader then works on files in size order
+        for rel_path, names in batches:
+            job_context.checkpoint()
+            remote_path = os.path.join(remote_dir, rel_path).replace('\\', '/')
+            try:
+                sftp.stat(remote_path)
+            except FileNotFoundError:
+                if files is None:
+                    sftp.mkdir(remote_path)
+                else:
+                    # Parents may be missing too; os.walk creates them top-down
+                    sftp_makedirs(sftp, remote_path)
+            for file in names:
+                rel = file if rel_path == '.' else f"{rel_path}/{file}".replace('\\', '/')
+                sizes[rel] = os.path.getsize(os.path.join(local_dir, rel_path, file))
+        success_files, failed_files = parallel_upload.upload_files(
+            sftp, local_dir, remote_dir, sizes, int(channels or parallel_upload.UPLOAD_CHANNELS))
+        if failed_files:
+            stage.outcome = 'partial'
+    print(f"Upload summary: {success_files}/{len(sizes)} files succeeded, {failed_files} failed.")
+    return failed_files == 0
 
 def github_zip_url_from_project_url(project_url):
     # e.g. https://github.com/leesihun/SimulGen-VAE -> https://github.com/leesihun/SimulGen-VAE/archive/refs/heads/main.zip
     return project_url.rstrip('/') + '/archive/refs/heads/main.zip'
 
+@profiling.traced()
 def download_github_to_local():
     settings = load_settings()
     PROJECT_URL = settings["PROJECT_URL"]
@@ -122,15 +194,16 @@ def download_github_to_local():
     UNZIP_DIR = settings["UNZIP_DIR"]
     LOCAL_TARGET_DIR = settings["LOCAL_TARGET_DIR"]
     ZIP_URL = github_zip_url_from_project_url(PROJECT_URL)
+    filters = path_filter.from_settings(settings)
     max_retries = 5
     for attempt in range(1, max_retries + 1):
         try:
             print(f"[Attempt {attempt}] Downloading {ZIP_URL} to {ZIP_PATH}...")
             download_github_zip(ZIP_URL, ZIP_PATH)
             print(f"[Attempt {attempt}] Unzipping {ZIP_PATH} to {UNZIP_DIR}...")
-            unzip_file(ZIP_PATH, UNZIP_DIR)
+            unzip_file(ZIP_PATH, UNZIP_DIR, filters)
             print(f"[Attempt {attempt}] Copying files from {UNZIP_DIR} to {LOCAL_TARGET_DIR}...")
-            copy_all(UNZIP_DIR, LOCAL_TARGET_DIR)
+            copy_all(UNZIP_DIR, LOCAL_TARGET_DIR, filters)
             print("Github to Local complete.")
             break
         except Exception as e:
@@ -141,19 +214,34 @@ def download_github_to_local():
             else:
                 print("All attempts failed. Giving up.")
 
-def upload_local_to_etx():
+@profiling.traced()
+def upload_local_to_etx(incremental=None):
+    # incremental: only upload files the local index (file_index.py) saw change since the last
+    # complete upload to each target; None uses the INCREMENTAL_UPLOAD setting
     settings = load_settings()
     LOCAL_SOURCE_DIR = settings["LOCAL_SOURCE_DIR"]
     REMOTE_HOST = settings["REMOTE_HOST"]
     REMOTE_PORT = settings["REMOTE_PORT"]
     REMOTE_USER = settings["REMOTE_USER"]
     REMOTE_PASS = settings["REMOTE_PASS"]
-    REMOTE_TARGET_DIRS = settings["REMOTE_TARGET_DIRS"] if isinstance(settings["REMOTE_TARGET_DIRS"], list) else [settings["REMOTE_TARGET_DIRS"]]
+    REMOTE_TARGET_DIRS = list(settings["REMOTE_TARGET_DIRS"])
+    # snapshot: upload into a new release per target and switch its `current` link (remote_deploy.py)
+    snapshot = str(settings.get("DEPLOY_MODE", "inplace")).lower() == "snapshot"
+    channels = settings.get("UPLOAD_CHANNELS")
+    filters = path_filter.from_settings(settings)
+    if incremental is None:
+        incremental = str(settings.get("INCREMENTAL_UPLOAD", "false")).lower() in ("1", "true", "yes")
+    if incremental and not snapshot:
+        index = file_index.get_index()
+        scan = index.refresh(LOCAL_SOURCE_DIR)
+        print(f"Local index of {LOCAL_SOURCE_DIR}: version {scan['version']}, {scan['changed']} changed and "
+              f"{scan['deleted']} deleted since the last scan ({scan['seconds']:.3f}s)")
     print(f"Uploading {LOCAL_SOURCE_DIR} to remote targets:")
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     try:
-        ssh.connect(REMOTE_HOST, port=REMOTE_PORT, username=REMOTE_USER, password=REMOTE_PASS, timeout=10)
+        metrics.connect_ssh(ssh, hostname=REMOTE_HOST, port=REMOTE_PORT, username=REMOTE_USER, password=REMOTE_PASS,
+                            timeout=10)
         print("SSH connection established.")
     except paramiko.AuthenticationException:
         print("Authentication failed, please verify your credentials.")
@@ -171,42 +259,91 @@ def upload_local_to_etx():
         print(f"Failed to open SFTP session: {e}")
         ssh.close()
         return
-    for REMOTE_TARGET_DIR in REMOTE_TARGET_DIRS:
-        print(f"Uploading to {REMOTE_TARGET_DIR}...")
-        # Ensure remote target dir exists
-        try:
-            sftp.stat(REMOTE_TARGET_DIR)
-        except FileNotFoundError:
-            # Recursively create directories
-            dirs = REMOTE_TARGET_DIR.strip('/').split('/')
-            path = ''
-            for d in dirs:
-                path += '/' + d
+    try:
+        if snapshot:
+            # Imported here: remote_deploy builds on this module's upload helpers
+            import remote_deploy
+            manifest = remote_deploy.build_manifest(LOCAL_SOURCE_DIR, filters)
+        for REMOTE_TARGET_DIR in REMOTE_TARGET_DIRS:
+            print(f"Uploading to {REMOTE_TARGET_DIR}...")
+            if snapshot:
                 try:
-                    sftp.stat(path)
-                except FileNotFoundError:
-                    try:
-                        sftp.mkdir(path)
-                        print(f"Created remote directory: {path}")
-                    except Exception as e:
-                        print(f"Failed to create remote directory {path}: {e}")
+                    remote_deploy.deploy_snapshot(ssh, sftp, LOCAL_SOURCE_DIR, REMOTE_TARGET_DIR, manifest,
+                                                  keep=int(settings.get("DEPLOY_KEEP", remote_deploy.DEFAULT_KEEP)))
+                except Exception as e:
+                    print(f"Error during deployment to {REMOTE_TARGET_DIR}: {e}")
+                continue
+            files = None
+            if incremental:
+                # Changed filters start a new upload history: files they now admit were never sent
+                target_key = f"{REMOTE_USER}@{REMOTE_HOST}:{REMOTE_PORT}{REMOTE_TARGET_DIR}"
+                if filters:
+                    target_key += f"#filters={filters.signature}"
+                plan = index.changed_since(LOCAL_SOURCE_DIR, target_key)
+                if plan['since'] is None:
+                    print(f"No complete upload to {REMOTE_TARGET_DIR} recorded yet; uploading every file")
+                else:
+                    files = plan['changed']
+                    # Like full uploads, files deleted locally are left on the remote host
+                    print(f"{len(files)} file(s) changed and {len(plan['deleted'])} deleted locally "
+                          f"since index version {plan['since']}")
+                    if not files:
+                        print(f"{REMOTE_TARGET_DIR} is up to date.")
                         continue
-        try:
-            sftp_upload_dir(sftp, LOCAL_SOURCE_DIR, REMOTE_TARGET_DIR)
-            print(f"Upload to {REMOTE_TARGET_DIR} completed.")
-        except Exception as e:
-            print(f"Error during file upload to {REMOTE_TARGET_DIR}: {e}")
-            continue
-        # Verification: List remote files
-        try:
-            print(f"Remote directory contents after upload to {REMOTE_TARGET_DIR}:")
-            for entry in sftp.listdir_attr(REMOTE_TARGET_DIR):
-                print(f"  {entry.filename}")
-        except Exception as e:
-            print(f"Could not list remote directory {REMOTE_TARGET_DIR}: {e}")
-    sftp.close()
-    ssh.close()
+            # Ensure remote target dir exists
+            try:
+                sftp.stat(REMOTE_TARGET_DIR)
+            except FileNotFoundError:
+                sftp_makedirs(sftp, REMOTE_TARGET_DIR)
+            try:
+                complete = sftp_upload_dir(sftp, LOCAL_SOURCE_DIR, REMOTE_TARGET_DIR, files=files, channels=channels,
+                                           filters=filters)
+                print(f"Upload to {REMOTE_TARGET_DIR} completed.")
+                if incremental and complete:
+                    # Files changed during the upload have a newer version and go next time
+                    index.mark_uploaded(LOCAL_SOURCE_DIR, target_key, plan['version'])
+            except Exception as e:
+                print(f"Error during file upload to {REMOTE_TARGET_DIR}: {e}")
+                continue
+            # Verification: List remote files
+            try:
+                print(f"Remote directory contents after upload to {REMOTE_TARGET_DIR}:")
+                for entry in sftp.listdir_attr(REMOTE_TARGET_DIR):
+                    print(f"  {entry.filename}")
+            except Exception as e:
+                print(f"Could not list remote directory {REMOTE_TARGET_DIR}: {e}")
+    finally:
+        # Also runs when the job is cancelled part-way through a target
+        sftp.close()
+        ssh.close()
+        # Remote listings cached for the dashboard terminal are stale now
+        command_cache.invalidate_host(REMOTE_HOST)
+
+def watch_and_upload(upload_resources=()):
+    # Push LOCAL_SOURCE_DIR to the targets whenever it changes, until the job is cancelled.
+    # Changes are uploaded once they have settled for WATCH_DEBOUNCE seconds; without the
+    # watchdog package the tree is rescanned every WATCH_INTERVAL seconds instead.
+    # upload_resources: scheduler resources held during each upload (the ones a Local -> ETX
+    # job takes), so uploads never overlap other jobs on the same host or LOCAL_SOURCE_DIR
+    settings = load_settings()
+    LOCAL_SOURCE_DIR = settings["LOCAL_SOURCE_DIR"]
+    debounce = float(settings.get("WATCH_DEBOUNCE", file_index.WATCH_DEBOUNCE))
+    interval = float(settings.get("WATCH_INTERVAL", file_index.WATCH_POLL_INTERVAL))
+    watcher = file_index.Watcher(file_index.get_index(), LOCAL_SOURCE_DIR).start()
+    mode = "filesystem events" if watcher.exact else f"rescans every {interval:g}s"
+    print(f"Watching {LOCAL_SOURCE_DIR} ({mode}, {debounce:g}s debounce); cancel the job to stop.")
+    try:
+        # Catch up with anything that changed while nobody was watching
+        with job_context.hold(upload_resources):
+            upload_local_to_etx(incremental=True)
+        for change in watcher.changes(debounce=debounce, poll_interval=interval):
+            print(f"Detected {change['changed']} changed and {change['deleted']} deleted file(s)")
+            with job_context.hold(upload_resources):
+                upload_local_to_etx(incremental=True)
+    finally:
+        watcher.stop()
 
+@profiling.traced()
 def delete_local_folders():
     settings = load_settings()
     ZIP_PATH = settings["ZIP_PATH"]
@@ -217,9 +354,11 @@ def delete_local_folders():
     for path in [ZIP_PATH, UNZIP_DIR, LOCAL_TARGET_DIR, LOCAL_SOURCE_DIR]:
         if not path:
             continue
+        job_context.checkpoint()
         try:
             if os.path.isdir(path):
-                shutil.rmtree(path)
+                # Renamed into trash next to it; the files are removed in the background
+                fast_delete.remove(path)
                 print(f"Deleted folder: {path}")
             elif os.path.isfile(path):
                 os.remove(path)
@@ -234,3 +373,5 @@ def run_github_to_local_to_etx():
 
 if __name__ == "__main__":
     run_github_to_local_to_etx()
+    # Let background deletes finish rather than leaving trash for the next run's sweep
+    fast_delete.wait()
@@ -2,83 +2,241 @@ import os
 import threading
 import time
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory, stream_with_context
 from werkzeug.utils import secure_filename
 import re
 import json
-import queue
 import uuid
 
 # Import job functions
-from Github_to_Local_to_ETX import download_github_to_local, upload_local_to_etx, delete_local_folders
+from Github_to_Local_to_ETX import download_github_to_local, upload_local_to_etx, delete_local_folders, watch_and_upload
 from run_ETX import run_remote_etx, load_settings, ETXRemoteExecutor
+from streaming_pipeline import run_streaming_pipeline, streaming_supported
+from async_executor import AsyncETXExecutor
+from job_tracker import tracker as job_tracker
+from detached import DetachedRunner
+from command_cache import command_cache
+from log_store import JobLogStore
+from history_store import JobHistoryStore
+from terminal_manager import TerminalSessionManager
+import serving
+from settings_store import get_store, format_settings
+from job_scheduler import JobScheduler, PRIORITIES, host_resource, dir_resource
+import job_context
+import metrics
+import profiling
+import fast_delete
+import startup
 
 app = Flask(__name__)
+# gzip for large JSON/log responses, cache headers for static assets
+serving.install(app)
 LOG_DIR = 'job_logs'
-SETTINGS_FILE = 'settings.txt'
+# settings.txt (or ETX_SETTINGS_FILE), parsed once and re-read only when it changes
+settings_cache = get_store()
+SETTINGS_FILE = settings_cache.path
 
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
-# In-memory job status and logs
+# print() and log records are routed to the log of the job running in the current context
+job_context.install()
+
+# In-memory job status; logs live in a segmented store bounded by a memory budget
 job_status = {}
-job_logs = {}
-job_history = []  # List of dicts: {id, type, start, end, status, log_file}
+# Counters of running jobs, for /job_metrics before they reach the history store
+live_counters = {}
+def _create_log_store():
+    """LOG_SEGMENT_MB sets the size at which a job log is rotated into a new gzip-compressed segment"""
+    try:
+        config = load_settings(SETTINGS_FILE)
+    except Exception:
+        config = {}
+    store = JobLogStore(LOG_DIR, rotate_size=int(float(config.get('LOG_SEGMENT_MB', 16)) * 1024 * 1024))
+    # Compress segments a crash left uncompressed and whole logs written by older versions
+    store.compact()
+    return store
+
+job_logs = _create_log_store()
+# Upper bound for head/tail lines and search matches per request
+MAX_LOG_QUERY_LINES = 10000
+# Largest log chunk sent in one /job_stream event
+STREAM_CHUNK = 256 * 1024
+# Finished and running jobs persist in SQLite, so history survives restarts
+job_history = JobHistoryStore(os.path.join(LOG_DIR, 'job_history.db'))
+
+def _create_scheduler():
+    """Worker pool sized from JOB_WORKERS; HOST_JOB_LIMIT / DIR_JOB_LIMIT bound jobs sharing a host or directory"""
+    try:
+        config = load_settings(SETTINGS_FILE)
+    except Exception:
+        config = {}
+    return JobScheduler(workers=int(config.get('JOB_WORKERS', 2)),
+                        limits={'host': int(config.get('HOST_JOB_LIMIT', 1)),
+                                'dir': int(config.get('DIR_JOB_LIMIT', 1))})
+
+# Jobs run on a fixed worker pool instead of one thread per request
+job_scheduler = _create_scheduler()
+
+def _sweep_trash():
+    """Delete trash a previous run left behind (crash or exit mid-delete) next to the local working dirs"""
+    try:
+        config = load_settings(SETTINGS_FILE)
+    except Exception:
+        return
+    fast_delete.sweep(config.get(key) for key in ('ZIP_PATH', 'UNZIP_DIR', 'LOCAL_TARGET_DIR', 'LOCAL_SOURCE_DIR'))
+
+# Only schedules the deletes; the trash workers remove the files in the background
+_sweep_trash()
+
+# Detached long-running remote commands; state survives dashboard restarts
+detached_runner = DetachedRunner(os.path.join(LOG_DIR, 'detached_jobs.json'))
 
-# Interactive terminal sessions
-terminal_sessions = {}  # session_id -> {executor, input_queue, output_queue, active}
-terminal_outputs = {}   # session_id -> output_text
+def _create_terminal_manager():
+    """TERMINAL_IDLE_TTL (seconds) and TERMINAL_MAX_SESSIONS bound how long and how many sessions stay open"""
+    try:
+        config = load_settings(SETTINGS_FILE)
+    except Exception:
+        config = {}
+    return TerminalSessionManager(os.path.join(LOG_DIR, 'terminal'),
+                                  idle_ttl=float(config.get('TERMINAL_IDLE_TTL', 30 * 60)),
+                                  max_sessions=int(config.get('TERMINAL_MAX_SESSIONS', 20)))
+
+# Interactive terminal sessions; closed and oversized transcripts are spilled to disk
+terminal_manager = _create_terminal_manager()
+
+def terminal_write(session_id, text):
+    """Append to a session transcript and wake long-polling readers"""
+    terminal_manager.write(session_id, text)
+
+def terminal_reset(session_id, text=''):
+    """Replace the transcript (new session or 'clear'); cursors keep increasing across resets"""
+    terminal_manager.reset(session_id, text)
+
+def terminal_set_inactive(session_id):
+    terminal_manager.set_inactive(session_id)
+
+def session_task(session, future, on_result, on_error):
+    """Attach a shared-loop task to a terminal session (closing the session cancels it) and pass its
+    result or exception on when it finishes (nothing when it was cancelled)"""
+    session['tasks'].add(future)
+    def done(f):
+        session['tasks'].discard(f)
+        if f.cancelled():
+            return
+        error = f.exception()
+        if error is not None:
+            on_error(error)
+        else:
+            on_result(f.result())
+    future.add_done_callback(done)
+
+def create_executor(config):
+    """Pick the execution backend from EXECUTION_BACKEND (thread or async)"""
+    if str(config.get('EXECUTION_BACKEND', 'thread')).lower() == 'async':
+        return AsyncETXExecutor(config)
+    return ETXRemoteExecutor(config)
+
+def job_resources(job_type):
+    """Remote hosts and local directories a job touches, used for the scheduler's concurrency limits"""
+    try:
+        config = load_settings(SETTINGS_FILE)
+    except Exception:
+        return []
+    local_keys = {
+        'github_to_local': ['ZIP_PATH', 'UNZIP_DIR', 'LOCAL_TARGET_DIR'],
+        'local_to_etx': ['LOCAL_SOURCE_DIR'],
+        'delete_local_folders': ['ZIP_PATH', 'UNZIP_DIR', 'LOCAL_TARGET_DIR', 'LOCAL_SOURCE_DIR'],
+        'pipeline': ['ZIP_PATH', 'UNZIP_DIR', 'LOCAL_TARGET_DIR', 'LOCAL_SOURCE_DIR'],
+    }.get(job_type, [])
+    # 'watch' runs until cancelled, so it holds no resources itself; it takes the local_to_etx
+    # resources around each upload instead (see watch_and_upload)
+    resources = [dir_resource(config[k]) for k in local_keys if config.get(k)]
+    if job_type in ('local_to_etx', 'pipeline') and config.get('REMOTE_HOST'):
+        resources.append(host_resource(config['REMOTE_HOST']))
+    return resources
 
-# Helper to run a job in a thread and capture logs
-def run_job(job_type, func):
+# Helper to queue a job on the scheduler and capture its logs
+def run_job(job_type, func, priority=0, profile=None):
     job_id = f"{job_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    log_file = os.path.join(LOG_DIR, f"{job_id}.log")
-    job_status[job_id] = 'running'
-    job_logs[job_id] = ''
-    start_time = datetime.now()
+    if job_id in job_status:
+        # Jobs no longer block each other's output, so two can start within the same second
+        job_id = f"{job_id}_{uuid.uuid4().hex[:4]}"
+    submitted = time.time()
     def target():
-        with open(log_file, 'w', encoding='utf-8') as f:
-            def log_writer(msg):
-                f.write(msg)
-                f.flush()
-                job_logs[job_id] += msg
-            # Patch print to capture output
-            import builtins
-            orig_print = builtins.print
-            builtins.print = lambda *args, **kwargs: log_writer(' '.join(str(a) for a in args) + '\n')
+        start_time = time.time()
+        job_status[job_id] = 'running'
+        log_file = job_logs.create(job_id)
+        job_history.record_start(job_id, job_type, start_time, submitted=submitted, log_file=log_file)
+        counters = job_context.JobCounters()
+        live_counters[job_id] = counters
+        error = None
+        def log_writer(msg):
+            # Buffered: the store flushes to disk in batches instead of once per line
+            job_logs.append(job_id, msg)
+        wait = start_time - submitted
+        if wait >= 1:
+            log_writer(f"[queued for {wait:.1f}s]\n")
+        # Only output produced in this job's context (and threads it hands it to) is captured
+        # profile: None, or a profiling mode to trace this run and write profile artifacts next to its log
+        with job_context.capture(log_writer), job_context.counting(counters), \
+                profiling.profiled(job_id, profile, LOG_DIR):
             try:
+                job_context.checkpoint()
                 func()
                 job_status[job_id] = 'success'
+            except job_context.JobCancelled:
+                log_writer("[CANCELLED]\n")
+                job_status[job_id] = 'cancelled'
             except Exception as e:
-                job_status[job_id] = 'error'
                 log_writer(f"[ERROR] {e}\n")
-            finally:
-                builtins.print = orig_print
-                end_time = datetime.now()
-                job_history.append({
-                    'id': job_id,
-                    'type': job_type,
-                    'start': start_time.strftime('%Y-%m-%d %H:%M:%S'),
-                    'end': end_time.strftime('%Y-%m-%d %H:%M:%S'),
-                    'status': job_status[job_id],
-                    'log_file': log_file
-                })
-    t = threading.Thread(target=target, daemon=True)
-    t.start()
-    return job_id
+                job_status[job_id] = 'error'
+                error = str(e)
+        job_history.record_end(job_id, job_status[job_id], time.time(), counters.snapshot(), error)
+        live_counters.pop(job_id, None)
+        # Flush, close and evict the log from memory; wakes streaming viewers
+        job_logs.finish(job_id)
+    def cancelled_while_queued():
+        # Never started: record it as cancelled without running func (no SSH connect in the request thread)
+        now = time.time()
+        job_status[job_id] = 'cancelled'
+        log_file = job_logs.create(job_id)
+        job_history.record_start(job_id, job_type, now, submitted=submitted, log_file=log_file)
+        job_logs.append(job_id, "[CANCELLED before start]\n")
+        job_history.record_end(job_id, 'cancelled', now)
+        job_logs.finish(job_id)
+    job_status[job_id] = 'queued'
+    # Identical jobs share one run: a second click on a queued or running job returns its id.
+    # A profiled request is not identical to an unprofiled one (it must produce its artifacts)
+    key = f"{job_type}:profile={profile}" if profile else job_type
+    scheduled_id = job_scheduler.submit(job_id, job_type, target, priority=priority,
+                                        key=key, resources=job_resources(job_type),
+                                        on_cancel=cancelled_while_queued)
+    if scheduled_id != job_id:
+        job_status.pop(job_id, None)
+    return scheduled_id
 
 @app.route('/')
 def index():
-    return render_template('index.html', settings=read_settings(), job_history=job_history)
+    page = render_template('index.html', settings=read_settings(), job_history=job_history.recent())
+    startup.mark('first page served')
+    return page
 
 @app.route('/run_job', methods=['POST'])
 def run_job_route():
     job_type = request.json.get('job_type')
+    priority = request.json.get('priority', 'normal')
+    priority = PRIORITIES.get(priority, 0) if isinstance(priority, str) else int(priority)
+    profile = request.json.get('profile') or None
+    if profile is not None and profile not in profiling.MODES:
+        return jsonify({'error': f"Unknown profile mode: {profile}"}), 400
     
     if job_type == 'github_to_local':
-        job_id = run_job('github_to_local', download_github_to_local)
+        job_id = run_job('github_to_local', download_github_to_local, priority, profile)
     elif job_type == 'local_to_etx':
-        job_id = run_job('local_to_etx', upload_local_to_etx)
+        job_id = run_job('local_to_etx', upload_local_to_etx, priority, profile)
+    elif job_type == 'watch':
+        job_id = run_job('watch', lambda: watch_and_upload(job_resources('local_to_etx')), priority, profile)
     elif job_type == 'run_etx_commands':
         # Start interactive terminal session and automatically execute "run all"
         try:
@@ -86,115 +244,359 @@ def run_job_route():
             config = load_settings()
             
             # Create executor
-            executor = ETXRemoteExecutor(config)
+            executor = create_executor(config)
             
             # Initialize session for ETX commands with interactive terminal
-            terminal_sessions[session_id] = {
-                'executor': executor,
-                'input_queue': queue.Queue(),
-                'output_queue': queue.Queue(),
-                'active': True,
-                'mode': 'etx_commands_auto',
-                'thread': None
-            }
-            terminal_outputs[session_id] = ""
+            session = terminal_manager.create(session_id, executor, 'etx_commands_auto')
+            
+            def show_combined_result(result=None, error=None):
+                if error is None:
+                    terminal_write(session_id, f"✅ All commands completed successfully\n")
+                    if result and result.strip():
+                        # Show the full output since it's a combined command
+                        output_lines = result.strip().split('\n')
+                        if len(output_lines) > 20:
+                            terminal_write(session_id, f"Output (first 20 lines):\n")
+                            for line in output_lines[:20]:
+                                terminal_write(session_id, f"  {line}\n")
+                            terminal_write(session_id, f"  ... ({len(output_lines)-20} more lines)\n")
+                        else:
+                            terminal_write(session_id, f"Output:\n")
+                            for line in output_lines:
+                                terminal_write(session_id, f"  {line}\n")
+                else:
+                    terminal_write(session_id, f"❌ Combined command failed: {str(error)}\n")
+                
+                terminal_write(session_id, "\n" + "="*60 + "\n")
+                terminal_write(session_id, "🎉 All commands execution completed!\n")
+                terminal_write(session_id, "\n💡 You can now type additional commands or 'exit' to close.\n")
+            
+            # Show terminal interface and auto-execute "run all"; returns the combined command or None
+            def start_etx_commands_session():
+                # Show terminal welcome message
+                terminal_write(session_id, f"🚀 ETX Commands Terminal - Session {session_id[:8]}\n")
+                terminal_write(session_id, f"📋 Connected to: {config.get('REMOTE_HOST', 'Unknown')}\n")
+                terminal_write(session_id, f"👤 User: {config.get('REMOTE_USER', 'Unknown')}\n")
+                terminal_write(session_id, "="*60 + "\n")
+                
+                commands = [cmd for cmd in config.get('REMOTE_COMMANDS', []) if cmd.strip() and not cmd.startswith('#')]
+                if not commands:
+                    terminal_write(session_id, "❌ No commands found in settings.txt\n")
+                    terminal_set_inactive(session_id)
+                    return None
+                
+                terminal_write(session_id, f"📝 Found {len(commands)} commands to execute\n")
+                terminal_write(session_id, "🤖 Automatically executing 'run all' command...\n\n")
+                terminal_write(session_id, "$ run all\n")
+                
+                # Combine all commands into one line with && for execution
+                combined_command = " && ".join(commands)
+                terminal_write(session_id, f"🚀 Running all {len(commands)} commands as one combined command:\n")
+                terminal_write(session_id, "="*60 + "\n")
+                terminal_write(session_id, f"📝 Combined Command: {combined_command}\n")
+                terminal_write(session_id, f"⏳ Executing combined command...\n")
+                return combined_command
+            
+            if isinstance(executor, AsyncETXExecutor):
+                # Async backend: the command streams on the shared event loop, no thread per session
+                combined_command = start_etx_commands_session()
+                if combined_command:
+                    session_task(session, executor.submit_command(combined_command),
+                                 lambda result: show_combined_result(result=result),
+                                 lambda error: show_combined_result(error=error))
+                return jsonify({'job_id': 'etx_commands_terminal', 'terminal_session': session_id})
             
-            # Start session thread that shows terminal interface and auto-executes "run all"
             def run_etx_commands_session():
                 try:
-                    # Show terminal welcome message
-                    terminal_outputs[session_id] += f"🚀 ETX Commands Terminal - Session {session_id[:8]}\n"
-                    terminal_outputs[session_id] += f"📋 Connected to: {config.get('REMOTE_HOST', 'Unknown')}\n"
-                    terminal_outputs[session_id] += f"👤 User: {config.get('REMOTE_USER', 'Unknown')}\n"
-                    terminal_outputs[session_id] += "="*60 + "\n"
-                    
-                    commands = [cmd for cmd in config.get('REMOTE_COMMANDS', []) if cmd.strip() and not cmd.startswith('#')]
-                    if not commands:
-                        terminal_outputs[session_id] += "❌ No commands found in settings.txt\n"
-                        terminal_sessions[session_id]['active'] = False
-                        return
-                    
-                    terminal_outputs[session_id] += f"📝 Found {len(commands)} commands to execute\n"
-                    terminal_outputs[session_id] += "🤖 Automatically executing 'run all' command...\n\n"
-                    
                     # Simulate typing the "run all" command
                     time.sleep(1)
-                    terminal_outputs[session_id] += "$ run all\n"
-                    
-                    # Combine all commands into one line with && for execution
-                    combined_command = " && ".join(commands)
-                    terminal_outputs[session_id] += f"🚀 Running all {len(commands)} commands as one combined command:\n"
-                    terminal_outputs[session_id] += "="*60 + "\n"
-                    terminal_outputs[session_id] += f"📝 Combined Command: {combined_command}\n"
-                    terminal_outputs[session_id] += f"⏳ Executing combined command...\n"
-                    
+                    combined_command = start_etx_commands_session()
+                    if not combined_command:
+                        return
                     try:
-                        result = executor.execute_single_command(combined_command)
-                        terminal_outputs[session_id] += f"✅ All commands completed successfully\n"
-                        if result and result.strip():
-                            # Show the full output since it's a combined command
-                            output_lines = result.strip().split('\n')
-                            if len(output_lines) > 20:
-                                terminal_outputs[session_id] += f"Output (first 20 lines):\n"
-                                for line in output_lines[:20]:
-                                    terminal_outputs[session_id] += f"  {line}\n"
-                                terminal_outputs[session_id] += f"  ... ({len(output_lines)-20} more lines)\n"
-                            else:
-                                terminal_outputs[session_id] += f"Output:\n"
-                                for line in output_lines:
-                                    terminal_outputs[session_id] += f"  {line}\n"
+                        show_combined_result(result=executor.execute_single_command(combined_command))
                     except Exception as e:
-                        terminal_outputs[session_id] += f"❌ Combined command failed: {str(e)}\n"
-                    
-                    terminal_outputs[session_id] += "\n" + "="*60 + "\n"
-                    terminal_outputs[session_id] += "🎉 All commands execution completed!\n"
-                    terminal_outputs[session_id] += "\n💡 You can now type additional commands or 'exit' to close.\n"
+                        show_combined_result(error=e)
                     
                     # Keep session active for additional commands
                     # terminal_sessions[session_id]['active'] = True  # Already set above
                     
                 except Exception as e:
-                    terminal_outputs[session_id] += f"\n❌ Session Error: {str(e)}\n"
-                    terminal_sessions[session_id]['active'] = False
+                    terminal_write(session_id, f"\n❌ Session Error: {str(e)}\n")
+                    terminal_set_inactive(session_id)
             
             # Start the thread
             thread = threading.Thread(target=run_etx_commands_session, daemon=True)
             thread.start()
-            terminal_sessions[session_id]['thread'] = thread
+            session['thread'] = thread
             
             return jsonify({'job_id': 'etx_commands_terminal', 'terminal_session': session_id})
             
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     elif job_type == 'delete_local_folders':
-        job_id = run_job('delete_local_folders', delete_local_folders)
+        job_id = run_job('delete_local_folders', delete_local_folders, priority, profile)
     elif job_type == 'pipeline':
         def pipeline():
-            download_github_to_local()
-            upload_local_to_etx()
+            config = load_settings()
+            if str(config.get('PIPELINE_MODE', 'streaming')).lower() == 'streaming' and streaming_supported(config):
+                run_streaming_pipeline()
+            else:
+                download_github_to_local()
+                upload_local_to_etx()
             run_remote_etx()
-        job_id = run_job('pipeline', pipeline)
+        job_id = run_job('pipeline', pipeline, priority, profile)
     else:
         return jsonify({'error': 'Unknown job type'}), 400
     return jsonify({'job_id': job_id})
 
 @app.route('/job_status/<job_id>')
 def job_status_route(job_id):
-    return jsonify({'status': job_status.get(job_id, 'unknown')})
+    status = job_status.get(job_id)
+    if status is None:
+        # Jobs from before a restart are only in the history store
+        record = job_history.get(job_id)
+        status = record['status'] if record else 'unknown'
+    return jsonify({'status': status})
+
+@app.route('/cancel_job/<job_id>', methods=['POST'])
+def cancel_job_route(job_id):
+    """Cancel a queued job, or ask a running one to stop at its next checkpoint"""
+    state = job_scheduler.cancel(job_id)
+    if state is None:
+        return jsonify({'error': 'Job is not queued or running'}), 404
+    return jsonify({'success': True, 'was': state})
+
+@app.route('/job_queue')
+def job_queue_route():
+    """Scheduler queue depth, wait times and the queued/running jobs"""
+    return jsonify(job_scheduler.stats())
+
+@app.route('/job_metrics/<job_id>')
+def job_metrics_route(job_id):
+    """Per-stage seconds, amounts and rates of one job (live while it runs)"""
+    live = live_counters.get(job_id)
+    if live is not None:
+        status, counters = job_status.get(job_id), live.snapshot()
+    else:
+        record = job_history.get(job_id)
+        if record is None:
+            return jsonify({'error': 'Unknown job'}), 404
+        status, counters = record['status'], record['counters']
+    return jsonify({'job_id': job_id, 'status': status, 'counters': counters,
+                    'stages': metrics.job_summary(counters)})
+
+@app.route('/metrics')
+def metrics_route():
+    """Stage duration histograms and byte/item totals in the Prometheus text format"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/startup_report')
+def startup_report_route():
+    """Startup phase times, slowest imports and modules loaded later on first use"""
+    return jsonify(startup.report())
 
 @app.route('/job_log/<job_id>')
 def job_log_route(job_id):
-    return jsonify({'log': job_logs.get(job_id, '')})
+    """Job log text; ?offset=N&length=M (bytes) returns only that range plus the next offset"""
+    offset = request.args.get('offset', 0, type=int)
+    length = request.args.get('length', type=int)
+    data = job_logs.read(job_id, offset, length)
+    return jsonify({'log': data.decode('utf-8', errors='replace'), 'offset': offset + len(data),
+                    'size': job_logs.size(job_id)})
+
+@app.route('/job_stream/<job_id>')
+def job_stream_route(job_id):
+    """Server-Sent Events stream of new log text and status transitions for a job
+    
+    Each viewer only receives text after its own offset (sent as the event id, so
+    EventSource resumes from Last-Event-ID after a reconnect).
+    """
+    if job_id not in job_status:
+        return jsonify({'error': 'Job not found'}), 404
+    start = request.headers.get('Last-Event-ID') or request.args.get('offset', '0')
+    offset = int(start) if start.isdigit() else 0
+    
+    def stream(offset):
+        last_status = None
+        while True:
+            with job_logs.updated:
+                size = job_logs.size(job_id)
+                status = job_status.get(job_id, 'unknown')
+                if size == offset and status == last_status:
+                    job_logs.updated.wait(timeout=15)
+                    size = job_logs.size(job_id)
+                    status = job_status.get(job_id, 'unknown')
+            sent = False
+            if size > offset:
+                # Bounded events: a new viewer of a large log catches up over several frames
+                length = min(size - offset, STREAM_CHUNK)
+                chunk = job_logs.read(job_id, offset, length)
+                if length < size - offset and b'\n' in chunk:
+                    chunk = chunk[:chunk.rindex(b'\n') + 1]  # don't split a line (or a UTF-8 sequence)
+                if chunk:
+                    offset += len(chunk)
+                    yield f"id: {offset}\nevent: log\ndata: {json.dumps({'text': chunk.decode('utf-8', errors='replace')})}\n\n"
+                    sent = True
+                else:
+                    size = offset
+            # A final status ends the stream, so it waits until the viewer has caught up
+            if status != last_status and offset >= size:
+                last_status = status
+                yield f"event: status\ndata: {json.dumps({'status': status})}\n\n"
+                if status not in ('queued', 'running'):
+                    return
+                sent = True
+            if not sent:
+                yield ": keep-alive\n\n"
+    
+    return Response(stream_with_context(stream(offset)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _parse_time_arg(value):
+    """Epoch seconds, 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' -> epoch seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time: {value}")
 
 @app.route('/job_history')
 def job_history_route():
-    return jsonify({'history': job_history[-20:]})
+    """Newest-first job history; ?type=&status=&since=&until=&limit=&offset= filter and page it"""
+    try:
+        since = _parse_time_arg(request.args.get('since'))
+        until = _parse_time_arg(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result = job_history.query(job_type=request.args.get('type'), status=request.args.get('status'),
+                               since=since, until=until,
+                               limit=request.args.get('limit', 20, type=int),
+                               offset=request.args.get('offset', 0, type=int))
+    for job in result['history']:
+        job['profiles'] = profiling.artifacts(LOG_DIR, job['id'])
+    return jsonify(result)
+
+@app.route('/hpc_jobs')
+def hpc_jobs_route():
+    """State of submitted HPC jobs, refreshed by the batched job tracker"""
+    return jsonify(job_tracker.snapshot())
+
+# Detached remote commands
+
+@app.route('/detached', methods=['GET'])
+def detached_list_route():
+    """List detached commands, including ones launched before a restart"""
+    return jsonify({'jobs': detached_runner.list_jobs()})
+
+@app.route('/detached/start', methods=['POST'])
+def detached_start_route():
+    """Launch a command under setsid/nohup with output to a remote log file"""
+    command = request.json.get('command', '').strip()
+    if not command:
+        return jsonify({'error': 'No command given', 'success': False}), 400
+    try:
+        executor = create_executor(load_settings())
+        job = detached_runner.launch(executor, command, cwd=request.json.get('cwd'))
+        return jsonify({'success': True, 'job': job})
+    except Exception as e:
+        return jsonify({'error': str(e), 'success': False}), 500
+
+def detached_executor(detached_id):
+    """Executor for the host a detached command was launched on, so a settings or profile
+    change since then never points fetch/cancel at another machine; credentials are the current ones"""
+    job = detached_runner.get(detached_id)
+    config = dict(load_settings(), REMOTE_HOST=job['host'], REMOTE_PORT=job['port'], REMOTE_USER=job['user'])
+    return create_executor(config)
+
+@app.route('/detached/output/<detached_id>')
+def detached_output_route(detached_id):
+    """New output after ?offset=N plus the offset to send next time"""
+    offset = request.args.get('offset', 0, type=int)
+    try:
+        return jsonify(detached_runner.fetch(detached_executor(detached_id), detached_id, offset))
+    except KeyError:
+        return jsonify({'error': 'Detached command not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/detached/cancel/<detached_id>', methods=['POST'])
+def detached_cancel_route(detached_id):
+    try:
+        detached_runner.cancel(detached_executor(detached_id), detached_id)
+        return jsonify({'success': True})
+    except KeyError:
+        return jsonify({'error': 'Detached command not found', 'success': False}), 404
+    except Exception as e:
+        return jsonify({'error': str(e), 'success': False}), 500
 
 @app.route('/download_log/<job_id>')
 def download_log(job_id):
-    log_file = os.path.join(LOG_DIR, f"{job_id}.log")
-    if os.path.exists(log_file):
-        return send_from_directory(LOG_DIR, f"{job_id}.log", as_attachment=True)
+    """Job log as a text attachment, decompressed on the fly; a single `Range: bytes=` range gets a 206"""
+    if not job_logs.exists(job_id):
+        return '', 404
+    size = job_logs.size(job_id)
+    start, stop, status = 0, size, 200
+    if request.range is not None and len(request.range.ranges) == 1:
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            return Response(status=416, headers={'Content-Range': f"bytes */{size}"})
+        (start, stop), status = byte_range, 206
+    headers = {'Accept-Ranges': 'bytes', 'Content-Length': str(stop - start),
+               'Content-Disposition': f'attachment; filename="{job_id}.log"'}
+    if status == 206:
+        headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+    return Response(job_logs.iter_bytes(job_id, start, stop), status=status, mimetype='text/plain',
+                    headers=headers)
+
+def _log_lines_arg():
+    return max(0, min(request.args.get('lines', 100, type=int), MAX_LOG_QUERY_LINES))
+
+@app.route('/job_log/<job_id>/head')
+def job_log_head_route(job_id):
+    """First ?lines=N lines (default 100) without reading the rest of the log"""
+    if not job_logs.exists(job_id):
+        return jsonify({'error': 'Log not found'}), 404
+    return jsonify(job_logs.head(job_id, _log_lines_arg()))
+
+@app.route('/job_log/<job_id>/tail')
+def job_log_tail_route(job_id):
+    """Last ?lines=N lines (default 100), read backwards from the end of the log"""
+    if not job_logs.exists(job_id):
+        return jsonify({'error': 'Log not found'}), 404
+    return jsonify(job_logs.tail(job_id, _log_lines_arg()))
+
+@app.route('/job_log/<job_id>/search')
+def job_log_search_route(job_id):
+    """Lines containing ?q= (?regex=1 for a regular expression, ?case=1 to match case), at most ?max=N"""
+    if not job_logs.exists(job_id):
+        return jsonify({'error': 'Log not found'}), 404
+    query = request.args.get('q', '')
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    flags = 0 if request.args.get('case') == '1' else re.IGNORECASE
+    try:
+        pattern = re.compile(query if request.args.get('regex') == '1' else re.escape(query), flags)
+    except re.error as e:
+        return jsonify({'error': f"Invalid regex: {e}"}), 400
+    max_matches = max(1, min(request.args.get('max', 200, type=int), MAX_LOG_QUERY_LINES))
+    return jsonify(job_logs.search(job_id, pattern, max_matches))
+
+@app.route('/download_profile/<job_id>/<kind>')
+def download_profile(job_id, kind):
+    """Trace (trace), cProfile (cprofile) or folded-stack (sample) file of a profiled run"""
+    if kind not in profiling.ARTIFACTS:
+        return '', 404
+    filename = job_id + profiling.ARTIFACTS[kind]
+    if os.path.exists(os.path.join(LOG_DIR, filename)):
+        return send_from_directory(LOG_DIR, filename, as_attachment=True)
     return '', 404
 
 # Settings editor
@@ -202,73 +604,32 @@ def download_log(job_id):
 def settings_route():
     if request.method == 'POST':
         new_settings = request.form.get('settings')
-        with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            f.write(new_settings)
+        # Saving refreshes the cached snapshot right away; running jobs keep the one they started with
+        settings_cache.save(new_settings)
         return jsonify({'success': True})
     else:
         return jsonify({'settings': read_settings()})
 
 def read_settings():
-    with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
-        return f.read()
-
-def parse_settings_txt_to_json(settings_txt):
-    settings = {}
-    key = None
-    values = []
-    for line in settings_txt.splitlines():
-        line = line.strip()
-        if not line or line.startswith('#'):
-            continue
-        if '=' in line:
-            if key:
-                if len(values) == 1:
-                    settings[key] = values[0]
-                else:
-                    settings[key] = values
-            key, value = line.split('=', 1)
-            key = key.strip()
-            value = value.strip()
-            if value:
-                values = [value]
-            else:
-                values = []
-        else:
-            values.append(line)
-    if key:
-        if len(values) == 1:
-            settings[key] = values[0]
-        else:
-            settings[key] = values
-    return settings
-
-def write_settings_json_to_txt(settings):
-    lines = []
-    for k, v in settings.items():
-        if isinstance(v, list):
-            lines.append(f"{k}=")
-            for item in v:
-                lines.append(str(item))
-        else:
-            lines.append(f"{k}={v}")
-    return '\n'.join(lines) + '\n'
+    return settings_cache.text()
 
 @app.route('/settings_json', methods=['GET', 'POST'])
 def settings_json_route():
     if request.method == 'POST':
-        settings = request.json
-        txt = write_settings_json_to_txt(settings)
-        with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            f.write(txt)
+        # The form only posts the fields it shows; keep every other key (DEPLOY_MODE, UPLOAD_CHANNELS, ...)
+        merged = dict(settings_cache.get())
+        merged.update(request.json)
+        settings_cache.save(format_settings(merged))
         return jsonify({'success': True})
     else:
-        with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
-            txt = f.read()
-        settings = parse_settings_txt_to_json(txt)
-        return jsonify(settings)
+        return jsonify(dict(settings_cache.get()))
 
 # Interactive Terminal Routes
 
+def predefined_commands():
+    """REMOTE_COMMANDS from the cached settings snapshot"""
+    return [cmd for cmd in load_settings().get('REMOTE_COMMANDS', ()) if cmd.strip() and not cmd.startswith('#')]
+
 @app.route('/terminal/start', methods=['POST'])
 def start_terminal():
     """Start a new interactive terminal session"""
@@ -280,98 +641,127 @@ def start_terminal():
         config = load_settings()
         
         # Create executor
-        executor = ETXRemoteExecutor(config)
+        executor = create_executor(config)
         
         # Configure mode
         if mode == 'interactive':
             executor.set_interactive_mode(True)
         
         # Initialize session
-        terminal_sessions[session_id] = {
-            'executor': executor,
-            'input_queue': queue.Queue(),
-            'output_queue': queue.Queue(),
-            'active': True,
-            'mode': mode,
-            'thread': None
-        }
-        terminal_outputs[session_id] = ""
+        session = terminal_manager.create(session_id, executor, mode)
+        
+        if mode == 'interactive':
+            # Interactive sessions only print a banner here; commands arrive through /terminal/send
+            terminal_write(session_id, f"🚀 Interactive Terminal Started - Session {session_id[:8]}\n")
+            terminal_write(session_id, f"📋 Connected to: {config.get('REMOTE_HOST', 'Unknown')}\n")
+            terminal_write(session_id, f"👤 User: {config.get('REMOTE_USER', 'Unknown')}\n")
+            terminal_write(session_id, "="*60 + "\n")
+            terminal_write(session_id, "Type commands below or choose from predefined commands:\n\n")
+            
+            # Show available predefined commands
+            commands = config.get('REMOTE_COMMANDS', [])
+            if commands:
+                terminal_write(session_id, f"📝 Available predefined commands ({len(commands)}):\n")
+                for i, cmd in enumerate(commands[:5], 1):
+                    if cmd.strip() and not cmd.startswith('#'):
+                        terminal_write(session_id, f"  {i}. {cmd}\n")
+                if len(commands) > 5:
+                    terminal_write(session_id, f"  ... and {len(commands)-5} more\n")
+                terminal_write(session_id, "\n")
+            
+            terminal_write(session_id, "Ready for commands!\n")
+            return jsonify({'session_id': session_id, 'success': True})
+        
+        # For automated mode, run all commands
+        terminal_write(session_id, f"🤖 Automated Terminal Started - Session {session_id[:8]}\n")
+        terminal_write(session_id, "="*60 + "\n")
+        
+        def show_session_result(success=False, error=None):
+            if error is not None:
+                terminal_write(session_id, f"\n❌ Terminal Error: {str(error)}\n")
+            elif success:
+                terminal_write(session_id, "\n✅ All commands completed successfully!\n")
+            else:
+                terminal_write(session_id, "\n❌ Some commands failed. Check logs for details.\n")
+            terminal_set_inactive(session_id)
+        
+        if isinstance(executor, AsyncETXExecutor):
+            # Async backend: the session is a task on the shared event loop, its output goes to the terminal
+            with job_context.capture(lambda text: terminal_write(session_id, text)):
+                future = executor.submit(executor.execute_commands_async())
+            session_task(session, future, lambda success: show_session_result(success=success),
+                         lambda error: show_session_result(error=error))
+            return jsonify({'session_id': session_id, 'success': True})
         
-        # Start session thread
         def run_terminal_session():
             try:
-                if mode == 'interactive':
-                    # For interactive mode, we'll handle commands as they come
-                    terminal_outputs[session_id] += f"🚀 Interactive Terminal Started - Session {session_id[:8]}\n"
-                    terminal_outputs[session_id] += f"📋 Connected to: {config.get('REMOTE_HOST', 'Unknown')}\n"
-                    terminal_outputs[session_id] += f"👤 User: {config.get('REMOTE_USER', 'Unknown')}\n"
-                    terminal_outputs[session_id] += "="*60 + "\n"
-                    terminal_outputs[session_id] += "Type commands below or choose from predefined commands:\n\n"
-                    
-                    # Show available predefined commands
-                    commands = config.get('REMOTE_COMMANDS', [])
-                    if commands:
-                        terminal_outputs[session_id] += f"📝 Available predefined commands ({len(commands)}):\n"
-                        for i, cmd in enumerate(commands[:5], 1):
-                            if cmd.strip() and not cmd.startswith('#'):
-                                terminal_outputs[session_id] += f"  {i}. {cmd}\n"
-                        if len(commands) > 5:
-                            terminal_outputs[session_id] += f"  ... and {len(commands)-5} more\n"
-                        terminal_outputs[session_id] += "\n"
-                    
-                    terminal_outputs[session_id] += "Ready for commands!\n"
-                    
-                else:
-                    # For automated mode, run all commands
-                    terminal_outputs[session_id] += f"🤖 Automated Terminal Started - Session {session_id[:8]}\n"
-                    terminal_outputs[session_id] += "="*60 + "\n"
-                    success = executor.execute_commands()
-                    
-                    if success:
-                        terminal_outputs[session_id] += "\n✅ All commands completed successfully!\n"
-                    else:
-                        terminal_outputs[session_id] += "\n❌ Some commands failed. Check logs for details.\n"
-                    
-                    terminal_sessions[session_id]['active'] = False
-                    
+                show_session_result(success=executor.execute_commands())
             except Exception as e:
-                terminal_outputs[session_id] += f"\n❌ Terminal Error: {str(e)}\n"
-                terminal_sessions[session_id]['active'] = False
+                show_session_result(error=e)
         
         # Start the thread
         thread = threading.Thread(target=run_terminal_session, daemon=True)
         thread.start()
-        terminal_sessions[session_id]['thread'] = thread
+        session['thread'] = thread
         
         return jsonify({'session_id': session_id, 'success': True})
         
     except Exception as e:
         return jsonify({'error': str(e), 'success': False}), 500
 
+def run_terminal_command(session, session_id, command, show_result):
+    """Run a terminal command through the command cache and hand its result (or error) to show_result
+
+    On the async backend the command is a task on the shared event loop and the request
+    returns right away; the thread backend runs it on the request thread.
+    """
+    def report(outcome):
+        result, cached_age = outcome
+        if cached_age is not None:
+            terminal_write(session_id, f"♻️ Cached result ({cached_age:.0f}s old)\n")
+        show_result(result=result)
+    
+    executor = session['executor']
+    if isinstance(executor, AsyncETXExecutor):
+        session_task(session, executor.submit(command_cache.run_async(executor, command)), report,
+                     lambda error: show_result(error=error))
+        return
+    try:
+        report(command_cache.run(executor, command))
+    except Exception as e:
+        show_result(error=e)
+
 @app.route('/terminal/send', methods=['POST'])
 def send_terminal_command():
     """Send a command to an interactive terminal session"""
     session_id = request.json.get('session_id')
     command = request.json.get('command', '').strip()
     
-    if session_id not in terminal_sessions:
+    session = terminal_manager.get(session_id)
+    if session is None:
         return jsonify({'error': 'Session not found', 'success': False}), 404
     
-    session = terminal_sessions[session_id]
-    
     if not session['active']:
         return jsonify({'error': 'Session is not active', 'success': False}), 400
     
     # Add command to output for display
-    terminal_outputs[session_id] += f"$ {command}\n"
+    terminal_write(session_id, f"$ {command}\n")
+    
+    def show_command_result(result=None, error=None):
+        if error is not None:
+            terminal_write(session_id, f"❌ Command failed: {str(error)}\n")
+            return
+        terminal_write(session_id, f"✅ Command executed successfully\n")
+        if result:
+            terminal_write(session_id, f"Output: {result}\n")
     
     # Handle special commands
     if command.lower() == 'exit':
-        terminal_outputs[session_id] += "👋 Goodbye!\n"
-        session['active'] = False
+        terminal_write(session_id, "👋 Goodbye!\n")
+        terminal_set_inactive(session_id)
         return jsonify({'success': True})
     elif command.lower() == 'help':
-        terminal_outputs[session_id] += """
+        terminal_write(session_id, """
 🚀 Interactive Terminal Help:
   help       - Show this help
   exit       - Exit the terminal session
@@ -380,111 +770,121 @@ def send_terminal_command():
   list       - List predefined commands
   run <n>    - Run predefined command number <n>
   run all    - Run all predefined commands combined with && (1 && 2 && ... && end)
+  detach <c> - Run <c> detached (nohup/setsid) with output in a remote log file
   
 You can also type any shell command directly.
-"""
+""")
         return jsonify({'success': True})
     elif command.lower() == 'clear':
-        terminal_outputs[session_id] = f"🚀 Interactive Terminal - Session {session_id[:8]}\n"
+        terminal_reset(session_id, f"🚀 Interactive Terminal - Session {session_id[:8]}\n")
         return jsonify({'success': True})
     elif command.lower() == 'status':
-        terminal_outputs[session_id] += f"📊 Session Status: {'Active' if session['active'] else 'Inactive'}\n"
-        terminal_outputs[session_id] += f"🔧 Mode: {session['mode']}\n"
+        terminal_write(session_id, f"📊 Session Status: {'Active' if session['active'] else 'Inactive'}\n")
+        terminal_write(session_id, f"🔧 Mode: {session['mode']}\n")
+        stats = command_cache.stats()
+        terminal_write(session_id, f"♻️ Command cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries\n")
         return jsonify({'success': True})
     elif command.lower() == 'list':
-        config = load_settings()
-        commands = [cmd for cmd in config.get('REMOTE_COMMANDS', []) if cmd.strip() and not cmd.startswith('#')]
-        terminal_outputs[session_id] += f"📝 Predefined Commands ({len(commands)}):\n"
+        commands = predefined_commands()
+        terminal_write(session_id, f"📝 Predefined Commands ({len(commands)}):\n")
         for i, cmd in enumerate(commands, 1):
-            terminal_outputs[session_id] += f"  {i}. {cmd}\n"
-        terminal_outputs[session_id] += f"\nUse 'run <number>' to execute a command, or 'run all' to execute all {len(commands)} commands combined with &&.\n"
+            terminal_write(session_id, f"  {i}. {cmd}\n")
+        terminal_write(session_id, f"\nUse 'run <number>' to execute a command, or 'run all' to execute all {len(commands)} commands combined with &&.\n")
+        return jsonify({'success': True})
+    elif command.lower().startswith('detach '):
+        try:
+            job = detached_runner.launch(session['executor'], command.split(' ', 1)[1])
+            terminal_write(session_id, f"🛰️ Detached command {job['id']} started (pid {job['pid']})\n")
+            terminal_write(session_id, f"   Remote log: ~/{job['log_path']} - fetch with /detached/output/{job['id']}\n")
+        except Exception as e:
+            terminal_write(session_id, f"❌ Detach failed: {str(e)}\n")
         return jsonify({'success': True})
     elif command.lower().startswith('run '):
         try:
             cmd_part = command.split(' ', 1)[1]
-            config = load_settings()
-            commands = [cmd for cmd in config.get('REMOTE_COMMANDS', []) if cmd.strip() and not cmd.startswith('#')]
+            commands = predefined_commands()
             
             if cmd_part.lower() == 'all':
                 # Combine all commands into one line with &&
                 combined_command = " && ".join(commands)
-                terminal_outputs[session_id] += f"🚀 Running all {len(commands)} commands as one combined command:\n"
-                terminal_outputs[session_id] += "="*60 + "\n"
-                terminal_outputs[session_id] += f"📝 Combined Command: {combined_command}\n"
-                terminal_outputs[session_id] += f"⏳ Executing combined command...\n"
+                terminal_write(session_id, f"🚀 Running all {len(commands)} commands as one combined command:\n")
+                terminal_write(session_id, "="*60 + "\n")
+                terminal_write(session_id, f"📝 Combined Command: {combined_command}\n")
+                terminal_write(session_id, f"⏳ Executing combined command...\n")
                 
-                try:
-                    executor = session['executor']
-                    result = executor.execute_single_command(combined_command)
-                    terminal_outputs[session_id] += f"✅ All commands completed successfully\n"
-                    if result and result.strip():
-                        # Show the full output since it's a combined command
-                        output_lines = result.strip().split('\n')
-                        if len(output_lines) > 20:
-                            terminal_outputs[session_id] += f"Output (first 20 lines):\n"
-                            for line in output_lines[:20]:
-                                terminal_outputs[session_id] += f"  {line}\n"
-                            terminal_outputs[session_id] += f"  ... ({len(output_lines)-20} more lines)\n"
-                        else:
-                            terminal_outputs[session_id] += f"Output:\n"
-                            for line in output_lines:
-                                terminal_outputs[session_id] += f"  {line}\n"
-                except Exception as e:
-                    terminal_outputs[session_id] += f"❌ Combined command failed: {str(e)}\n"
+                def show_combined_result(result=None, error=None):
+                    if error is None:
+                        terminal_write(session_id, f"✅ All commands completed successfully\n")
+                        if result and result.strip():
+                            # Show the full output since it's a combined command
+                            output_lines = result.strip().split('\n')
+                            if len(output_lines) > 20:
+                                terminal_write(session_id, f"Output (first 20 lines):\n")
+                                for line in output_lines[:20]:
+                                    terminal_write(session_id, f"  {line}\n")
+                                terminal_write(session_id, f"  ... ({len(output_lines)-20} more lines)\n")
+                            else:
+                                terminal_write(session_id, f"Output:\n")
+                                for line in output_lines:
+                                    terminal_write(session_id, f"  {line}\n")
+                    else:
+                        terminal_write(session_id, f"❌ Combined command failed: {str(error)}\n")
+                    
+                    terminal_write(session_id, "\n" + "="*60 + "\n")
+                    terminal_write(session_id, "🎉 All commands execution completed!\n")
                 
-                terminal_outputs[session_id] += "\n" + "="*60 + "\n"
-                terminal_outputs[session_id] += "🎉 All commands execution completed!\n"
+                run_terminal_command(session, session_id, combined_command, show_combined_result)
                 
             else:
                 cmd_num = int(cmd_part)
                 if 1 <= cmd_num <= len(commands):
                     selected_cmd = commands[cmd_num - 1]
-                    terminal_outputs[session_id] += f"🎯 Running command {cmd_num}: {selected_cmd}\n"
+                    terminal_write(session_id, f"🎯 Running command {cmd_num}: {selected_cmd}\n")
                     
                     # Execute the actual command
-                    try:
-                        executor = session['executor']
-                        result = executor.execute_single_command(selected_cmd)
-                        terminal_outputs[session_id] += f"✅ Command executed successfully\n"
-                        if result:
-                            terminal_outputs[session_id] += f"Output: {result}\n"
-                    except Exception as e:
-                        terminal_outputs[session_id] += f"❌ Command failed: {str(e)}\n"
+                    run_terminal_command(session, session_id, selected_cmd, show_command_result)
                 else:
-                    terminal_outputs[session_id] += f"❌ Invalid command number: {cmd_num}\n"
+                    terminal_write(session_id, f"❌ Invalid command number: {cmd_num}\n")
         except ValueError:
-            terminal_outputs[session_id] += f"❌ Invalid command format. Use 'run <number>' or 'run all'\n"
+            terminal_write(session_id, f"❌ Invalid command format. Use 'run <number>' or 'run all'\n")
         return jsonify({'success': True})
     else:
         # Execute actual command via SSH
-        try:
-            executor = session['executor']
-            terminal_outputs[session_id] += f"⏳ Executing: {command}\n"
-            result = executor.execute_single_command(command)
-            terminal_outputs[session_id] += f"✅ Command executed successfully\n"
-            if result:
-                terminal_outputs[session_id] += f"Output: {result}\n"
-        except Exception as e:
-            terminal_outputs[session_id] += f"❌ Command failed: {str(e)}\n"
+        terminal_write(session_id, f"⏳ Executing: {command}\n")
+        run_terminal_command(session, session_id, command, show_command_result)
         return jsonify({'success': True})
 
+@app.route('/terminal/cache_stats')
+def terminal_cache_stats():
+    """Hit/miss statistics of the read-only command cache"""
+    return jsonify(command_cache.stats())
+
+@app.route('/terminal/metrics')
+def terminal_metrics():
+    """Live/active session counts, transcript memory held and reaping counters"""
+    return jsonify(terminal_manager.stats())
+
 @app.route('/terminal/output/<session_id>')
 def get_terminal_output(session_id):
-    """Get terminal output for a session"""
-    if session_id not in terminal_outputs:
-        return jsonify({'error': 'Session not found'}), 404
+    """Get terminal output for a session
     
-    return jsonify({
-        'output': terminal_outputs[session_id],
-        'active': terminal_sessions.get(session_id, {}).get('active', False)
-    })
+    With ?cursor=N only output after cursor N is returned together with the next
+    cursor; 'reset' tells the client its cursor predates a clear and the segment is
+    the whole transcript. ?wait=S long-polls up to S seconds for new output.
+    Closed sessions are served from their spilled transcript.
+    """
+    if not terminal_manager.exists(session_id):
+        return jsonify({'error': 'Session not found'}), 404
+    cursor = request.args.get('cursor', type=int)
+    wait = min(request.args.get('wait', 0, type=float), 30) if cursor is not None else 0
+    return jsonify(terminal_manager.read(session_id, cursor, wait))
 
 @app.route('/terminal/stop/<session_id>', methods=['POST'])
 def stop_terminal(session_id):
-    """Stop a terminal session"""
-    if session_id in terminal_sessions:
-        terminal_sessions[session_id]['active'] = False
-        terminal_outputs[session_id] += "\n🔴 Terminal session stopped.\n"
+    """Stop a terminal session; it is closed and spilled to disk after a short grace period"""
+    if terminal_manager.get(session_id) is not None:
+        terminal_set_inactive(session_id)
+        terminal_write(session_id, "\n🔴 Terminal session stopped.\n")
         return jsonify({'success': True})
     return jsonify({'error': 'Session not found'}), 404
 
@@ -493,8 +893,6 @@ def stop_terminal(session_id):
 def send_static(path):
     return send_from_directory('static', path)
 
-# Flask template auto-reload
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-
+# Templates reload only with debug=True (python app.py); the served dashboard keeps them cached
 if __name__ == '__main__':
     app.run(debug=True, port=5000) 
\ No newline at end of file
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Asyncio execution backend for ETX remote commands
+Drives SSH connect, channel multiplexing and output streaming for many
+sessions from a single event loop thread instead of one thread per session
+"""
+
+from __future__ import annotations
+
+import re
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+from run_ETX import ETXRemoteExecutor, logger
+import job_context
+import metrics
+from startup import lazy_import
+
+paramiko = lazy_import('paramiko')
+
+# Blocking paramiko calls (handshake, auth, channel open) run here; stream I/O stays on the loop
+CONNECT_WORKERS = 8
+# OpenSSH defaults to MaxSessions=10, keep some headroom per transport
+MAX_CHANNELS_PER_TRANSPORT = 8
+READ_CHUNK_SIZE = 32768
+# How often a channel wait inside a cancellable job wakes up to check the job's cancel flag
+CANCEL_POLL_INTERVAL = 0.5
+
+_DONE_MARKER = re.compile(r'__ETX_DONE_(\d+)__')
+
+
+class _EventLoopThread:
+    """Lazily started event loop running forever in a daemon thread"""
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                # Selector loop is required for add_reader() on channel pipes (Proactor lacks it on Windows)
+                loop = asyncio.SelectorEventLoop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                threading.Thread(target=run, name='etx-async-loop', daemon=True).start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+
+_loop_thread = _EventLoopThread()
+_connect_pool = ThreadPoolExecutor(max_workers=CONNECT_WORKERS, thread_name_prefix='etx-connect')
+
+
+class _SharedConnection:
+    """One authenticated SSH client whose transport is shared by many channels"""
+
+    def __init__(self, client: paramiko.SSHClient):
+        self.client = client
+        self.channels = 0
+        self.last_used = time.time()
+
+    @property
+    def alive(self) -> bool:
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+
+# (host, port, user) -> shared connections; only touched from the event loop thread
+_connections: Dict[Tuple[str, int, str], List[_SharedConnection]] = {}
+_connect_locks: Dict[Tuple[str, int, str], asyncio.Lock] = {}
+
+
+class AsyncETXExecutor(ETXRemoteExecutor):
+    """ETXRemoteExecutor backed by one shared asyncio event loop
+
+    Keeps the synchronous ETXRemoteExecutor surface (execute_single_command,
+    execute_commands) so the dashboard can swap it in, and adds coroutine and
+    Future based entry points for driving many command streams concurrently.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.max_channels_per_transport = int(config.get('MAX_CHANNELS_PER_TRANSPORT', MAX_CHANNELS_PER_TRANSPORT))
+        self.idle_connection_timeout = 300
+
+    # ---------- loop plumbing ----------
+
+    def _run(self, coro) -> Any:
+        """Run a coroutine on the shared loop and block the calling thread for its result"""
+        return self.submit(coro).result()
+
+    def submit(self, coro) -> Future:
+        """Schedule a coroutine on the shared loop without blocking
+
+        The caller's job output target, counters and cancel flag go with it, so prints and
+        stage timings from the loop thread still land in the right job and /cancel_job
+        stops the command streams it started.
+        """
+        return asyncio.run_coroutine_threadsafe(job_context.bind(coro, job_context.current_writer(),
+                                                                 job_context.current_counters(),
+                                                                 job_context.current_cancel_event()),
+                                                _loop_thread.get_loop())
+
+    def submit_command(self, command: str, on_output: Optional[Callable[[str], None]] = None) -> Future:
+        """Start a command and return a Future resolving to its formatted output
+
+        on_output is called from the event loop thread with each decoded chunk.
+        """
+        return self.submit(self.execute_single_command_async(command, on_output))
+
+    # ---------- connections and channels ----------
+
+    def _connection_key(self) -> Tuple[str, int, str]:
+        return (self.host, self.port, self.username)
+
+    def _connect_blocking(self) -> paramiko.SSHClient:
+        client, connect_params = self._create_ssh_client()
+        metrics.connect_ssh(client, **connect_params)
+        return client
+
+    async def connect_async(self) -> _SharedConnection:
+        """Return a shared connection with a free channel slot, connecting if needed"""
+        key = self._connection_key()
+        lock = _connect_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            pool = _connections.setdefault(key, [])
+            now = time.time()
+            for conn in list(pool):
+                if not conn.alive or (conn.channels == 0 and now - conn.last_used > self.idle_connection_timeout):
+                    pool.remove(conn)
+                    conn.client.close()
+            for conn in pool:
+                if conn.channels < self.max_channels_per_transport:
+                    conn.channels += 1
+                    return conn
+            logger.info(f"Opening shared SSH transport to {self.host}:{self.port}")
+            loop = asyncio.get_running_loop()
+            client = await loop.run_in_executor(_connect_pool, self._connect_blocking)
+            conn = _SharedConnection(client)
+            conn.channels = 1
+            pool.append(conn)
+            return conn
+
+    def _release(self, conn: _SharedConnection) -> None:
+        conn.channels = max(0, conn.channels - 1)
+        conn.last_used = time.time()
+
+    async def _open_channel(self, conn: _SharedConnection,
+                            setup: Callable[[paramiko.Channel], Any]) -> paramiko.Channel:
+        """Open a channel and run its request (exec/pty/shell) off the loop, as each waits for a reply"""
+        loop = asyncio.get_running_loop()
+        transport = conn.client.get_transport()
+
+        def open_and_setup():
+            channel = transport.open_session(timeout=self.connection_timeout)
+            try:
+                setup(channel)
+            except Exception:
+                channel.close()
+                raise
+            return channel
+
+        return await loop.run_in_executor(_connect_pool, open_and_setup)
+
+    async def _wait_readable(self, channel: paramiko.Channel, timeout: float) -> None:
+        """Wait until the channel has data, EOF or is closed
+
+        Inside a cancellable job the wait wakes every CANCEL_POLL_INTERVAL and raises
+        JobCancelled once the job is cancelled.
+        """
+        job_context.checkpoint()
+        if channel.recv_ready() or channel.recv_stderr_ready() or channel.eof_received or channel.closed:
+            return
+        loop = asyncio.get_running_loop()
+        fd = channel.fileno()
+        readable = loop.create_future()
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                if job_context.current_cancel_event() is not None:
+                    remaining = min(remaining, CANCEL_POLL_INTERVAL)
+                try:
+                    # shield: a timed-out slice must not cancel the future the reader resolves
+                    await asyncio.wait_for(asyncio.shield(readable), remaining)
+                    return
+                except asyncio.TimeoutError:
+                    job_context.checkpoint()
+        finally:
+            loop.remove_reader(fd)
+
+    def _drain(self, channel: paramiko.Channel) -> Tuple[str, str]:
+        out, err = [], []
+        while channel.recv_ready():
+            out.append(channel.recv(READ_CHUNK_SIZE).decode('utf-8', errors='ignore'))
+        while channel.recv_stderr_ready():
+            err.append(channel.recv_stderr(READ_CHUNK_SIZE).decode('utf-8', errors='ignore'))
+        return ''.join(out), ''.join(err)
+
+    # ---------- command execution ----------
+
+    async def stream_command(self, command: str,
+                             on_output: Optional[Callable[[str], None]] = None) -> Tuple[str, str, int]:
+        """Run one command on its own channel and stream output as it arrives
+
+        Returns (stdout, stderr, exit_status).
+        """
+        conn = await self.connect_async()
+        try:
+            channel = await self._open_channel(conn, lambda ch: ch.exec_command(command))
+            try:
+                timeout = self._get_command_timeout(command)
+                deadline = time.monotonic() + timeout
+                stdout, stderr = [], []
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"Command timed out after {timeout}s")
+                    await self._wait_readable(channel, remaining)
+                    out, err = self._drain(channel)
+                    if out:
+                        stdout.append(out)
+                    if err:
+                        stderr.append(err)
+                    if on_output and (out or err):
+                        on_output(out + err)
+                    if (channel.eof_received or channel.closed) and not (channel.recv_ready() or channel.recv_stderr_ready()):
+                        break
+                exit_status = channel.recv_exit_status() if channel.exit_status_ready() else -1
+                return ''.join(stdout), ''.join(stderr), exit_status
+            finally:
+                channel.close()
+        finally:
+            self._release(conn)
+
+    async def execute_single_command_async(self, command: str,
+                                           on_output: Optional[Callable[[str], None]] = None,
+                                           track: bool = True) -> str:
+        """Coroutine equivalent of execute_single_command"""
+        try:
+            logger.info(f"Executing single command: {command}")
+            with metrics.stage('remote_command'):
+                output, error, _ = await self.stream_command(command, on_output)
+            metrics.record('remote_command', remote_commands=1)
+            self._track_job_submission(command, output, track)
+            result = output
+            if error:
+                result += f"\nError: {error}"
+            return result
+        except Exception as e:
+            logger.error(f"Failed to execute command '{command}': {e}")
+            return f"Error: {str(e)}"
+
+    async def _run_block(self, commands: List[str], session_id: str) -> bool:
+        """Run a command block inside one interactive shell channel"""
+        conn = None
+        try:
+            # Inside the try: an unreachable host fails this block instead of the whole gather()
+            conn = await self.connect_async()
+            channel = await self._open_channel(
+                conn, lambda ch: (ch.get_pty(term='xterm', width=132, height=40), ch.invoke_shell()))
+            try:
+                for cmd in ('source ~/.bashrc 2>/dev/null || true',
+                            'source ~/.bash_profile 2>/dev/null || true',
+                            'source ~/.profile 2>/dev/null || true'):
+                    channel.send(f"{cmd}\n")
+                success = True
+                for i, command in enumerate(commands, 1):
+                    command = command.strip()
+                    if not command or command.startswith('#'):
+                        continue
+                    job_context.checkpoint()
+                    logger.info(f"[{session_id}] Command {i}/{len(commands)}: {command}")
+                    # The marker is assembled by printf so the echoed input line never matches it
+                    channel.send(f"{command}\nprintf '__ETX_%s_%s__\\n' DONE $?\n")
+                    with metrics.stage('remote_command') as stage:
+                        output, ok = await self._read_until_marker(channel, self._get_command_timeout(command))
+                        if not ok:
+                            stage.outcome = 'failed'
+                    metrics.record('remote_command', remote_commands=1)
+                    print(output, end='')
+                    if not ok:
+                        logger.error(f"[{session_id}] Command failed or timed out")
+                        success = False
+                channel.send('exit\n')
+                logger.info(f"[{session_id}] Session completed successfully")
+                return success
+            finally:
+                channel.close()
+        except Exception as e:
+            logger.error(f"[{session_id}] Session failed: {str(e)}")
+            self._log_connection_error(e, session_id)
+            return False
+        finally:
+            if conn is not None:
+                self._release(conn)
+
+    async def _read_until_marker(self, channel: paramiko.Channel, timeout: float) -> Tuple[str, bool]:
+        output = ''
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return output, False
+            try:
+                await self._wait_readable(channel, remaining)
+            except asyncio.TimeoutError:
+                return output, False
+            out, err = self._drain(channel)
+            output += out + err
+            match = _DONE_MARKER.search(output)
+            if match:
+                return output[:match.start()], match.group(1) == '0'
+            if channel.closed or channel.eof_received:
+                return output, False
+
+    async def execute_commands_async(self) -> bool:
+        """Run all command blocks concurrently, one shell channel per block"""
+        if not self.commands:
+            logger.warning("No commands to execute")
+            return True
+        blocks = self._split_commands_into_blocks(self.commands)
+        if len(blocks) > 1:
+            logger.info(f"Executing {len(blocks)} command blocks in parallel")
+        results = await asyncio.gather(
+            *(self._run_block(block, f"etx-{i}") for i, block in enumerate(blocks, 1)))
+        for block_id, ok in enumerate(results, 1):
+            if ok:
+                logger.info(f"Block {block_id} completed successfully")
+            else:
+                logger.error(f"Block {block_id} failed")
+        return all(results)
+
+    # ---------- synchronous ETXRemoteExecutor surface ----------
+
+    def execute_single_command(self, command: str, track: bool = True) -> str:
+        """Execute a single command via the shared loop and return the output"""
+        return self._run(self.execute_single_command_async(command, track=track))
+
+    def execute_commands(self) -> bool:
+        """Execute all commands; interactive console mode still uses the threaded path"""
+        if self.interactive_mode:
+            return super().execute_commands()
+        return self._run(self.execute_commands_async())
+
+
+def close_all_connections() -> None:
+    """Close every shared transport held by the async backend"""
+    async def _close():
+        for pool in _connections.values():
+            for conn in pool:
+                conn.client.close()
+        _connections.clear()
+    asyncio.run_coroutine_threadsafe(_close(), _loop_thread.get_loop()).result()
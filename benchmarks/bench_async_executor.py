@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: threaded ETXRemoteExecutor vs AsyncETXExecutor
+Runs N concurrent command sessions against the local SSH stand-in and reports
+sessions/sec, peak thread count and memory per session as JSON.
+
+Usage: python benchmarks/bench_async_executor.py --sessions 200 --latency 0.05
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.ssh_server import start_subprocess
+from run_ETX import ETXRemoteExecutor
+from async_executor import AsyncETXExecutor, close_all_connections
+
+
+def make_config(port):
+    return {
+        'REMOTE_HOST': '127.0.0.1',
+        'REMOTE_PORT': port,
+        'REMOTE_USER': 'bench',
+        'REMOTE_PASS': 'bench',
+        'REMOTE_COMMANDS': ['echo bench'],
+    }
+
+
+class ThreadSampler:
+    """Samples the live thread count in the background"""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def bench_threaded(port, sessions):
+    executors = [ETXRemoteExecutor(make_config(port)) for _ in range(sessions)]
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(lambda e: e.execute_single_command('echo bench'), executors))
+    return results
+
+
+def bench_async(port, sessions):
+    executors = [AsyncETXExecutor(make_config(port)) for _ in range(sessions)]
+    futures = [e.submit_command('echo bench') for e in executors]
+    results = [f.result() for f in futures]
+    close_all_connections()
+    return results
+
+
+def run_case(name, func, port, sessions):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadSampler() as sampler:
+        results = func(port, sessions)
+    elapsed = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    ok = sum(1 for r in results if r.strip() == 'bench')
+    return {
+        'backend': name,
+        'sessions': sessions,
+        'succeeded': ok,
+        'seconds': round(elapsed, 3),
+        'sessions_per_sec': round(sessions / elapsed, 2),
+        'peak_threads': sampler.peak,
+        'peak_traced_bytes_per_session': int(peak_bytes / sessions),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--backend', choices=['thread', 'async', 'both'], default='both')
+    args = parser.parse_args()
+
+    server, port = start_subprocess(args.latency)
+    try:
+        report = []
+        if args.backend in ('thread', 'both'):
+            report.append(run_case('thread', bench_threaded, port, args.sessions))
+        if args.backend in ('async', 'both'):
+            report.append(run_case('async', bench_async, port, args.sessions))
+        print(json.dumps({'benchmark': 'executor_sessions', 'latency': args.latency, 'results': report}, indent=2))
+    finally:
+        server.kill()
+
+
+if __name__ == '__main__':
+    main()
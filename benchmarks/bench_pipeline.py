@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: pipeline stages against local HTTP and SSH/SFTP stand-ins
+Builds synthetic repository archives (many tiny files, a few huge files, a
+mix), serves them from a local HTTP server and uploads to a local SFTP server,
+both with optional injected latency and bandwidth limits, then times
+download_github_to_local, upload_local_to_etx, the sequential and streaming
+pipelines and execute_single_command. Archives are generated from a fixed
+seed, so runs are comparable across commits. Results are JSON; --compare
+checks them against an earlier run and exits 1 on a regression.
+
+Usage:
+  python benchmarks/bench_pipeline.py --trees tiny,huge,mixed --repeat 3 --output results.json
+  python benchmarks/bench_pipeline.py --latency 0.02 --bandwidth 20e6 --compare results.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import zipfile
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import ssh_server, http_server  # noqa: E402
+
+# name -> groups of (file count, file size); --scale multiplies the counts
+TREES = {
+    'tiny': [(2000, 1024)],
+    'huge': [(3, 32 * 1024 * 1024)],
+    'mixed': [(400, 4 * 1024), (50, 256 * 1024), (2, 16 * 1024 * 1024)],
+}
+SEED = 1234
+REMOTE_DIR = '/bench/target'
+
+
+def build_archive(path: str, top: str, groups, scale: float, seed: int = SEED) -> dict:
+    """Write a GitHub-style archive (everything under one top/ folder); returns its file/byte totals"""
+    rng = random.Random(seed)
+    top = top.rstrip('/') + '/'
+    files = total = 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        zf.writestr(top, '')
+        for group, (count, size) in enumerate(groups):
+            for i in range(max(1, int(count * scale))):
+                # Spread files over subdirectories like a real source tree
+                name = f"{top}g{group}/d{i % 37:02d}/f{i:05d}.bin"
+                zf.writestr(name, rng.randbytes(size))
+                files += 1
+                total += size
+    return {'files': files, 'bytes': total}
+
+
+def count_files(path: str) -> int:
+    return sum(len(files) for _, _, files in os.walk(path))
+
+
+def write_settings(path: str, work: str, http_port: int, ssh_port: int, tree: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"""PROJECT_URL=http://127.0.0.1:{http_port}/{tree}/bench
+GITHUB_PROXY=none
+ZIP_PATH={work}/bench-main.zip
+UNZIP_DIR={work}/unzipped
+LOCAL_TARGET_DIR={work}/local
+LOCAL_SOURCE_DIR={work}/local
+REMOTE_HOST=127.0.0.1
+REMOTE_PORT={ssh_port}
+REMOTE_USER=bench
+REMOTE_PASS=bench
+REMOTE_TARGET_DIRS=
+{REMOTE_DIR}
+REMOTE_COMMANDS=
+echo bench
+""")
+
+
+def summarize(runs, nbytes=None, files=None) -> dict:
+    median = statistics.median(runs)
+    result = {'runs': [round(r, 4) for r in runs], 'min': round(min(runs), 4), 'median': round(median, 4),
+              'mean': round(statistics.fmean(runs), 4)}
+    if nbytes is not None:
+        result['bytes'] = nbytes
+        result['mb_per_sec'] = round(nbytes / median / 1e6, 2) if median > 0 else None
+    if files is not None:
+        result['files'] = files
+        result['files_per_sec'] = round(files / median, 1) if median > 0 else None
+    return result
+
+
+def timed(func, check, repeat: int, prepare=None, output=None) -> tuple:
+    """Run func `repeat` times inside a silent job context; returns (seconds per run, stage summary)"""
+    import job_context
+    import metrics
+    runs, stages = [], {}
+    for _ in range(repeat):
+        if prepare:
+            prepare()
+        counters = job_context.JobCounters()
+        with job_context.capture(output or (lambda text: None)), job_context.counting(counters):
+            start = time.perf_counter()
+            func()
+            runs.append(time.perf_counter() - start)
+        check()
+        stages = metrics.job_summary(counters.snapshot())
+    return runs, stages
+
+
+def run_suite(args) -> dict:
+    work_root = tempfile.mkdtemp(prefix='etx_bench_')
+    http_root = os.path.join(work_root, 'http')
+    sftp_root = os.path.join(work_root, 'sftp')
+    work = os.path.join(work_root, 'work')
+    for d in (http_root, sftp_root, work):
+        os.makedirs(d)
+    settings_path = os.path.join(work_root, 'settings.txt')
+    os.environ['ETX_SETTINGS_FILE'] = settings_path
+    # run_ETX opens run_etx.log in the working directory on import
+    os.chdir(work_root)
+
+    archives = {}
+    for tree in args.trees:
+        target = os.path.join(http_root, tree, 'bench', 'archive', 'refs', 'heads')
+        os.makedirs(target)
+        # GitHub names the folder inside <repo>/archive/refs/heads/main.zip "<repo>-main"
+        archives[tree] = build_archive(os.path.join(target, 'main.zip'), 'bench-main', TREES[tree], args.scale)
+
+    http_proc, http_port = http_server.start_subprocess(http_root, args.latency, args.bandwidth)
+    ssh_proc, ssh_port = ssh_server.start_subprocess(args.latency, sftp_root, args.bandwidth)
+    try:
+        import job_context
+        import settings_store
+        from Github_to_Local_to_ETX import download_github_to_local, upload_local_to_etx
+        from streaming_pipeline import run_streaming_pipeline
+        from run_ETX import ETXRemoteExecutor
+        job_context.install()
+        # Pipeline code logs every file; keep the report on stdout readable
+        logging.disable(logging.INFO)
+
+        remote = os.path.join(sftp_root, REMOTE_DIR.lstrip('/'))
+        output = sys.stderr.write if args.verbose else None
+
+        def clear_local():
+            for name in ('local', 'unzipped', 'bench-main.zip'):
+                path = os.path.join(work, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+
+        def clear_remote():
+            shutil.rmtree(remote, ignore_errors=True)
+
+        def expect(path, files, what):
+            def check():
+                found = count_files(path)
+                if found != files:
+                    raise RuntimeError(f"{what}: expected {files} files in {path}, found {found}")
+            return check
+
+        results = {}
+        for tree in args.trees:
+            write_settings(settings_path, work, http_port, ssh_port, tree)
+            settings_store.get_store().invalidate()
+            info = archives[tree]
+            local, files, nbytes = os.path.join(work, 'local'), info['files'], info['bytes']
+            tree_results = {'files': files, 'bytes': nbytes}
+
+            runs, stages = timed(download_github_to_local, expect(local, files, 'download'), args.repeat, clear_local, output)
+            tree_results['download_github_to_local'] = dict(summarize(runs, nbytes, files), stages=stages)
+
+            runs, stages = timed(upload_local_to_etx, expect(remote, files, 'upload'), args.repeat, clear_remote, output)
+            tree_results['upload_local_to_etx'] = dict(summarize(runs, nbytes, files), stages=stages)
+
+            def sequential():
+                download_github_to_local()
+                upload_local_to_etx()
+
+            def reset():
+                clear_local()
+                clear_remote()
+
+            runs, stages = timed(sequential, expect(remote, files, 'pipeline'), args.repeat, reset, output)
+            tree_results['pipeline_sequential'] = dict(summarize(runs, nbytes, files), stages=stages)
+
+            runs, stages = timed(run_streaming_pipeline, expect(remote, files, 'streaming pipeline'),
+                                 args.repeat, reset, output)
+            tree_results['pipeline_streaming'] = dict(summarize(runs, nbytes, files), stages=stages)
+            results[tree] = tree_results
+
+        executor = ETXRemoteExecutor(settings_store.load_settings())
+        latencies = []
+        with job_context.capture(lambda text: None):
+            for _ in range(args.commands):
+                start = time.perf_counter()
+                output = executor.execute_single_command('echo bench')
+                latencies.append(time.perf_counter() - start)
+                if 'bench' not in output:
+                    raise RuntimeError(f"execute_single_command failed: {output!r}")
+        ordered = sorted(latencies)
+        results['execute_single_command'] = dict(
+            summarize(latencies),
+            p99=round(ordered[min(len(ordered) - 1, int(round(0.99 * (len(ordered) - 1))))], 4))
+        return results
+    finally:
+        for proc in (http_proc, ssh_proc):
+            proc.kill()
+            proc.wait()
+        os.chdir(ROOT)
+        shutil.rmtree(work_root, ignore_errors=True)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """(name, old median, new median, ratio, regressed) for every benchmark present in both"""
+    rows = []
+
+    def walk(new, old, prefix):
+        for key, value in new.items():
+            if not isinstance(value, dict) or key not in old:
+                continue
+            if 'median' in value and 'median' in old[key]:
+                ratio = value['median'] / old[key]['median'] if old[key]['median'] else float('inf')
+                rows.append((prefix + key, old[key]['median'], value['median'], ratio, ratio > 1 + tolerance))
+            else:
+                walk(value, old[key], f"{prefix}{key}.")
+    walk(report['results'], baseline.get('results', {}), '')
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trees', default='tiny,huge,mixed', help=f"comma list of {', '.join(TREES)}")
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the file counts of every tree')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--commands', type=int, default=20, help='execute_single_command calls')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added per HTTP response / SSH request')
+    parser.add_argument('--bandwidth', type=float, default=0, help='bytes/sec for HTTP and SFTP data (0 = unlimited)')
+    parser.add_argument('--output', help='also write the JSON report here')
+    parser.add_argument('--verbose', action='store_true', help='show pipeline output on stderr')
+    parser.add_argument('--compare', help='earlier JSON report to compare medians against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed slowdown before --compare fails')
+    args = parser.parse_args()
+    args.trees = [t.strip() for t in args.trees.split(',') if t.strip()]
+    unknown = [t for t in args.trees if t not in TREES]
+    if unknown:
+        parser.error(f"unknown tree(s): {', '.join(unknown)}")
+
+    report = {
+        'benchmark': 'pipeline_suite',
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {'trees': args.trees, 'scale': args.scale, 'repeat': args.repeat, 'commands': args.commands,
+                   'latency': args.latency, 'bandwidth': args.bandwidth, 'seed': SEED},
+        'results': run_suite(args),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            rows = compare(report, json.load(f), args.tolerance)
+        for name, old, new, ratio, regressed in rows:
+            print(f"{'REGRESSION' if regressed else 'ok':10} {name:55} {old:9.4f}s -> {new:9.4f}s  x{ratio:.2f}",
+                  file=sys.stderr)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Local HTTP server stand-in for GitHub archive downloads
+Serves files below --root, so <root>/bench/repo/archive/refs/heads/main.zip
+answers the URL the pipeline derives from PROJECT_URL=http://127.0.0.1:<port>/bench/repo.
+Optional latency delays the response headers (time to first byte) and
+--bandwidth paces the body in bytes/sec across all downloads.
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from sftp_server import Link  # noqa: E402  (same pacing as the SFTP stand-in)
+
+CHUNK = 64 * 1024
+
+
+def make_handler(root: str, latency: float = 0.0, bandwidth: float = 0) -> type:
+    link = Link(bandwidth)
+
+    class ArchiveHandler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=root, **kwargs)
+
+        def send_head(self):
+            if latency:
+                time.sleep(latency)
+            return super().send_head()
+
+        def copyfile(self, source, outputfile):
+            for chunk in iter(lambda: source.read(CHUNK), b''):
+                link.transfer(len(chunk))
+                outputfile.write(chunk)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ArchiveHandler
+
+
+def serve(root: str, port: int = 0, latency: float = 0.0, bandwidth: float = 0,
+          ready: threading.Event = None, bound: list = None) -> None:
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(root, latency, bandwidth))
+    if bound is not None:
+        bound.append(server.server_port)
+    if ready is not None:
+        ready.set()
+    print(f"LISTENING {server.server_port}", flush=True)
+    server.serve_forever()
+
+
+def start_subprocess(root: str, latency: float = 0.0, bandwidth: float = 0) -> tuple:
+    """Start the stand-in in a child process and return (process, port)"""
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--root', root,
+                             '--latency', str(latency), '--bandwidth', str(bandwidth)],
+                            stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith('LISTENING'):
+        proc.kill()
+        raise RuntimeError("HTTP stand-in failed to start")
+    return proc, int(line.split()[1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local HTTP archive server stand-in')
+    parser.add_argument('--root', required=True)
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each response')
+    parser.add_argument('--bandwidth', type=float, default=0, help='body rate in bytes/sec (0 = unlimited)')
+    args = parser.parse_args()
+    serve(args.root, args.port, args.latency, args.bandwidth)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Load test: dashboard polling endpoints
+Simulates browsers polling job status, logs, history and queue/terminal metrics
+and reports p50/p99 latency per endpoint as JSON. Without --url a dashboard is
+started in a subprocess (seeded with one finished job) for each --server.
+
+Usage: python benchmarks/load_test.py --clients 20 --duration 15 --server both
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LOG_LINES = 5000
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_server(port, server):
+    """Subprocess entry: seed a finished job, print its id and serve the dashboard"""
+    import app
+    import serving
+
+    def seed():
+        for i in range(LOG_LINES):
+            print(f"[seed] line {i}: uploaded and verified /remote/path/file_{i}.dat")
+    job_id = app.run_job('load_test', seed)
+    while app.job_status.get(job_id) in ('queued', 'running'):
+        time.sleep(0.05)
+    print(f"READY {job_id}", flush=True)
+    serving.serve(app.app, host='127.0.0.1', port=port, server=server)
+
+
+def start_server(server):
+    """Start a dashboard subprocess in a scratch directory; returns (proc, base_url, job_id, workdir)"""
+    workdir = tempfile.mkdtemp(prefix='etx_load_')
+    shutil.copy(os.path.join(ROOT, 'settings.txt'), workdir)
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port), '--server', server],
+                            cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                            env=dict(os.environ, PYTHONPATH=ROOT))
+    job_id = None
+    for line in proc.stdout:
+        if line.startswith('READY'):
+            job_id = line.split()[1]
+            break
+    if job_id is None:
+        proc.kill()
+        raise RuntimeError(f"{server} dashboard did not start")
+    # Keep reading so request logging can never fill the pipe and stall the server
+    threading.Thread(target=lambda: [None for _ in proc.stdout], daemon=True).start()
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"{base_url}/job_queue", timeout=1).read()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return proc, base_url, job_id, workdir
+
+
+def load(base_url, job_id, clients, duration, gzip_ok):
+    endpoints = {
+        'job_status': f"/job_status/{job_id}",
+        'job_log': f"/job_log/{job_id}",
+        'job_history': '/job_history',
+        'job_queue': '/job_queue',
+        'terminal_metrics': '/terminal/metrics',
+        'hpc_jobs': '/hpc_jobs',
+    }
+    latencies = {name: [] for name in endpoints}
+    errors = {name: 0 for name in endpoints}
+    received = [0]
+    lock = threading.Lock()
+    headers = {'Accept-Encoding': 'gzip'} if gzip_ok else {}
+    stop_at = time.time() + duration
+
+    def client():
+        while time.time() < stop_at:
+            for name, path in endpoints.items():
+                start = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(urllib.request.Request(base_url + path, headers=headers),
+                                                timeout=30) as resp:
+                        size = len(resp.read())
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies[name].append(elapsed)
+                        received[0] += size
+                except OSError:
+                    with lock:
+                        errors[name] += 1
+
+    started = time.time()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - started
+    total = sum(len(v) for v in latencies.values())
+    return {
+        'requests': total,
+        'requests_per_sec': round(total / elapsed, 1),
+        'bytes_received': received[0],
+        'endpoints': {
+            name: {
+                'count': len(values),
+                'errors': errors[name],
+                'p50_ms': round(percentile(values, 50) * 1000, 2) if values else None,
+                'p99_ms': round(percentile(values, 99) * 1000, 2) if values else None,
+                'mean_ms': round(sum(values) / len(values) * 1000, 2) if values else None,
+            }
+            for name, values in latencies.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--server', choices=['waitress', 'werkzeug', 'both'], default='both')
+    parser.add_argument('--url', help='test a running dashboard instead of starting one (needs --job-id)')
+    parser.add_argument('--job-id', help='existing job id for the status/log endpoints')
+    parser.add_argument('--no-gzip', action='store_true', help='do not send Accept-Encoding: gzip')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        run_server(args.serve, args.server)
+        return
+
+    report = {}
+    if args.url:
+        report['external'] = load(args.url.rstrip('/'), args.job_id or 'unknown', args.clients, args.duration,
+                                  not args.no_gzip)
+    else:
+        for server in (['waitress', 'werkzeug'] if args.server == 'both' else [args.server]):
+            proc, base_url, job_id, workdir = start_server(server)
+            try:
+                report[server] = load(base_url, job_id, args.clients, args.duration, not args.no_gzip)
+            finally:
+                proc.kill()
+                proc.wait()
+                shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps({'benchmark': 'dashboard_polling', 'clients': args.clients, 'duration': args.duration,
+                      'gzip': not args.no_gzip, 'results': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
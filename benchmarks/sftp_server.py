@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Local SFTP server stand-in for benchmarks
+Serves a directory over the SSH stand-in's sftp subsystem. Remote absolute
+paths are mapped under the root directory, so /home/user/project lands in
+<root>/home/user/project. Optional latency is added to every request round
+trip (open, stat, mkdir, close, ...) and data reads/writes are paced to a
+bandwidth shared by all connections, like one WAN link to the login node.
+Pipelined writes do not pay the latency, only the bandwidth.
+"""
+
+import os
+import time
+import threading
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface, SFTP_OK
+
+
+class Link:
+    """Paces transfers so the total rate stays under `bandwidth` bytes/sec (0 = unlimited)"""
+
+    def __init__(self, bandwidth: float = 0):
+        self.bandwidth = bandwidth
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def transfer(self, nbytes: int) -> None:
+        if not self.bandwidth:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(self._next, now) + nbytes / self.bandwidth
+            wait = self._next - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _Handle(SFTPHandle):
+    link: Link = None
+
+    def read(self, offset, length):
+        data = super().read(offset, length)
+        if isinstance(data, bytes):
+            self.link.transfer(len(data))
+        return data
+
+    def write(self, offset, data):
+        self.link.transfer(len(data))
+        return super().write(offset, data)
+
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat((self.writefile or self.readfile).fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        return SFTP_OK
+
+
+class LocalSFTPServer(SFTPServerInterface):
+    """SFTP operations on the local filesystem below `root`"""
+
+    root = '/'
+    latency = 0.0
+    link = Link()
+
+    def _real(self, path: str) -> str:
+        path = os.path.normpath('/' + path.replace('\\', '/')).lstrip('/')
+        return os.path.join(self.root, path)
+
+    def _wait(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def canonicalize(self, path):
+        return os.path.normpath('/' + path.replace('\\', '/')).replace('\\', '/')
+
+    def list_folder(self, path):
+        self._wait()
+        real = self._real(path)
+        try:
+            return [SFTPAttributes.from_stat(os.lstat(os.path.join(real, name)), name) for name in os.listdir(real)]
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        self._wait()
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._real(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def lstat(self, path):
+        self._wait()
+        try:
+            return SFTPAttributes.from_stat(os.lstat(self._real(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def open(self, path, flags, attr):
+        self._wait()
+        real = self._real(path)
+        try:
+            fd = os.open(real, flags | getattr(os, 'O_BINARY', 0), 0o644)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        try:
+            f = os.fdopen(fd, mode)
+        except OSError as e:
+            os.close(fd)
+            return SFTPServer.convert_errno(e.errno)
+        handle = _Handle(flags)
+        handle.link = self.link
+        handle.filename = real
+        handle.readfile = f
+        handle.writefile = f if mode != 'rb' else None
+        return handle
+
+    def remove(self, path):
+        self._wait()
+        try:
+            os.remove(self._real(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        self._wait()
+        real_new = self._real(newpath)
+        if os.path.exists(real_new):
+            # SFTPv3 rename refuses to overwrite; posix_rename is the replacing variant
+            return SFTPServer.convert_errno(17)
+        try:
+            os.rename(self._real(oldpath), real_new)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        self._wait()
+        try:
+            os.replace(self._real(oldpath), self._real(newpath))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def mkdir(self, path, attr):
+        self._wait()
+        try:
+            os.mkdir(self._real(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        self._wait()
+        try:
+            os.rmdir(self._real(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        self._wait()
+        return SFTP_OK
+
+    def symlink(self, target_path, path):
+        self._wait()
+        try:
+            os.symlink(target_path, self._real(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def readlink(self, path):
+        self._wait()
+        try:
+            return os.readlink(self._real(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+def make_handler(root: str, latency: float = 0.0, bandwidth: float = 0) -> type:
+    """SFTPServerInterface class for ssh_server.serve(sftp_handler=...) rooted at root"""
+    os.makedirs(root, exist_ok=True)
+    return type('BenchSFTPServer', (LocalSFTPServer,),
+                {'root': os.path.abspath(root), 'latency': latency, 'link': Link(bandwidth)})
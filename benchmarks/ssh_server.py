@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Local SSH server stand-in for benchmarks
+Accepts any password, runs exec requests with the local bash and bridges
+shell requests to a bash subprocess. Optional per-request latency simulates
+a WAN link to the login node. With --sftp-root the sftp subsystem serves that
+directory (see sftp_server.py), optionally limited to --bandwidth bytes/sec.
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import tempfile
+import subprocess
+
+import paramiko
+
+# Remote shells get an empty HOME so the local user's rc files never leak into measurements
+STUB_ENV = dict(os.environ, HOME=tempfile.mkdtemp(prefix='etx_stub_home_'))
+
+
+class StubServer(paramiko.ServerInterface):
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def check_auth_password(self, username, password):
+        time.sleep(self.latency)
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._run_exec, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+    def check_channel_shell_request(self, channel):
+        threading.Thread(target=self._run_shell, args=(channel,), daemon=True).start()
+        return True
+
+    def _run_exec(self, channel, command):
+        # paramiko replies to the exec request after this handler returns; give it a moment
+        time.sleep(max(self.latency, 0.005))
+        proc = subprocess.run(['bash', '-c', command], capture_output=True, env=STUB_ENV)
+        channel.sendall(proc.stdout)
+        channel.sendall_stderr(proc.stderr)
+        channel.send_exit_status(proc.returncode)
+        channel.shutdown_write()
+        channel.close()
+
+    def _run_shell(self, channel):
+        proc = subprocess.Popen(['bash'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, bufsize=0, env=STUB_ENV)
+
+        def pump_output():
+            for chunk in iter(lambda: os.read(proc.stdout.fileno(), 4096), b""):
+                channel.sendall(chunk)
+            channel.send_exit_status(proc.wait())
+            channel.close()
+
+        threading.Thread(target=pump_output, daemon=True).start()
+        try:
+            while True:
+                data = channel.recv(4096)
+                if not data:
+                    break
+                time.sleep(self.latency)
+                proc.stdin.write(data)
+        except (OSError, EOFError):
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+
+def handle_connection(sock, host_key, latency, sftp_handler=None):
+    transport = paramiko.Transport(sock)
+    transport.add_server_key(host_key)
+    if sftp_handler is not None:
+        transport.set_subsystem_handler('sftp', paramiko.SFTPServer, sftp_handler)
+    transport.start_server(server=StubServer(latency))
+
+
+def serve(port: int = 0, latency: float = 0.0, ready: threading.Event = None,
+          sftp_handler=None, bound: list = None):
+    """Accept connections forever; the bound port is appended to `bound`"""
+    host_key = paramiko.RSAKey.generate(2048)
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', port))
+    server.listen(512)
+    if bound is not None:
+        bound.append(server.getsockname()[1])
+    if ready is not None:
+        ready.set()
+    print(f"LISTENING {server.getsockname()[1]}", flush=True)
+    while True:
+        sock, _ = server.accept()
+        threading.Thread(target=handle_connection, args=(sock, host_key, latency, sftp_handler),
+                         daemon=True).start()
+
+
+def start_subprocess(latency: float = 0.0, sftp_root: str = None, bandwidth: float = 0) -> tuple:
+    """Start the stand-in in a child process and return (process, port)"""
+    cmd = [sys.executable, os.path.abspath(__file__), '--latency', str(latency)]
+    if sftp_root:
+        cmd += ['--sftp-root', sftp_root, '--bandwidth', str(bandwidth)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line.startswith('LISTENING'):
+        proc.kill()
+        raise RuntimeError("SSH stand-in failed to start")
+    return proc, int(line.split()[1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local SSH server stand-in')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to auth and each request')
+    parser.add_argument('--sftp-root', help='serve this directory over sftp')
+    parser.add_argument('--bandwidth', type=float, default=0, help='sftp data rate in bytes/sec (0 = unlimited)')
+    args = parser.parse_args()
+    handler = None
+    if args.sftp_root:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from sftp_server import make_handler
+        handler = make_handler(args.sftp_root, args.latency, args.bandwidth)
+    serve(args.port, args.latency, sftp_handler=handler)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Result cache for read-only remote commands
+Repeated `ls`, `phd list`, `qstat` and similar polls from several dashboard tabs
+are answered from memory for a short TTL instead of a fresh SSH round trip.
+Entries for a host are dropped when an upload or any mutating command runs there.
+"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+# First word(s) of commands that never change remote state -> TTL in seconds
+READ_ONLY_COMMANDS = {
+    'ls': 30, 'pwd': 300, 'hostname': 3600, 'whoami': 3600, 'id': 3600, 'uname': 3600,
+    'df': 60, 'du': 60, 'cat': 30, 'head': 30, 'tail': 10, 'wc': 30, 'stat': 30, 'find': 30,
+    'echo': 300, 'date': 1, 'uptime': 10, 'env': 60, 'printenv': 60, 'which': 300,
+    'qstat': 10, 'squeue': 10, 'bjobs': 10, 'sinfo': 30, 'pbsnodes': 30,
+    'phd list': 10, 'module list': 60, 'module avail': 300,
+}
+
+# Options that make an otherwise read-only command change remote state
+MUTATING_OPTIONS = {
+    'find': ('-delete', '-exec', '-execdir', '-ok', '-okdir', '-fprint', '-fls'),
+}
+
+# Output redirection, command substitution or background jobs make a command unsafe to cache
+_UNSAFE = re.compile(r'>|`|\$\(|(?<!&)&(?!&)')
+_SPLIT = re.compile(r'&&|\|\||;|\|')
+
+
+def _read_only_ttl(command: str) -> Optional[float]:
+    """TTL for a read-only command (every part of a chain must be read-only), else None"""
+    if not command.strip() or _UNSAFE.search(command):
+        return None
+    ttl = None
+    for part in _SPLIT.split(command):
+        words = part.split()
+        if not words:
+            return None
+        part_ttl = READ_ONLY_COMMANDS.get(' '.join(words[:2]), READ_ONLY_COMMANDS.get(words[0]))
+        if part_ttl is None:
+            return None
+        # -fprint also covers -fprint0 / -fprintf
+        if any(word.startswith(option) for word in words[1:] for option in MUTATING_OPTIONS.get(words[0], ())):
+            return None
+        ttl = part_ttl if ttl is None else min(ttl, part_ttl)
+    return ttl
+
+
+class CommandCache:
+    """TTL cache of command results keyed by host, with hit/miss statistics"""
+
+    def __init__(self, max_entries: int = 256, ttl_scale: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl_scale = ttl_scale
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[float, float, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+
+    def is_cacheable(self, command: str) -> bool:
+        return _read_only_ttl(command) is not None
+
+    def get(self, host: str, command: str) -> Optional[Tuple[str, float]]:
+        """Return (result, age_seconds) for a live entry"""
+        key = (host, command.strip())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored, expires, result = entry
+            if time.time() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return result, time.time() - stored
+
+    def put(self, host: str, command: str, result: str) -> None:
+        ttl = _read_only_ttl(command)
+        if ttl is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._entries[(host, command.strip())] = (now, now + ttl * self.ttl_scale, result)
+            self._entries.move_to_end((host, command.strip()))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_host(self, host: str) -> None:
+        """Drop every cached result for a host, e.g. after an upload or submit"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == host]:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def _lookup(self, host: str, command: str) -> Optional[Tuple[str, float]]:
+        """Cached (result, age) for command, counting the hit/miss/bypass; None means run it remotely"""
+        if not self.is_cacheable(command):
+            # Anything that might change remote state makes earlier listings stale
+            with self._lock:
+                self.bypassed += 1
+            self.invalidate_host(host)
+            return None
+        cached = self.get(host, command)
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return cached
+
+    def _store(self, host: str, command: str, result: str) -> Tuple[str, Optional[float]]:
+        if not result.startswith('Error:'):
+            self.put(host, command, result)
+        return result, None
+
+    def run(self, executor, command: str) -> Tuple[str, Optional[float]]:
+        """Execute through the cache; returns (result, cached_age or None when run remotely)"""
+        cached = self._lookup(executor.host, command)
+        if cached is not None:
+            return cached
+        return self._store(executor.host, command, executor.execute_single_command(command))
+
+    async def run_async(self, executor, command: str) -> Tuple[str, Optional[float]]:
+        """run() for AsyncETXExecutor, awaited on its shared event loop"""
+        cached = self._lookup(executor.host, command)
+        if cached is not None:
+            return cached
+        return self._store(executor.host, command, await executor.execute_single_command_async(command))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Shared cache used by the dashboard terminal and invalidated by uploads
+command_cache = CommandCache()
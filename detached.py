@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Detached remote commands
+Long solver runs are launched under setsid/nohup with output going to a remote
+log file. The dashboard fetches new output by byte offset with one SFTP read per
+poll and can reattach after a restart, since launch metadata is kept on disk.
+"""
+
+import os
+import json
+import time
+import uuid
+import shlex
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+REMOTE_BASE_DIR = '.etx_detached'
+MAX_FETCH_BYTES = 256 * 1024
+# SFTP sessions are dropped after this many idle seconds so nothing stays open for hours
+SFTP_IDLE_TIMEOUT = 60
+
+
+def _complete_utf8(data: bytes) -> bytes:
+    """Trim a trailing partial UTF-8 sequence so chunks never split a character"""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 == 0x80:
+            continue  # continuation byte, keep looking for the lead byte
+        if byte & 0x80 == 0:
+            return data
+        needed = 2 if byte & 0xE0 == 0xC0 else 3 if byte & 0xF0 == 0xE0 else 4
+        return data if back >= needed else data[:-back]
+    return data
+
+
+class DetachedRunner:
+    """Launches detached remote commands and serves their output by offset"""
+
+    def __init__(self, state_file: str = 'detached_jobs.json'):
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = self._load_state()
+        self._sftp: Dict[Tuple[str, int, str], Dict[str, Any]] = {}
+
+    # ---------- persisted state ----------
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read detached job state {self.state_file}: {e}")
+            return {}
+
+    def _save_state(self) -> None:
+        tmp = self.state_file + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._jobs, f, indent=2)
+        os.replace(tmp, self.state_file)
+
+    # ---------- remote access ----------
+
+    def _get_sftp(self, executor):
+        """Reuse a short-lived SFTP session per host, reconnecting after idle timeout"""
+        key = (executor.host, executor.port, executor.username)
+        with self._lock:
+            now = time.time()
+            for other_key, entry in list(self._sftp.items()):
+                if now - entry['last_used'] > SFTP_IDLE_TIMEOUT:
+                    entry['client'].close()
+                    del self._sftp[other_key]
+            entry = self._sftp.get(key)
+            transport = entry['client'].get_transport() if entry else None
+            if entry is None or transport is None or not transport.is_active():
+                client, connect_params = executor._create_ssh_client()
+                metrics.connect_ssh(client, **connect_params)
+                entry = self._sftp[key] = {'client': client, 'sftp': client.open_sftp()}
+            entry['last_used'] = now
+            return entry['sftp']
+
+    def launch(self, executor, command: str, cwd: Optional[str] = None) -> Dict[str, Any]:
+        """Start `command` detached on the remote host and record it for later reattach"""
+        job_id = uuid.uuid4().hex[:12]
+        remote_dir = f"{REMOTE_BASE_DIR}/{job_id}"
+        log_path = f"{remote_dir}/output.log"
+        exit_path = f"{remote_dir}/exit_code"
+        # Subshell so an explicit `exit` in the command still records its status
+        inner = f"( {command} ); echo $? > {exit_path}"
+        if cwd:
+            inner = f"cd {shlex.quote(cwd)} && {inner}"
+        # Only the setsid command is backgrounded, so the exec channel closes right away
+        launch_cmd = (f"mkdir -p {remote_dir} || exit 1; "
+                      f"setsid nohup bash -lc {shlex.quote(inner)} > {log_path} 2>&1 < /dev/null & echo $!")
+        output = executor.execute_single_command(launch_cmd)
+        pid_line = output.strip().splitlines()[-1] if output.strip() else ''
+        if not pid_line.isdigit():
+            raise RuntimeError(f"Failed to launch detached command: {output.strip()}")
+        job = {
+            'id': job_id,
+            'command': command,
+            'host': executor.host,
+            'port': executor.port,
+            'user': executor.username,
+            'pid': int(pid_line),
+            'log_path': log_path,
+            'exit_path': exit_path,
+            'started': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'exit_code': None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._save_state()
+        logger.info(f"Detached command {job_id} started with pid {job['pid']}: {command}")
+        return job
+
+    def get(self, job_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._jobs[job_id])
+
+    @staticmethod
+    def _check_target(job: Dict[str, Any], executor) -> None:
+        """Refuse to touch a job through an executor for another host, port or user"""
+        target = (executor.host, int(executor.port), executor.username)
+        if target != (job['host'], int(job['port']), job['user']):
+            raise RuntimeError(f"Detached command {job['id']} runs on {job['user']}@{job['host']}:{job['port']}, "
+                               f"not {target[2]}@{target[0]}:{target[1]}")
+
+    def fetch(self, executor, job_id: str, offset: int = 0, max_bytes: int = MAX_FETCH_BYTES) -> Dict[str, Any]:
+        """Return output after `offset` plus the next offset and whether the command is still running"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        self._check_target(job, executor)
+        sftp = self._get_sftp(executor)
+        try:
+            with sftp.open(job['log_path'], 'rb') as f:
+                f.seek(offset)
+                data = _complete_utf8(f.read(max_bytes))
+        except FileNotFoundError:
+            data = b''
+        if job['exit_code'] is None:
+            try:
+                with sftp.open(job['exit_path'], 'r') as f:
+                    code = f.read().decode().strip()
+                if code:
+                    with self._lock:
+                        job['exit_code'] = int(code) if code.lstrip('-').isdigit() else code
+                        self._save_state()
+            except FileNotFoundError:
+                pass
+        return {
+            'output': data.decode('utf-8', errors='replace'),
+            'offset': offset + len(data),
+            'running': job['exit_code'] is None,
+            'exit_code': job['exit_code'],
+        }
+
+    def cancel(self, executor, job_id: str) -> None:
+        """Terminate the detached process group (setsid makes the pid its group id)"""
+        job = self._jobs[job_id]
+        self._check_target(job, executor)
+        # The killed wrapper never writes its exit status, so record the cancellation instead
+        executor.execute_single_command(f"kill -TERM -{job['pid']} 2>/dev/null || kill -TERM {job['pid']}; "
+                                        f"echo cancelled > {job['exit_path']}")
+        with self._lock:
+            if job['exit_code'] is None:
+                job['exit_code'] = 'cancelled'
+                self._save_state()
+        logger.info(f"Detached command {job_id} cancelled")
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j['started'], reverse=True)
+
+    def forget(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._save_state()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Fast delete
+Removing a big extracted tree with shutil.rmtree blocks the job for as long as
+the filesystem needs to unlink every file. remove() instead renames the
+directory into a `.etx_trash` folder next to it - same parent, so the same
+filesystem and an atomic rename - and returns at once; the path is free for
+the next unzip/copy immediately. A small pool of background threads then
+deletes the trash, walking directories in parallel. Whatever is still in a
+trash folder after a crash or exit is removed by sweep() at the next start
+(and the first time a trash folder is used in a process).
+"""
+
+import os
+import stat
+import time
+import queue
+import shutil
+import logging
+import threading
+from typing import Iterable, List, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+TRASH_DIRNAME = '.etx_trash'
+WORKERS = 4
+
+DELETED_FILES = metrics.REGISTRY.counter('etx_trash_deleted_files_total', 'Files removed by the background deleter')
+DELETED_TREES = metrics.REGISTRY.counter('etx_trash_deleted_trees_total', 'Trash entries fully removed')
+
+
+def trash_dir_for(path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(path)), TRASH_DIRNAME)
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except PermissionError:
+        # Read-only files (common on Windows) cannot be unlinked until made writable
+        os.chmod(path, stat.S_IWRITE)
+        os.unlink(path)
+
+
+class _Deletion:
+    """One trash entry being removed; finished when its last directory has been emptied"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.dirs: List[str] = []
+        self.pending = 1
+        self.files = 0
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+
+class TrashCollector:
+    """Bounded worker pool that empties trash directories in parallel"""
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = max(1, workers)
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._active: List[_Deletion] = []
+        self._swept = set()
+        self._lock = threading.Lock()
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"etx-trash-{i + 1}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def schedule(self, path: str) -> None:
+        """Delete path (already in a trash folder) in the background"""
+        self._ensure_workers()
+        deletion = _Deletion(path)
+        with self._lock:
+            self._active.append(deletion)
+        if os.path.isdir(path) and not os.path.islink(path):
+            self._queue.put((deletion, path))
+        else:
+            try:
+                _unlink(path)
+            except OSError as e:
+                logger.warning(f"Could not delete {path}: {e}")
+            self._finish(deletion)
+
+    def _work(self) -> None:
+        while True:
+            deletion, path = self._queue.get()
+            try:
+                self._empty_dir(deletion, path)
+            except Exception as e:
+                logger.warning(f"Background delete of {path} failed: {e}")
+            with deletion.lock:
+                deletion.dirs.append(path)
+                deletion.pending -= 1
+                last = deletion.pending == 0
+            if last:
+                self._finish(deletion)
+
+    def _empty_dir(self, deletion: _Deletion, path: str) -> None:
+        """Unlink the files of one directory; subdirectories go back on the queue for any worker"""
+        removed = 0
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    with deletion.lock:
+                        deletion.pending += 1
+                    self._queue.put((deletion, entry.path))
+                    continue
+                try:
+                    _unlink(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        with deletion.lock:
+            deletion.files += removed
+        if removed:
+            DELETED_FILES.inc(removed)
+
+    def _finish(self, deletion: _Deletion) -> None:
+        # Every file is gone; remove the directories deepest first
+        for path in sorted(deletion.dirs, key=lambda p: p.count(os.sep), reverse=True):
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+        if os.path.lexists(deletion.root):
+            shutil.rmtree(deletion.root, ignore_errors=True)
+        if os.path.lexists(deletion.root):
+            logger.warning(f"Could not fully delete {deletion.root}; it will be retried at the next sweep")
+        else:
+            DELETED_TREES.inc()
+        with self._lock:
+            self._active.remove(deletion)
+        deletion.done.set()
+
+    def sweep(self, trash_dir: str) -> int:
+        """Schedule everything left in trash_dir (once per process); returns entries scheduled"""
+        trash_dir = os.path.abspath(trash_dir)
+        with self._lock:
+            if trash_dir in self._swept:
+                return 0
+            self._swept.add(trash_dir)
+        try:
+            names = os.listdir(trash_dir)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            self.schedule(os.path.join(trash_dir, name))
+        if names:
+            logger.info(f"Removing {len(names)} leftover trash entr{'y' if len(names) == 1 else 'ies'} in {trash_dir}")
+        return len(names)
+
+    def remove(self, path: str) -> bool:
+        """Move path out of the way and delete it in the background; False if it did not exist
+
+        Falls back to a synchronous delete when the rename is impossible (e.g. a mount
+        point, or a directory held open on Windows).
+        """
+        if not os.path.lexists(path):
+            return False
+        if not os.path.isdir(path) or os.path.islink(path):
+            _unlink(path)
+            return True
+        trash_dir = trash_dir_for(path)
+        self.sweep(trash_dir)
+        target = os.path.join(trash_dir, f"{os.path.basename(os.path.abspath(path))}.{os.getpid()}.{time.time_ns()}")
+        try:
+            os.makedirs(trash_dir, exist_ok=True)
+            os.rename(path, target)
+        except OSError as e:
+            logger.warning(f"Cannot move {path} to trash ({e}); deleting in place")
+            shutil.rmtree(path)
+            return True
+        self.schedule(target)
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until scheduled deletions finish; False on timeout"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                return True
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            active[0].done.wait(remaining)
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = list(self._active)
+        return {'pending_trees': len(active), 'queued_dirs': self._queue.qsize(),
+                'files_deleted_in_progress': sum(d.files for d in active)}
+
+
+collector = TrashCollector()
+
+
+def remove(path: str) -> bool:
+    """Fast delete of a file or directory tree; see TrashCollector.remove"""
+    return collector.remove(path)
+
+
+def sweep(paths: Iterable[Optional[str]]) -> int:
+    """Clear leftover trash next to each of paths (startup crash recovery)"""
+    total = 0
+    for path in paths:
+        if path:
+            total += collector.sweep(trash_dir_for(path))
+    return total
+
+
+def wait(timeout: Optional[float] = None) -> bool:
+    return collector.wait(timeout)
+
+
+def stats() -> dict:
+    return collector.stats()
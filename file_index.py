@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Persistent local file index
+Keeps path, size, mtime and (on demand) SHA-256 of every file below an upload
+root in SQLite, so upload planning does not start with a full os.walk and
+getsize per file. A rescan compares os.scandir results (on Windows the sizes
+and mtimes come with the directory listing, no extra round trip per file on a
+network drive) with the stored rows and only writes the differences. Every
+rescan that finds changes bumps the root's version and tags the changed rows
+and deletions with it, so "what changed since the last successful upload to
+target X" is one indexed query.
+
+With the optional watchdog package a Watcher narrows rescans to the
+directories that reported events; without it, watch mode polls.
+"""
+
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+import job_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = os.path.join('job_logs', 'file_index.db')
+HASH_CHUNK = 1024 * 1024
+WATCH_DEBOUNCE = 2.0
+WATCH_POLL_INTERVAL = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    root TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    scanned REAL
+);
+CREATE TABLE IF NOT EXISTS files (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (root, path)
+);
+CREATE TABLE IF NOT EXISTS deleted (
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (root, path)
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    root TEXT NOT NULL,
+    target TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    finished REAL NOT NULL,
+    PRIMARY KEY (root, target)
+);
+CREATE INDEX IF NOT EXISTS idx_files_version ON files(root, version);
+CREATE INDEX IF NOT EXISTS idx_deleted_version ON deleted(root, version);
+"""
+
+
+def _like_prefix(rel_dir: str) -> str:
+    escaped = rel_dir.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '/%'
+
+
+class FileIndex:
+    """SQLite index of the files below one or more local roots"""
+
+    def __init__(self, db_path: str = DEFAULT_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._watchers: Dict[str, 'Watcher'] = {}
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets planners read while a rescan writes"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def normalize(root: str) -> str:
+        return os.path.normcase(os.path.abspath(root))
+
+    # ---------- scanning ----------
+
+    def _walk(self, root: str, rel_dir: str) -> Iterator[tuple]:
+        """(relative POSIX path, size, mtime_ns) of every file below root/rel_dir (or of rel_dir if it is a file)"""
+        pending = [rel_dir]
+        while pending:
+            current = pending.pop()
+            path = os.path.join(root, *current.split('/')) if current else root
+            try:
+                entries = os.scandir(path)
+            except NotADirectoryError:
+                # A single file scope (from a watcher event)
+                try:
+                    st = os.stat(path)
+                    yield current, st.st_size, st.st_mtime_ns
+                except OSError:
+                    pass
+                continue
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    rel = f"{current}/{entry.name}" if current else entry.name
+                    try:
+                        # Like os.walk: symlinked directories are not followed
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(rel)
+                        elif entry.is_file():
+                            st = entry.stat()
+                            yield rel, st.st_size, st.st_mtime_ns
+                    except OSError:
+                        continue  # vanished or unreadable between listing and stat
+
+    def scan(self, root: str, rel_paths: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Rescan root (or only the files and directories rel_paths below it) and store the differences
+
+        Returns a summary with the root's version afterwards.
+        """
+        started = time.perf_counter()
+        key = self.normalize(root)
+        scopes = sorted(set(rel_paths)) if rel_paths is not None else ['']
+        # A scope inside another scope would be walked twice
+        scopes = [s for s in scopes if not any(o != s and (o == '' or s.startswith(o + '/')) for o in scopes)]
+        conn = self._conn()
+        changed, deleted, files = [], [], 0
+        for scope in scopes:
+            job_context.checkpoint()
+            if scope:
+                rows = conn.execute("SELECT path, size, mtime_ns FROM files WHERE root = ? AND "
+                                    "(path = ? OR path LIKE ? ESCAPE '\\')", (key, scope, _like_prefix(scope)))
+            else:
+                rows = conn.execute("SELECT path, size, mtime_ns FROM files WHERE root = ?", (key,))
+            known = {r['path']: (r['size'], r['mtime_ns']) for r in rows}
+            for rel, size, mtime_ns in self._walk(root, scope):
+                files += 1
+                if known.pop(rel, None) != (size, mtime_ns):
+                    changed.append((rel, size, mtime_ns))
+            deleted.extend(known)
+        with self._write_lock:
+            row = conn.execute("SELECT version FROM roots WHERE root = ?", (key,)).fetchone()
+            version = row['version'] if row else 0
+            if changed or deleted:
+                version += 1
+                conn.executemany("INSERT OR REPLACE INTO files (root, path, size, mtime_ns, hash, version) "
+                                 "VALUES (?, ?, ?, ?, NULL, ?)",
+                                 [(key, rel, size, mtime_ns, version) for rel, size, mtime_ns in changed])
+                conn.executemany("DELETE FROM deleted WHERE root = ? AND path = ?",
+                                 [(key, rel) for rel, _, _ in changed])
+                conn.executemany("DELETE FROM files WHERE root = ? AND path = ?", [(key, rel) for rel in deleted])
+                conn.executemany("INSERT OR REPLACE INTO deleted (root, path, version) VALUES (?, ?, ?)",
+                                 [(key, rel, version) for rel in deleted])
+            conn.execute("INSERT INTO roots (root, version, scanned) VALUES (?, ?, ?) "
+                         "ON CONFLICT(root) DO UPDATE SET version = excluded.version, scanned = excluded.scanned",
+                         (key, version, time.time()))
+            conn.commit()
+        return {'version': version, 'changed': len(changed), 'deleted': len(deleted), 'scanned_files': files,
+                'seconds': round(time.perf_counter() - started, 3)}
+
+    def refresh(self, root: str) -> Dict[str, Any]:
+        """Bring the index up to date: only dirty directories when a Watcher covers root, else a full rescan"""
+        watcher = self._watchers.get(self.normalize(root))
+        if watcher is None:
+            return self.scan(root)
+        dirty = watcher.take_dirty()
+        if watcher.baseline:
+            return self.scan(root, dirty)
+        # Events only cover what changed since the watcher started
+        summary = self.scan(root)
+        watcher.baseline = True
+        return summary
+
+    # ---------- planning ----------
+
+    def version(self, root: str) -> int:
+        row = self._conn().execute("SELECT version FROM roots WHERE root = ?", (self.normalize(root),)).fetchone()
+        return row['version'] if row else 0
+
+    def changed_since(self, root: str, target: str) -> Dict[str, Any]:
+        """Files changed and deleted since the last upload of root to target was recorded
+
+        `since` is None when there is no such upload; `changed` then lists every file.
+        """
+        key = self.normalize(root)
+        conn = self._conn()
+        row = conn.execute("SELECT version FROM uploads WHERE root = ? AND target = ?", (key, target)).fetchone()
+        since = row['version'] if row else None
+        changed = [r['path'] for r in conn.execute("SELECT path FROM files WHERE root = ? AND version > ? "
+                                                   "ORDER BY path", (key, -1 if since is None else since))]
+        deleted = [] if since is None else [
+            r['path'] for r in conn.execute("SELECT path FROM deleted WHERE root = ? AND version > ? ORDER BY path",
+                                            (key, since))]
+        return {'since': since, 'version': self.version(root), 'changed': changed, 'deleted': deleted}
+
+    def mark_uploaded(self, root: str, target: str, version: int) -> None:
+        """Record that root as of `version` is on target"""
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("INSERT OR REPLACE INTO uploads (root, target, version, finished) VALUES (?, ?, ?, ?)",
+                         (self.normalize(root), target, version, time.time()))
+            conn.commit()
+
+    def manifest(self, root: str, allow: Optional[Callable[[str], bool]] = None) -> Dict[str, List]:
+        """Relative path -> [size, sha256]; only files new or changed since they were last hashed are read
+
+        allow(rel) limits the manifest to the files it accepts; the others are not hashed.
+        """
+        key = self.normalize(root)
+        conn = self._conn()
+        rows = conn.execute("SELECT path, size, mtime_ns, hash FROM files WHERE root = ?", (key,)).fetchall()
+        manifest, hashed = {}, []
+        for r in rows:
+            if allow is not None and not allow(r['path']):
+                continue
+            digest = r['hash']
+            if digest is None:
+                job_context.checkpoint()
+                sha = hashlib.sha256()
+                with open(os.path.join(root, *r['path'].split('/')), 'rb') as f:
+                    for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                        sha.update(chunk)
+                digest = sha.hexdigest()
+                hashed.append((digest, key, r['path'], r['size'], r['mtime_ns']))
+            manifest[r['path']] = [r['size'], digest]
+        if hashed:
+            with self._write_lock:
+                # Only if the row is still the one that was hashed
+                conn.executemany("UPDATE files SET hash = ? WHERE root = ? AND path = ? AND size = ? AND mtime_ns = ?",
+                                 hashed)
+                conn.commit()
+        return manifest
+
+    def stats(self) -> List[Dict[str, Any]]:
+        conn = self._conn()
+        return [{'root': r['root'], 'version': r['version'], 'scanned': r['scanned'],
+                 'files': conn.execute("SELECT COUNT(*) FROM files WHERE root = ?", (r['root'],)).fetchone()[0],
+                 'watched': r['root'] in self._watchers}
+                for r in conn.execute("SELECT * FROM roots ORDER BY root")]
+
+
+class Watcher:
+    """Collects the paths below root that changed, from watchdog events when available
+
+    Without watchdog `exact` is False and callers fall back to full rescans.
+    `baseline` is set once a full scan has run after the watcher started.
+    """
+
+    def __init__(self, index: FileIndex, root: str):
+        self.index = index
+        self.root = os.path.abspath(root)
+        self.exact = False
+        self.baseline = False
+        self.last_event = 0.0
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self._observer = None
+        self._root_id = None
+
+    def _current_root_id(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.root)
+            return st.st_dev, st.st_ino
+        except OSError:
+            return None
+
+    def _mark(self, path: str) -> None:
+        rel = os.path.relpath(path, self.root)
+        if rel == '..' or rel.startswith('..' + os.sep):
+            return
+        with self._lock:
+            self._dirty.add('' if rel == '.' else rel.replace(os.sep, '/'))
+            self.last_event = time.monotonic()
+
+    def take_dirty(self) -> Set[str]:
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def has_events(self) -> bool:
+        with self._lock:
+            return bool(self._dirty)
+
+    def start(self) -> 'Watcher':
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            logger.info("watchdog is not installed; watch mode polls with full rescans")
+            return self
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory and event.event_type == 'modified':
+                    return  # a child changed; the child's own event is more precise
+                watcher._mark(event.src_path)
+                if getattr(event, 'dest_path', None):
+                    watcher._mark(event.dest_path)
+
+        self._root_id = self._current_root_id()
+        if self._root_id is None:
+            return self  # nothing to watch yet; check_root() starts the observer once root exists
+        self._observer = Observer()
+        self._observer.schedule(_Handler(), self.root, recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
+        self.exact = True
+        self.index._watchers[self.index.normalize(self.root)] = self
+        return self
+
+    def stop(self) -> None:
+        self.index._watchers.pop(self.index.normalize(self.root), None)
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+
+    def check_root(self) -> None:
+        """Re-watch root if it was replaced (e.g. moved to the trash and recreated by a pipeline job)
+
+        The old observer would keep following the moved directory; the next refresh is a full scan.
+        """
+        if self._root_id == self._current_root_id():
+            return
+        logger.info(f"{self.root} was replaced; restarting the watcher")
+        self.stop()
+        self.exact = False
+        self.baseline = False
+        self.start()
+        with self._lock:
+            self._dirty.add('')
+            self.last_event = time.monotonic()
+
+    def changes(self, debounce: float = WATCH_DEBOUNCE, poll_interval: float = WATCH_POLL_INTERVAL
+                ) -> Iterator[Dict[str, Any]]:
+        """Yield a scan summary whenever changes have settled for `debounce` seconds (until cancelled)"""
+        pending = None
+        next_poll = time.monotonic() + poll_interval
+        while True:
+            job_context.checkpoint()
+            time.sleep(min(0.2, debounce))
+            now = time.monotonic()
+            if self.exact and now >= next_poll:
+                self.check_root()
+                next_poll = now + poll_interval
+            if self.exact:
+                if self.has_events() and now - self.last_event >= debounce:
+                    summary = self.index.refresh(self.root)
+                    if summary['changed'] or summary['deleted']:
+                        yield summary
+                continue
+            # Polling: rescan every poll_interval, then every `debounce` until a rescan finds nothing new
+            if now < next_poll:
+                continue
+            summary = self.index.scan(self.root)
+            if summary['changed'] or summary['deleted']:
+                pending = summary if pending is None else dict(summary, changed=pending['changed'] + summary['changed'],
+                                                               deleted=pending['deleted'] + summary['deleted'])
+                next_poll = now + debounce
+                continue
+            if pending is not None:
+                yield pending
+                pending = None
+            next_poll = now + poll_interval
+
+
+_index: Optional[FileIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> FileIndex:
+    """Process-wide index in job_logs/file_index.db"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FileIndex()
+        return _index
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Persistent job history
+Job metadata lives in SQLite (WAL mode) with indexes on start time, type and
+status, so the dashboard pages through thousands of runs without loading them.
+Old rows are pruned by age and count, and freed pages are given back with
+incremental vacuum.
+"""
+
+import os
+import glob
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_ROWS = 5000
+MAX_AGE_DAYS = 90
+# Retention runs at startup and after this many finished jobs
+PRUNE_EVERY = 100
+# A job's bytes/files are the first of these counters it has, so a pipeline reports what it
+# uploaded instead of download + upload (or extracted + copied + uploaded) added together.
+# The per-stage values stay in the counters column.
+TOTAL_BYTES = ('upload_bytes', 'download_bytes')
+TOTAL_FILES = ('uploaded_files', 'copied_files', 'extracted_files')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    submitted REAL,
+    start REAL NOT NULL,
+    end REAL,
+    duration REAL,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    files INTEGER NOT NULL DEFAULT 0,
+    counters TEXT,
+    log_file TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_start ON jobs(start);
+CREATE INDEX IF NOT EXISTS idx_jobs_type_start ON jobs(type, start);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_start ON jobs(status, start);
+"""
+
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _format_time(ts: Optional[float]) -> Optional[str]:
+    return time.strftime(_TIME_FORMAT, time.localtime(ts)) if ts else None
+
+
+class JobHistoryStore:
+    """SQLite-backed job history with filtered, paginated queries"""
+
+    def __init__(self, db_path: str, max_rows: int = MAX_ROWS, max_age_days: float = MAX_AGE_DAYS):
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.max_age_days = max_age_days
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._since_prune = 0
+        conn = self._conn()
+        # auto_vacuum only takes effect before the first table exists
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.executescript(_SCHEMA)
+        # Rows left 'running' or 'queued' by a crash or restart never finished
+        conn.execute("UPDATE jobs SET status = 'interrupted' WHERE status IN ('queued', 'running')")
+        conn.commit()
+        self.prune()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers work while a job is being written"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------- writing ----------
+
+    def record_start(self, job_id: str, job_type: str, start: float, submitted: Optional[float] = None,
+                     log_file: Optional[str] = None) -> None:
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("INSERT OR REPLACE INTO jobs (id, type, status, submitted, start, log_file) "
+                         "VALUES (?, ?, 'running', ?, ?, ?)",
+                         (job_id, job_type, submitted, start, log_file))
+            conn.commit()
+
+    def record_end(self, job_id: str, status: str, end: float, counters: Optional[Dict[str, int]] = None,
+                   error: Optional[str] = None) -> None:
+        """Finish a job row; bytes/files come from the job's last stage (see TOTAL_BYTES / TOTAL_FILES)"""
+        counters = counters or {}
+        total_bytes = next((counters[k] for k in TOTAL_BYTES if k in counters), 0)
+        total_files = next((counters[k] for k in TOTAL_FILES if k in counters), 0)
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("UPDATE jobs SET status = ?, end = ?, duration = ? - start, bytes = ?, files = ?, "
+                         "counters = ?, error = ? WHERE id = ?",
+                         (status, end, end, total_bytes, total_files,
+                          json.dumps(counters) if counters else None, error, job_id))
+            conn.commit()
+            self._since_prune += 1
+            prune_due = self._since_prune >= PRUNE_EVERY
+        if prune_due:
+            self.prune()
+
+    def prune(self) -> int:
+        """Drop rows (and their log files) past the age or row limit; returns rows removed"""
+        cutoff = time.time() - self.max_age_days * 86400
+        with self._write_lock:
+            self._since_prune = 0
+            conn = self._conn()
+            rows = conn.execute(
+                "SELECT id, log_file FROM jobs WHERE status NOT IN ('queued', 'running') AND "
+                "(start < ? OR id NOT IN (SELECT id FROM jobs ORDER BY start DESC LIMIT ?))",
+                (cutoff, self.max_rows)).fetchall()
+            if not rows:
+                return 0
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(r['id'],) for r in rows])
+            conn.commit()
+            # Compaction: return freed pages to the filesystem and fold the WAL back in
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("PRAGMA optimize")
+        for r in rows:
+            if not r['log_file']:
+                continue
+            # The log and the per-job files written next to it (profile traces and dumps)
+            for path in glob.glob(glob.escape(os.path.splitext(r['log_file'])[0]) + '.*'):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Could not remove old job file {path}: {e}")
+        logger.info(f"Pruned {len(rows)} job history rows")
+        return len(rows)
+
+    # ---------- reading ----------
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'id': row['id'],
+            'type': row['type'],
+            'status': row['status'],
+            'submitted': _format_time(row['submitted']),
+            'start': _format_time(row['start']),
+            'end': _format_time(row['end']) or '',
+            'duration': round(row['duration'], 3) if row['duration'] is not None else None,
+            'bytes': row['bytes'],
+            'files': row['files'],
+            'counters': json.loads(row['counters']) if row['counters'] else {},
+            'log_file': row['log_file'],
+            'error': row['error'],
+        }
+
+    def query(self, job_type: Optional[str] = None, status: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Newest-first page of jobs matching the filters, plus the total match count"""
+        where, params = [], []
+        if job_type:
+            where.append("type = ?")
+            params.append(job_type)
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if since is not None:
+            where.append("start >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("start < ?")
+            params.append(until)
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+        limit = max(1, min(int(limit), 500))
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM jobs {clause}", params).fetchone()[0]
+        rows = conn.execute(f"SELECT * FROM jobs {clause} ORDER BY start DESC LIMIT ? OFFSET ?",
+                            params + [limit, max(0, int(offset))]).fetchall()
+        return {'history': [self._to_dict(r) for r in rows], 'total': total, 'limit': limit, 'offset': offset}
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return self.query(limit=limit)['history']
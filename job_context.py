@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Per-job output capture
+The job being run is tracked in a context variable, so print() calls and log
+records from pipeline code land in the log of the job that produced them, even
+with several jobs running at once. print is routed once at install time
+instead of being swapped in and out around every job. The same context carries
+the job's cancel flag, checked by long-running loops through checkpoint(), and
+its byte/file counters, fed through count().
+"""
+
+import sys
+import logging
+import builtins
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Dict, Iterable, Optional
+
+_current_writer: contextvars.ContextVar = contextvars.ContextVar('etx_job_writer', default=None)
+_cancel_event: contextvars.ContextVar = contextvars.ContextVar('etx_job_cancel', default=None)
+_counters: contextvars.ContextVar = contextvars.ContextVar('etx_job_counters', default=None)
+_resource_holder: contextvars.ContextVar = contextvars.ContextVar('etx_job_resources', default=None)
+_original_print = builtins.print
+_installed = False
+
+
+class JobCancelled(BaseException):
+    """Raised at a checkpoint of a cancelled job
+
+    A BaseException (like asyncio.CancelledError) so the pipeline's per-file and
+    retry `except Exception` handlers let it through instead of carrying on.
+    """
+
+
+def current_writer() -> Optional[Callable[[str], None]]:
+    """Log writer of the job running in this context, if any"""
+    return _current_writer.get()
+
+
+def _routed_print(*args, sep=' ', end='\n', file=None, flush=False):
+    writer = _current_writer.get()
+    if writer is None or file not in (None, sys.stdout):
+        return _original_print(*args, sep=sep, end=end, file=file, flush=flush)
+    writer((' ' if sep is None else sep).join(str(a) for a in args) + ('\n' if end is None else end))
+
+
+class JobLogHandler(logging.Handler):
+    """Sends log records to the current job's log; a no-op outside jobs"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        writer = _current_writer.get()
+        if writer is None:
+            return
+        try:
+            writer(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+
+
+def install() -> None:
+    """Route print() and logging through the per-job capture (idempotent)"""
+    global _installed
+    if _installed:
+        return
+    builtins.print = _routed_print
+    handler = JobLogHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logging.getLogger().addHandler(handler)
+    _installed = True
+
+
+@contextmanager
+def capture(writer: Callable[[str], None]):
+    """Send output produced in this context (and contexts copied from it) to writer"""
+    token = _current_writer.set(writer)
+    try:
+        yield
+    finally:
+        _current_writer.reset(token)
+
+
+@contextmanager
+def cancellable(event: threading.Event):
+    """Make checkpoint() in this context raise JobCancelled once event is set"""
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+@contextmanager
+def holding_resources(holder: Callable[[Iterable[str]], ContextManager]):
+    """Let hold() in this context take scheduler resources through holder (JobScheduler.hold)"""
+    token = _resource_holder.set(holder)
+    try:
+        yield
+    finally:
+        _resource_holder.reset(token)
+
+
+@contextmanager
+def hold(resources: Iterable[str]):
+    """Hold scheduler resources for part of a long-running job; a no-op outside scheduled jobs"""
+    holder = _resource_holder.get()
+    if holder is None:
+        yield
+        return
+    with holder(resources):
+        yield
+
+
+def current_cancel_event() -> Optional[threading.Event]:
+    """Cancel flag of the job running in this context, if any"""
+    return _cancel_event.get()
+
+
+def checkpoint() -> None:
+    """Cooperative cancellation point for download, extract and upload loops (no-op outside jobs)"""
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise JobCancelled()
+
+
+class JobCounters:
+    """Thread-safe named counters for one job (bytes, files, ...)"""
+
+    def __init__(self):
+        self._values: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, **amounts: int) -> None:
+        with self._lock:
+            for name, amount in amounts.items():
+                self._values[name] = self._values.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._values)
+
+
+@contextmanager
+def counting(counters: JobCounters):
+    """Collect count() calls made in this context into counters"""
+    token = _counters.set(counters)
+    try:
+        yield counters
+    finally:
+        _counters.reset(token)
+
+
+def count(**amounts: int) -> None:
+    """Add to the current job's counters, e.g. count(bytes=n); no-op outside jobs"""
+    counters = _counters.get()
+    if counters is not None:
+        counters.add(**amounts)
+
+
+def propagate(func: Callable) -> Callable:
+    """Wrap func so it runs with the caller's job context when called from another thread"""
+    ctx = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # Each call gets its own copy; one Context cannot be entered by two threads at once
+        return ctx.copy().run(func, *args, **kwargs)
+    return run
+
+
+def current_counters() -> Optional[JobCounters]:
+    """Counters of the job running in this context, if any"""
+    return _counters.get()
+
+
+async def bind(coro, writer: Optional[Callable[[str], None]], counters: Optional[JobCounters] = None,
+               cancel: Optional[threading.Event] = None):
+    """Await coro with writer as its job output target, plus the job's counters and cancel flag
+    (for tasks on a shared event loop, which don't inherit the submitting thread's context)"""
+    if writer is not None:
+        _current_writer.set(writer)
+    if counters is not None:
+        _counters.set(counters)
+    if cancel is not None:
+        _cancel_event.set(cancel)
+    return await coro
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Bounded job scheduler
+Dashboard jobs run on a fixed pool of worker threads. Queued jobs are picked by
+priority, identical in-flight jobs are de-duplicated, and jobs holding the same
+remote host or local directory are limited so two pipelines never race on the
+same ZIP_PATH or target directory. Cancellation is cooperative through
+job_context.checkpoint().
+"""
+
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, List, Optional, Iterable
+
+import job_context
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+
+PRIORITIES = {'high': -10, 'normal': 0, 'low': 10}
+
+
+def host_resource(host: str) -> str:
+    return f"host:{host}"
+
+
+def dir_resource(path: str) -> str:
+    return f"dir:{os.path.normcase(os.path.abspath(path))}"
+
+
+class ScheduledJob:
+    """A job waiting for or holding a worker"""
+
+    def __init__(self, job_id: str, job_type: str, func: Callable[[], None], priority: int,
+                 key: Optional[str], resources: List[str], seq: int,
+                 on_cancel: Optional[Callable[[], None]] = None):
+        self.job_id = job_id
+        self.job_type = job_type
+        self.func = func
+        self.on_cancel = on_cancel
+        self.priority = priority
+        self.key = key
+        self.resources = resources
+        self.seq = seq
+        self.state = QUEUED
+        self.cancel_event = threading.Event()
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def __lt__(self, other: 'ScheduledJob') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            'id': self.job_id,
+            'type': self.job_type,
+            'state': self.state,
+            'priority': self.priority,
+            'resources': self.resources,
+            'wait_seconds': round((self.started or now) - self.submitted, 3),
+            'run_seconds': round((self.finished or now) - self.started, 3) if self.started else None,
+            'cancel_requested': self.cancel_event.is_set(),
+        }
+
+
+class JobScheduler:
+    """Fixed worker pool with a priority queue, de-duplication and resource limits"""
+
+    def __init__(self, workers: int = 2, limits: Optional[Dict[str, int]] = None):
+        self.workers = max(1, workers)
+        # Concurrent jobs allowed per resource kind ("host:..." / "dir:...")
+        self.limits = {'host': 1, 'dir': 1}
+        self.limits.update(limits or {})
+        self._queue: List[ScheduledJob] = []
+        self._jobs: Dict[str, ScheduledJob] = {}  # queued and running jobs
+        self._by_key: Dict[str, str] = {}  # dedup key -> job_id of the in-flight job
+        self._in_use: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._waits = deque(maxlen=200)  # queue wait of recently started jobs
+        self.completed = 0
+        self.cancelled = 0
+        self.deduplicated = 0
+
+    def _ensure_workers(self) -> None:
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._worker, name=f"etx-job-worker-{len(self._threads) + 1}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    # ---------- submitting ----------
+
+    def submit(self, job_id: str, job_type: str, func: Callable[[], None], priority: int = 0,
+               key: Optional[str] = None, resources: Iterable[str] = (),
+               on_cancel: Optional[Callable[[], None]] = None) -> str:
+        """Queue func; returns the id of the job that will do the work
+
+        When a queued or running job has the same key, that job's id is returned
+        and func is dropped. on_cancel is called instead of func when the job is
+        cancelled while still queued; it runs in the cancelling thread, so it
+        should only do bookkeeping.
+        """
+        with self._cond:
+            if key is not None and key in self._by_key:
+                self.deduplicated += 1
+                existing = self._by_key[key]
+                logger.info(f"Job {job_type} already in flight as {existing}")
+                return existing
+            job = ScheduledJob(job_id, job_type, func, priority, key, sorted(set(resources)), next(self._seq),
+                               on_cancel)
+            self._jobs[job_id] = job
+            if key is not None:
+                self._by_key[key] = job_id
+            heapq.heappush(self._queue, job)
+            self._ensure_workers()
+            self._cond.notify_all()
+        return job_id
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Request cancellation; returns the job's state at the time, None if unknown
+
+        A queued job is taken off the queue and marked cancelled without running
+        its function; only its on_cancel callback is called.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            state = job.state
+            job.cancel_event.set()
+            if state == QUEUED:
+                self._queue.remove(job)
+                heapq.heapify(self._queue)
+                self._forget(job)
+                job.state = CANCELLED
+                self.cancelled += 1
+        if state == QUEUED:
+            job.finished = time.time()
+            if job.on_cancel is not None:
+                try:
+                    job.on_cancel()
+                except Exception as e:
+                    logger.error(f"on_cancel of {job_id} failed: {e!r}")
+        logger.info(f"Cancellation requested for {job_id} ({state})")
+        return state
+
+    def is_cancelled(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        return job is not None and job.cancel_event.is_set()
+
+    # ---------- running ----------
+
+    def _free(self, resources: Iterable[str]) -> bool:
+        return all(self._in_use.get(r, 0) < self.limits.get(r.split(':', 1)[0], 1) for r in resources)
+
+    def _available(self, job: ScheduledJob) -> bool:
+        return self._free(job.resources)
+
+    @contextmanager
+    def hold(self, resources: Iterable[str]):
+        """Take resources for part of a running job (waits, cancellably, until they are free)
+
+        Long-running jobs such as the watcher submit without resources and hold them
+        only around the work that needs them, so they don't block other jobs while idle.
+        """
+        resources = sorted(set(resources))
+        with self._cond:
+            while not self._free(resources):
+                self._cond.wait(timeout=0.5)
+                job_context.checkpoint()
+            for r in resources:
+                self._in_use[r] = self._in_use.get(r, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                for r in resources:
+                    self._in_use[r] -= 1
+                    if not self._in_use[r]:
+                        del self._in_use[r]
+                self._cond.notify_all()
+
+    def _next_runnable(self) -> Optional[ScheduledJob]:
+        """Highest priority job whose resources are free; blocked jobs don't hold up others"""
+        for job in sorted(self._queue):
+            if self._available(job):
+                self._queue.remove(job)
+                heapq.heapify(self._queue)
+                return job
+        return None
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_runnable()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_runnable()
+                for r in job.resources:
+                    self._in_use[r] = self._in_use.get(r, 0) + 1
+                job.state = RUNNING
+                job.started = time.time()
+                self._waits.append(job.started - job.submitted)
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    for r in job.resources:
+                        self._in_use[r] -= 1
+                        if not self._in_use[r]:
+                            del self._in_use[r]
+                    self._forget(job)
+                    job.state = CANCELLED if job.cancel_event.is_set() else DONE
+                    if job.state == CANCELLED:
+                        self.cancelled += 1
+                    else:
+                        self.completed += 1
+                    self._cond.notify_all()
+
+    def _run(self, job: ScheduledJob) -> None:
+        try:
+            with job_context.cancellable(job.cancel_event), job_context.holding_resources(self.hold):
+                job.func()
+        except BaseException as e:
+            # func is expected to handle its own errors; never let one kill a worker
+            logger.error(f"Job {job.job_id} escaped its handler: {e!r}")
+        finally:
+            job.finished = time.time()
+
+    def _forget(self, job: ScheduledJob) -> None:
+        self._jobs.pop(job.job_id, None)
+        if job.key is not None and self._by_key.get(job.key) == job.job_id:
+            del self._by_key[job.key]
+
+    # ---------- introspection ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.time()
+            queued = sorted(self._queue)
+            waits = list(self._waits)
+            return {
+                'workers': self.workers,
+                'limits': dict(self.limits),
+                'queue_depth': len(queued),
+                'running': sum(1 for j in self._jobs.values() if j.state == RUNNING),
+                'completed': self.completed,
+                'cancelled': self.cancelled,
+                'deduplicated': self.deduplicated,
+                'oldest_wait_seconds': round(now - queued[0].submitted, 3) if queued else 0.0,
+                'avg_wait_seconds': round(sum(waits) / len(waits), 3) if waits else 0.0,
+                'max_wait_seconds': round(max(waits), 3) if waits else 0.0,
+                'resources_in_use': dict(self._in_use),
+                'jobs': [j.to_dict() for j in self._jobs.values() if j.state == RUNNING] +
+                        [j.to_dict() for j in queued],
+            }
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Batched HPC job tracker
+Parses job IDs out of submission output (ansys_sub, qsub, sbatch, bsub, phd run)
+and polls every tracked job on a host with one combined status query, backing
+off while nothing changes. Polling cost is per host, not per job.
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import deque
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Normalized job states
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+UNKNOWN = 'unknown'
+LOST = 'lost'
+FINAL_STATES = (COMPLETED, FAILED, LOST)
+
+# Scheduler definitions: how to recognise a submission, pull the job ID out of
+# its output, query many jobs at once and map native state codes.
+SCHEDULERS: Dict[str, Dict[str, Any]] = {
+    'slurm': {
+        'submit': re.compile(r'\b(sbatch)\b'),
+        'job_id': re.compile(r'Submitted batch job (\d+)'),
+        'status': 'squeue -h -o "%i %T" -j {ids_comma} 2>/dev/null',
+        'states': {'PENDING': QUEUED, 'CONFIGURING': QUEUED, 'RUNNING': RUNNING, 'COMPLETING': RUNNING,
+                   'COMPLETED': COMPLETED, 'FAILED': FAILED, 'CANCELLED': FAILED, 'TIMEOUT': FAILED,
+                   'NODE_FAIL': FAILED, 'OUT_OF_MEMORY': FAILED},
+        'state_column': 1,
+    },
+    'lsf': {
+        'submit': re.compile(r'\b(bsub)\b'),
+        'job_id': re.compile(r'Job <(\d+)> is submitted'),
+        'status': 'bjobs -noheader -o "jobid stat" {ids_space} 2>/dev/null',
+        'states': {'PEND': QUEUED, 'PSUSP': QUEUED, 'RUN': RUNNING, 'USUSP': RUNNING, 'SSUSP': RUNNING,
+                   'DONE': COMPLETED, 'EXIT': FAILED},
+        'state_column': 1,
+    },
+    'pbs': {
+        # ansys_sub wraps qsub on the ETX login nodes and echoes the PBS job ID
+        'submit': re.compile(r'\b(qsub|ansys_sub)\b'),
+        # qsub replies <number>.<server>; a bare number line (a count, an echoed $?) is not a job id
+        'job_id': re.compile(r'^\s*(\d+)\.[\w.-]+\s*$|[Jj]ob\s*(?:ID|id|Id)?\s*[:=<]?\s*(\d+)', re.MULTILINE),
+        'status': 'qstat {ids_space} 2>/dev/null',
+        'states': {'Q': QUEUED, 'H': QUEUED, 'W': QUEUED, 'R': RUNNING, 'E': RUNNING,
+                   'C': COMPLETED, 'F': COMPLETED},
+        'state_column': 4,
+    },
+    'phd': {
+        'submit': re.compile(r'\bphd\s+run\b'),
+        'job_id': re.compile(r'[Jj]ob\s*(?:ID|id|Id)?\s*[:=<]?\s*(\d+)'),
+        'status': 'phd list 2>/dev/null',
+        'states': {'PEND': QUEUED, 'PENDING': QUEUED, 'QUEUED': QUEUED, 'RUN': RUNNING, 'RUNNING': RUNNING,
+                   'DONE': COMPLETED, 'COMPLETED': COMPLETED, 'EXIT': FAILED, 'FAILED': FAILED},
+        'state_column': None,  # phd list has no fixed layout, look for any known state token
+    },
+}
+
+_SECTION = '__ETX_SCHED_{}__'
+
+
+class TrackedJob:
+    """A submitted HPC job and its last known state"""
+
+    def __init__(self, job_id: str, scheduler: str, host: str, command: str):
+        self.job_id = job_id
+        self.scheduler = scheduler
+        self.host = host
+        self.command = command
+        self.state = QUEUED
+        self.native_state = ''
+        self.submitted = time.time()
+        self.updated = self.submitted
+        self.finished: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id,
+            'scheduler': self.scheduler,
+            'host': self.host,
+            'command': self.command,
+            'state': self.state,
+            'native_state': self.native_state,
+            'submitted': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.submitted)),
+            'updated': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.updated)),
+        }
+
+
+class _HostPoller:
+    """Tracked jobs and backoff state for one remote host"""
+
+    def __init__(self, executor, min_interval: float):
+        self.executor = executor
+        self.jobs: Dict[str, TrackedJob] = {}
+        self.interval = min_interval
+        self.next_poll = 0.0
+        self.polls = 0
+
+
+class JobTracker:
+    """Tracks submitted jobs and polls them in one batched query per host"""
+
+    def __init__(self, min_interval: float = 10.0, max_interval: float = 300.0, keep_finished: int = 500):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._hosts: Dict[str, _HostPoller] = {}
+        self._finished = deque(maxlen=keep_finished)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- submission parsing ----------
+
+    @staticmethod
+    def parse_submission(command: str, output: str) -> List[Tuple[str, str]]:
+        """Return (scheduler, job_id) pairs found in a submission's output"""
+        found = []
+        for name, sched in SCHEDULERS.items():
+            if not sched['submit'].search(command):
+                continue
+            for match in sched['job_id'].finditer(output or ''):
+                job_id = next(g for g in match.groups() if g)
+                if (name, job_id) not in found:
+                    found.append((name, job_id))
+            if found:
+                break
+        return found
+
+    def track_submission(self, command: str, output: str, executor) -> List[TrackedJob]:
+        """Register jobs submitted by `command`; `executor` is used for later status queries"""
+        parsed = self.parse_submission(command, output)
+        if not parsed:
+            return []
+        host = f"{executor.username}@{executor.host}:{executor.port}"
+        jobs = []
+        with self._lock:
+            poller = self._hosts.get(host)
+            if poller is None:
+                poller = self._hosts[host] = _HostPoller(executor, self.min_interval)
+            for scheduler, job_id in parsed:
+                job = poller.jobs.get(job_id) or TrackedJob(job_id, scheduler, host, command)
+                poller.jobs[job_id] = job
+                jobs.append(job)
+            # A fresh submission resets the backoff so the first transitions are seen quickly
+            poller.interval = self.min_interval
+            poller.next_poll = time.time() + self.min_interval
+        logger.info(f"Tracking {len(jobs)} job(s) on {host}: {', '.join(j.job_id for j in jobs)}")
+        self._ensure_thread()
+        self._wakeup.set()
+        return jobs
+
+    # ---------- polling ----------
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='etx-job-tracker', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                due = [(h, p) for h, p in self._hosts.items() if p.jobs and p.next_poll <= time.time()]
+            for host, poller in due:
+                try:
+                    self.poll_host(host, poller)
+                except Exception as e:
+                    logger.error(f"Job status poll failed for {host}: {e}")
+            with self._lock:
+                next_wake = min((p.next_poll for p in self._hosts.values() if p.jobs), default=None)
+            timeout = None if next_wake is None else max(0.0, next_wake - time.time())
+            if self._wakeup.wait(timeout):
+                self._wakeup.clear()
+
+    def _build_query(self, jobs: List[TrackedJob]) -> str:
+        """One shell command covering every scheduler in use on the host"""
+        parts = []
+        by_scheduler: Dict[str, List[str]] = {}
+        for job in jobs:
+            by_scheduler.setdefault(job.scheduler, []).append(job.job_id)
+        for name, ids in by_scheduler.items():
+            status = SCHEDULERS[name]['status'].format(ids_comma=','.join(ids), ids_space=' '.join(ids))
+            parts.append(f"echo {_SECTION.format(name)}; {status}")
+        return '; '.join(parts)
+
+    def _parse_status(self, output: str) -> Dict[str, Dict[str, str]]:
+        """Split combined output into {scheduler: {job_id: native_state}}"""
+        sections: Dict[str, Dict[str, str]] = {}
+        current = None
+        for line in output.splitlines():
+            marker = re.match(r'__ETX_SCHED_(\w+)__', line.strip())
+            if marker:
+                current = marker.group(1)
+                sections[current] = {}
+                continue
+            if current is None or not line.strip():
+                continue
+            sched = SCHEDULERS[current]
+            tokens = line.split()
+            job_id = tokens[0].split('.')[0]
+            column = sched['state_column']
+            if column is not None:
+                if len(tokens) > column and job_id.isdigit():
+                    sections[current][job_id] = tokens[column]
+            else:
+                for token in tokens:
+                    if token.upper() in sched['states']:
+                        for candidate in tokens:
+                            if candidate.isdigit():
+                                sections[current][candidate] = token.upper()
+                                break
+                        break
+        return sections
+
+    def poll_host(self, host: str, poller: _HostPoller) -> None:
+        """Query every active job on a host with one command and update states"""
+        with self._lock:
+            jobs = list(poller.jobs.values())
+        if not jobs:
+            return
+        # Status queries are not submissions: no tracking, no cache invalidation
+        output = poller.executor.execute_single_command(self._build_query(jobs), track=False)
+        poller.polls += 1
+        if output.startswith('Error:'):
+            changed = False
+        else:
+            changed = self._apply_status(jobs, self._parse_status(output))
+        with self._lock:
+            for job in jobs:
+                if job.state in FINAL_STATES:
+                    poller.jobs.pop(job.job_id, None)
+                    self._finished.append(job)
+            poller.interval = self.min_interval if changed else min(poller.interval * 2, self.max_interval)
+            poller.next_poll = time.time() + poller.interval
+
+    def _apply_status(self, jobs: List[TrackedJob], sections: Dict[str, Dict[str, str]]) -> bool:
+        changed = False
+        now = time.time()
+        for job in jobs:
+            section = sections.get(job.scheduler)
+            if section is None:
+                continue
+            native = section.get(job.job_id)
+            if native is None:
+                if job.native_state:
+                    state = COMPLETED  # schedulers drop finished jobs from their queue listing
+                elif now - job.submitted > self.max_interval:
+                    state = LOST  # never showed up in the listing, stop polling it
+                else:
+                    continue
+            else:
+                state = SCHEDULERS[job.scheduler]['states'].get(native.upper(), UNKNOWN)
+                job.native_state = native
+            if state != job.state:
+                job.state = state
+                job.updated = now
+                if state in FINAL_STATES:
+                    job.finished = now
+                changed = True
+        return changed
+
+    # ---------- queries ----------
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current view of active and recently finished jobs plus polling state"""
+        with self._lock:
+            active = [job.to_dict() for p in self._hosts.values() for job in p.jobs.values()]
+            hosts = {host: {'jobs': len(p.jobs), 'interval': p.interval, 'polls': p.polls}
+                     for host, p in self._hosts.items()}
+            finished = [job.to_dict() for job in reversed(self._finished)]
+        return {'active': active, 'finished': finished, 'hosts': hosts}
+
+
+# Shared tracker used by the executors and the dashboard
+tracker = JobTracker()
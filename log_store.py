@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Job log store
+Append-only segmented logs: appends go into a small tail buffer that is sealed
+into fixed-size segments, disk writes are batched by a background flusher, and
+memory is bounded by a byte budget. Finished jobs are served from disk only.
+Offsets are byte offsets into the UTF-8 encoded log.
+
+On disk a log is split into files of about ROTATE_SIZE bytes named
+<job_id>.<start offset>.log; each is gzip-compressed in the background once it
+is rotated out or the job finishes (<job_id>.<start offset>.log.gz). Readers
+seek within one segment at most, so tail/head/search and ranged reads never
+decompress or load a whole log. A plain <job_id>.log from older versions is
+read as a single segment and compressed by compact().
+"""
+
+import os
+import re
+import glob
+import gzip
+import time
+import queue
+import bisect
+import shutil
+import struct
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SIZE = 64 * 1024
+FLUSH_INTERVAL = 0.5
+MEMORY_BUDGET = 64 * 1024 * 1024
+ROTATE_SIZE = 16 * 1024 * 1024
+COMPRESS_LEVEL = 6
+READ_CHUNK = 64 * 1024
+# Longest line returned by head/tail/search; the rest is cut off
+MAX_LINE = 4096
+
+_SEGMENT_NAME = re.compile(r'^(?P<job>.+)\.(?P<start>\d{12})\.log(?P<gz>\.gz)?$')
+
+
+def _open_segment(path: str):
+    """Open a segment by its uncompressed name, falling back to the .gz it may have become meanwhile"""
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        return gzip.open(path + '.gz', 'rb')
+
+
+def _segment_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        pass
+    # gzip keeps the uncompressed size (mod 2**32) in its last four bytes; segments are far smaller
+    with open(path + '.gz', 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return struct.unpack('<I', f.read(4))[0]
+
+
+class _JobLog:
+    """In-memory state of one running job's log"""
+
+    def __init__(self, store: 'JobLogStore', job_id: str):
+        self.job_id = job_id
+        self.path = store.path(job_id)
+        self.segments: List[bytes] = []
+        self.starts: List[int] = []  # byte offset of each segment
+        self.tail = bytearray()
+        self.mem_start = 0  # bytes before this offset are only on disk
+        self.size = 0
+        self.pending: List[bytes] = []
+        self.pending_bytes = 0
+        # Current on-disk segment
+        self.file_start = 0
+        self.file_bytes = 0
+        self.file_path = store.segment_path(job_id, 0)
+        self.file = open(self.file_path, 'wb')
+
+    @property
+    def tail_start(self) -> int:
+        return self.size - len(self.tail)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.size - self.mem_start
+
+
+class JobLogStore:
+    """Segmented job logs with buffered flushing, a memory budget and compressed rotated files"""
+
+    def __init__(self, log_dir: str, memory_budget: int = MEMORY_BUDGET, flush_interval: float = FLUSH_INTERVAL,
+                 rotate_size: int = ROTATE_SIZE):
+        self.log_dir = log_dir
+        self.memory_budget = memory_budget
+        self.flush_interval = flush_interval
+        self.rotate_size = max(SEGMENT_SIZE, rotate_size)
+        self._logs: Dict[str, _JobLog] = {}
+        self._lock = threading.RLock()
+        # Notified on every append and finish so streaming readers can wake up
+        self.updated = threading.Condition(self._lock)
+        self._flusher: Optional[threading.Thread] = None
+        self._compress_queue: 'queue.Queue' = queue.Queue()
+        self._compressor: Optional[threading.Thread] = None
+
+    def path(self, job_id: str) -> str:
+        """Nominal log path; the files on disk are <path stem>.<start>.log[.gz] segments"""
+        return os.path.join(self.log_dir, f"{job_id}.log")
+
+    def segment_path(self, job_id: str, start: int) -> str:
+        return os.path.join(self.log_dir, f"{job_id}.{start:012d}.log")
+
+    # ---------- writing ----------
+
+    def create(self, job_id: str) -> str:
+        with self._lock:
+            log = _JobLog(self, job_id)
+            self._logs[job_id] = log
+        self._ensure_flusher()
+        return log.path
+
+    def append(self, job_id: str, text: str) -> None:
+        data = text.encode('utf-8')
+        with self.updated:
+            log = self._logs[job_id]
+            log.tail += data
+            log.size += len(data)
+            log.pending.append(data)
+            log.pending_bytes += len(data)
+            if len(log.tail) >= SEGMENT_SIZE:
+                log.starts.append(log.tail_start)
+                log.segments.append(bytes(log.tail))
+                log.tail = bytearray()
+                self._enforce_budget()
+            self.updated.notify_all()
+
+    def finish(self, job_id: str) -> None:
+        """Flush and close a job's log, drop it from memory and compress its last segment"""
+        with self.updated:
+            log = self._logs.pop(job_id, None)
+            if log is not None:
+                self._flush(log)
+                log.file.close()
+                if log.file_bytes or not log.file_start:
+                    self._compress_later(log.file_path)
+                else:
+                    os.remove(log.file_path)  # opened by a rotation that nothing was written after
+            self.updated.notify_all()
+
+    def _flush(self, log: _JobLog) -> None:
+        if log.pending:
+            data = b''.join(log.pending)
+            log.file.write(data)
+            log.file.flush()
+            log.file_bytes += len(data)
+            log.pending = []
+            log.pending_bytes = 0
+            if log.file_bytes >= self.rotate_size:
+                self._rotate(log)
+
+    def _rotate(self, log: _JobLog) -> None:
+        log.file.close()
+        self._compress_later(log.file_path)
+        log.file_start += log.file_bytes
+        log.file_bytes = 0
+        log.file_path = self.segment_path(log.job_id, log.file_start)
+        log.file = open(log.file_path, 'wb')
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name='etx-log-flusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                for log in list(self._logs.values()):
+                    try:
+                        self._flush(log)
+                    except Exception as e:
+                        logger.error(f"Failed to flush {log.path}: {e}")
+
+    def _enforce_budget(self) -> None:
+        """Drop the oldest sealed segments of the biggest logs until under budget"""
+        total = sum(log.memory_bytes for log in self._logs.values())
+        while total > self.memory_budget:
+            biggest = max(self._logs.values(), key=lambda log: len(log.segments))
+            if not biggest.segments:
+                return
+            self._flush(biggest)  # everything dropped from memory must be on disk
+            dropped = biggest.segments.pop(0)
+            biggest.starts.pop(0)
+            biggest.mem_start += len(dropped)
+            total -= len(dropped)
+
+    # ---------- compression ----------
+
+    def _compress_later(self, path: str, target: Optional[str] = None) -> None:
+        self._compress_queue.put((path, target or path + '.gz'))
+        with self._lock:
+            if self._compressor is None or not self._compressor.is_alive():
+                self._compressor = threading.Thread(target=self._compress_loop, name='etx-log-compressor',
+                                                    daemon=True)
+                self._compressor.start()
+
+    def _compress_loop(self) -> None:
+        while True:
+            path, target = self._compress_queue.get()
+            try:
+                self._compress(path, target)
+            except Exception as e:
+                logger.error(f"Failed to compress {path}: {e}")
+            finally:
+                self._compress_queue.task_done()
+
+    @staticmethod
+    def _compress(path: str, target: str) -> None:
+        if not os.path.exists(target):
+            tmp = target + '.tmp'
+            with open(path, 'rb') as src, gzip.open(tmp, 'wb', compresslevel=COMPRESS_LEVEL) as dst:
+                shutil.copyfileobj(src, dst, READ_CHUNK)
+            # Readers switch to the .gz the moment it appears, so it must appear complete
+            os.replace(tmp, target)
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # still open by a reader on Windows; compact() removes it later
+
+    def compact(self) -> int:
+        """Compress segments left uncompressed by a crash and logs from older versions; returns files queued"""
+        with self._lock:
+            hot = {log.file_path for log in self._logs.values()}
+        queued = 0
+        for path in glob.glob(os.path.join(glob.escape(self.log_dir), '*.log')):
+            name = os.path.basename(path)
+            match = _SEGMENT_NAME.match(name)
+            if match:
+                if path not in hot:
+                    self._compress_later(path)
+                    queued += 1
+                continue
+            job_id = name[:-len('.log')]
+            if job_id in self._logs:
+                continue
+            target = self.segment_path(job_id, 0) + '.gz'
+            if not os.path.exists(self.segment_path(job_id, 0)):
+                self._compress_later(path, target)
+                queued += 1
+        return queued
+
+    def wait_compressed(self) -> None:
+        """Block until every queued segment is compressed"""
+        self._compress_queue.join()
+
+    # ---------- reading ----------
+
+    def _disk_segments(self, job_id: str) -> List[Tuple[int, str]]:
+        """(start offset, uncompressed segment path) of a log's files, in order"""
+        stem = os.path.join(glob.escape(self.log_dir), glob.escape(job_id))
+        starts = {}
+        for path in glob.glob(stem + '.' + '[0-9]' * 12 + '.log*'):
+            match = _SEGMENT_NAME.match(os.path.basename(path))
+            if match and match.group('job') == job_id:
+                starts[int(match.group('start'))] = self.segment_path(job_id, int(match.group('start')))
+        legacy = self.path(job_id)
+        if 0 not in starts and os.path.exists(legacy):
+            starts[0] = legacy
+        return sorted(starts.items())
+
+    def exists(self, job_id: str) -> bool:
+        return job_id in self._logs or bool(self._disk_segments(job_id))
+
+    def size(self, job_id: str) -> int:
+        with self._lock:
+            log = self._logs.get(job_id)
+            if log is not None:
+                return log.size
+        segments = self._disk_segments(job_id)
+        if not segments:
+            return 0
+        start, path = segments[-1]
+        try:
+            return start + _segment_size(path)
+        except FileNotFoundError:
+            return 0
+
+    def read(self, job_id: str, offset: int = 0, length: Optional[int] = None) -> bytes:
+        """Bytes [offset, offset+length) of a job log, from memory when hot, else from disk"""
+        with self._lock:
+            log = self._logs.get(job_id)
+            if log is not None:
+                end = log.size if length is None else min(log.size, offset + length)
+                if offset >= log.mem_start:
+                    return self._read_memory(log, offset, end)
+                self._flush(log)
+                length = end - offset
+        return b''.join(self.iter_bytes(job_id, offset, None if length is None else offset + length))
+
+    def iter_bytes(self, job_id: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = READ_CHUNK) -> Iterator[bytes]:
+        """Stream bytes [start, end) from the disk segments, decompressing as it goes"""
+        with self._lock:
+            log = self._logs.get(job_id)
+            if log is not None:
+                self._flush(log)
+                end = log.size if end is None else min(end, log.size)
+        segments = self._disk_segments(job_id)
+        for index, (seg_start, path) in enumerate(segments):
+            seg_end = segments[index + 1][0] if index + 1 < len(segments) else None
+            if (seg_end is not None and seg_end <= start) or (end is not None and seg_start >= end):
+                continue
+            try:
+                f = _open_segment(path)
+            except FileNotFoundError:
+                continue
+            with f:
+                position = max(start, seg_start)
+                if position > seg_start:
+                    f.seek(position - seg_start)  # on a .gz this decompresses up to there: one segment at most
+                while end is None or position < end:
+                    want = chunk_size if end is None else min(chunk_size, end - position)
+                    data = f.read(want)
+                    if not data:
+                        break
+                    position += len(data)
+                    yield data
+
+    def _read_memory(self, log: _JobLog, offset: int, end: int) -> bytes:
+        parts = []
+        index = max(0, bisect.bisect_right(log.starts, offset) - 1)
+        while index < len(log.segments) and log.starts[index] < end:
+            start = log.starts[index]
+            segment = log.segments[index]
+            parts.append(segment[max(0, offset - start):end - start])
+            index += 1
+        if end > log.tail_start:
+            start = log.tail_start
+            parts.append(bytes(log.tail[max(0, offset - start):end - start]))
+        return b''.join(parts)
+
+    # ---------- line queries ----------
+
+    @staticmethod
+    def _line(data: bytes) -> str:
+        return data.decode('utf-8', errors='replace').rstrip('\r')
+
+    def iter_lines(self, job_id: str, start: int = 0) -> Iterator[Tuple[int, int, bytes]]:
+        """(offset, next line's offset, first MAX_LINE bytes) of every line from start; memory stays bounded"""
+        offset, kept, length = start, b'', 0
+        for chunk in self.iter_bytes(job_id, start):
+            position = 0
+            while True:
+                newline = chunk.find(b'\n', position)
+                piece = chunk[position:] if newline < 0 else chunk[position:newline]
+                if len(kept) < MAX_LINE:
+                    kept += piece[:MAX_LINE - len(kept)]
+                length += len(piece)
+                if newline < 0:
+                    break
+                yield offset, offset + length + 1, kept
+                offset += length + 1
+                kept, length = b'', 0
+                position = newline + 1
+        if length:
+            yield offset, offset + length, kept
+
+    def head(self, job_id: str, lines: int) -> dict:
+        """First `lines` lines and the offset just after them"""
+        result, offset = [], 0
+        if lines > 0:
+            for _, offset, data in self.iter_lines(job_id):
+                result.append(self._line(data))
+                if len(result) >= lines:
+                    break
+        return {'lines': result, 'offset': offset, 'size': self.size(job_id)}
+
+    def tail(self, job_id: str, lines: int) -> dict:
+        """Last `lines` lines, read backwards from the end; offset is where the first of them starts"""
+        size = self.size(job_id)
+        position, buffer = size, b''
+        # Read growing chunks backwards until there are enough line breaks (or enough bytes for them)
+        while position > 0 and buffer.count(b'\n') <= lines and len(buffer) < (lines + 1) * MAX_LINE:
+            step = min(max(READ_CHUNK, len(buffer)), position)
+            position -= step
+            buffer = self.read(job_id, position, step) + buffer
+        body = buffer[:-1] if buffer.endswith(b'\n') else buffer
+        parts = body.split(b'\n') if body else []
+        if position > 0 and parts:
+            parts.pop(0)  # starts mid-line
+        parts = parts[-lines:] if lines > 0 else []
+        start = position + len(body) - sum(len(part) + 1 for part in parts) + 1 if parts else size
+        return {'lines': [self._line(part[:MAX_LINE]) for part in parts], 'offset': max(0, start), 'size': size}
+
+    def search(self, job_id: str, pattern: 're.Pattern', max_matches: int = 200) -> dict:
+        """Lines matching pattern with their line number and byte offset, streamed segment by segment"""
+        matches, line_no = [], 0
+        truncated = False
+        for line_no, (offset, _, data) in enumerate(self.iter_lines(job_id), 1):
+            text = self._line(data)
+            if pattern.search(text):
+                if len(matches) >= max_matches:
+                    truncated = True
+                    break
+                matches.append({'line': line_no, 'offset': offset, 'text': text})
+        return {'matches': matches, 'truncated': truncated, 'lines_scanned': line_no}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hot_logs': len(self._logs),
+                'memory_bytes': sum(log.memory_bytes for log in self._logs.values()),
+                'memory_budget': self.memory_budget,
+                'compress_queue': self._compress_queue.qsize(),
+            }
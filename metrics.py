@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Pipeline metrics
+In-memory counters and fixed-bucket histograms for the pipeline stages
+(download, unzip, copy, upload, SSH connect, remote commands), rendered in the
+Prometheus text format for /metrics. Memory stays bounded: buckets are fixed
+and each metric keeps at most MAX_SERIES label combinations. Every timed stage
+also adds `<stage>_seconds` to the current job's counters, so the per-job
+numbers end up in the job history next to the byte/file counts.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import job_context
+
+# Seconds; covers a sub-second mkdir up to a long remote job step
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# Label combinations kept per metric; later ones are folded into one `_other` series
+MAX_SERIES = 64
+OVERFLOW = '_other'
+
+# Per-job counters that measure each stage's work: (bytes counter, items counter)
+STAGE_UNITS = {
+    'download': ('download_bytes', None),
+    'unzip': (None, 'extracted_files'),
+    'copy': (None, 'copied_files'),
+    'upload': ('upload_bytes', 'uploaded_files'),
+    'ssh_connect': (None, 'ssh_connects'),
+    'remote_command': (None, 'remote_commands'),
+}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        key = tuple(str(labels.get(n, '')) for n in self.label_names)
+        if key not in self._series and len(self._series) >= MAX_SERIES:
+            key = tuple(OVERFLOW for _ in self.label_names)
+        return key
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            for key, value in series:
+                lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        with self._lock:
+            key = self._key(labels)
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _render_series(self, key, value) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DURATION_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        with self._lock:
+            key = self._key(labels)
+            series = self._series.get(key)
+            if series is None:
+                # [per-bucket counts..., sum, count]
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def _render_series(self, key, value) -> List[str]:
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, value):
+            cumulative += n
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {value[-1]}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(value[-2])}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {value[-1]}")
+        return lines
+
+
+class Registry:
+    """The process-wide set of metrics, in registration order"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=DURATION_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram('etx_stage_duration_seconds', 'Duration of pipeline stages', ('stage', 'outcome'))
+STAGE_BYTES = REGISTRY.counter('etx_stage_bytes_total', 'Bytes moved by pipeline stages', ('stage',))
+STAGE_ITEMS = REGISTRY.counter('etx_stage_items_total', 'Files, archive members, connections or commands handled by stage', ('stage',))
+
+
+class Stage:
+    """Handle yielded by stage(); set outcome to label a run that returned normally but failed"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.outcome = 'ok'
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage into the histograms and the current job's `<name>_seconds` counter
+
+    The outcome label is `error` when the block raises (`cancelled` for a cancelled
+    job) unless the block has already set stage.outcome itself.
+    """
+    handle = Stage(name)
+    started = time.perf_counter()
+    try:
+        yield handle
+    except job_context.JobCancelled:
+        handle.outcome = 'cancelled'
+        raise
+    except BaseException:
+        if handle.outcome == 'ok':
+            handle.outcome = 'error'
+        raise
+    finally:
+        observe(name, time.perf_counter() - started, handle.outcome)
+
+
+def observe(stage_name: str, seconds: float, outcome: str = 'ok') -> None:
+    """Record an already measured stage duration (for loops that time themselves)"""
+    STAGE_SECONDS.observe(seconds, stage=stage_name, outcome=outcome)
+    job_context.count(**{f"{stage_name}_seconds": seconds})
+
+
+def record(stage_name: str, **amounts: int) -> None:
+    """Count work done by a stage, e.g. record('upload', uploaded_files=1, upload_bytes=n)
+
+    Goes to the current job's counters and to the process-wide *_bytes / items totals.
+    """
+    job_context.count(**amounts)
+    for key, amount in amounts.items():
+        (STAGE_BYTES if key.endswith('_bytes') else STAGE_ITEMS).inc(amount, stage=stage_name)
+
+
+def connect_ssh(client, **connect_params) -> None:
+    """client.connect() timed as the ssh_connect stage (TCP connect, handshake and auth)"""
+    with stage('ssh_connect'):
+        client.connect(**connect_params)
+    record('ssh_connect', ssh_connects=1)
+
+
+def job_summary(counters: Dict[str, float]) -> Dict[str, Dict[str, Optional[float]]]:
+    """Per-stage seconds, amounts and rates from one job's counters"""
+    stages = {}
+    for name in sorted({k[:-len('_seconds')] for k in counters if k.endswith('_seconds')}):
+        seconds = counters[f"{name}_seconds"]
+        bytes_key, items_key = STAGE_UNITS.get(name, (None, None))
+        entry: Dict[str, Optional[float]] = {'seconds': round(seconds, 3)}
+        if bytes_key:
+            entry['bytes'] = counters.get(bytes_key, 0)
+            entry['bytes_per_sec'] = round(entry['bytes'] / seconds, 1) if seconds > 0 else None
+        if items_key:
+            entry['items'] = counters.get(items_key, 0)
+            entry['items_per_sec'] = round(entry['items'] / seconds, 2) if seconds > 0 else None
+        stages[name] = entry
+    return stages
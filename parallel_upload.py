@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Size-aware parallel uploads
+Uploads a set of files over several SFTP channels on one SSH connection.
+Work is ordered largest first so the long transfers start immediately and
+small files fill the gaps at the end:
+
+  - files of at least CHUNK_THRESHOLD bytes are split into byte ranges that
+    different channels write concurrently at their offsets in the remote file
+  - files below SMALL_FILE are batched (up to BATCH_FILES / BATCH_BYTES per
+    work item), so a channel uploads a run of them without going back to the
+    queue for each one
+
+One huge checkpoint therefore keeps every channel busy instead of one, and
+TransferProgress reports overall and per-file progress with rates and ETAs.
+"""
+
+import os
+import time
+import queue
+import posixpath
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import job_context
+import metrics
+from Github_to_Local_to_ETX import sftp_upload_file
+
+UPLOAD_CHANNELS = 4
+SMALL_FILE = 256 * 1024
+BATCH_FILES = 64
+BATCH_BYTES = 4 * 1024 * 1024
+CHUNK_THRESHOLD = 64 * 1024 * 1024
+MIN_PART = 16 * 1024 * 1024
+BLOCK = 32768  # paramiko's largest SFTP write request
+PROGRESS_INTERVAL = 5.0
+
+
+def _size(n: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024:
+            return f"{n:.1f} {unit}" if unit != 'B' else f"{int(n)} B"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+def _eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '?'
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class TransferProgress:
+    """Bytes done per file and overall; report() prints rates and ETAs at most every `interval` seconds"""
+
+    def __init__(self, sizes: Dict[str, int], interval: float = PROGRESS_INTERVAL, show_files: int = UPLOAD_CHANNELS):
+        self.sizes = sizes
+        self.total = sum(sizes.values())
+        self.interval = interval
+        self.show_files = show_files
+        self.started = time.monotonic()
+        self.done_bytes = 0
+        self.done_files = 0
+        self._file_bytes: Dict[str, int] = {}
+        self._file_started: Dict[str, float] = {}
+        self._last_report = self.started
+        self._lock = threading.Lock()
+
+    def add(self, rel: str, nbytes: int) -> None:
+        with self._lock:
+            self._file_started.setdefault(rel, time.monotonic())
+            self._file_bytes[rel] = self._file_bytes.get(rel, 0) + nbytes
+            self.done_bytes += nbytes
+        self.report()
+
+    def finish(self, rel: str) -> None:
+        """Count rel as complete (also when it failed, so the ETA only covers what is left to send)"""
+        with self._lock:
+            self.done_bytes += self.sizes[rel] - self._file_bytes.pop(rel, 0)
+            self._file_started.pop(rel, None)
+            self.done_files += 1
+        self.report()
+
+    def callback(self, rel: str):
+        """paramiko put() callback (cumulative bytes) feeding add()"""
+        sent = [0]
+
+        def update(transferred: int, _total: int) -> None:
+            self.add(rel, transferred - sent[0])
+            sent[0] = transferred
+        return update
+
+    def report(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_report < self.interval:
+                return
+            self._last_report = now
+            elapsed = max(now - self.started, 1e-6)
+            rate = self.done_bytes / elapsed
+            eta = (self.total - self.done_bytes) / rate if rate else None
+            lines = [f"Progress: {self.done_bytes * 100 / max(self.total, 1):.1f}% "
+                     f"({_size(self.done_bytes)} / {_size(self.total)}), "
+                     f"{self.done_files}/{len(self.sizes)} files, {_size(rate)}/s, ETA {_eta(eta)}"]
+            in_flight = sorted(self._file_bytes, key=lambda r: -self.sizes[r])[:self.show_files]
+            for rel in in_flight:
+                done, size = self._file_bytes[rel], self.sizes[rel]
+                file_rate = done / max(now - self._file_started[rel], 1e-6)
+                lines.append(f"  {rel}: {done * 100 / max(size, 1):.1f}% of {_size(size)}, {_size(file_rate)}/s, "
+                             f"ETA {_eta((size - done) / file_rate if file_rate else None)}")
+        print('\n'.join(lines))
+
+
+class _ChunkedFile:
+    """A large file whose byte ranges are written by several channels"""
+
+    def __init__(self, rel: str, local: str, remote: str, size: int, parts: int):
+        self.rel = rel
+        self.local = local
+        self.remote = remote
+        self.size = size
+        self.parts_left = parts
+        self.failed = False
+        self.lock = threading.Lock()
+
+
+class ParallelUploader:
+    """Uploads files below local_dir to remote_dir over `channels` SFTP channels (see module docstring)"""
+
+    def __init__(self, sftp, local_dir: str, remote_dir: str, channels: int = UPLOAD_CHANNELS,
+                 chunk_threshold: int = CHUNK_THRESHOLD, progress_interval: float = PROGRESS_INTERVAL):
+        self.sftp = sftp
+        self.local_dir = local_dir
+        self.remote_dir = remote_dir
+        self.channels = max(1, channels)
+        self.chunk_threshold = chunk_threshold
+        self.progress_interval = progress_interval
+        self.ok = 0
+        self.failed = 0
+        self._queue: 'queue.Queue[tuple]' = queue.Queue()
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+
+    def _paths(self, rel: str) -> Tuple[str, str]:
+        return (os.path.join(self.local_dir, *rel.split('/')),
+                posixpath.join(self.remote_dir.replace('\\', '/'), rel))
+
+    def _plan(self, sizes: Dict[str, int]) -> List[Tuple[int, tuple]]:
+        """(bytes, work item) pairs, largest first"""
+        items, batch, batch_bytes = [], [], 0
+        for rel, size in sorted(sizes.items(), key=lambda item: -item[1]):
+            if size >= self.chunk_threshold and self.channels > 1:
+                part = max(MIN_PART, -(-size // self.channels))
+                part += -part % BLOCK
+                parts = -(-size // part)
+                local, remote = self._paths(rel)
+                chunked = _ChunkedFile(rel, local, remote, size, parts)
+                items += [(min(part, size - offset), ('part', chunked, offset, min(part, size - offset)))
+                          for offset in range(0, size, part)]
+            elif size >= SMALL_FILE:
+                items.append((size, ('file', rel)))
+            else:
+                batch.append(rel)
+                batch_bytes += size
+                if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+                    items.append((batch_bytes, ('batch', batch)))
+                    batch, batch_bytes = [], 0
+        if batch:
+            items.append((batch_bytes, ('batch', batch)))
+        items.sort(key=lambda item: -item[0])
+        return items
+
+    def _count(self, success: bool) -> None:
+        with self._lock:
+            if success:
+                self.ok += 1
+            else:
+                self.failed += 1
+
+    def _put_file(self, sftp, rel: str) -> None:
+        local, remote = self._paths(rel)
+        self._count(sftp_upload_file(sftp, local, remote, callback=self.progress.callback(rel)))
+        self.progress.finish(rel)
+
+    def _put_part(self, sftp, chunked: _ChunkedFile, offset: int, length: int) -> None:
+        if not chunked.failed:
+            try:
+                with open(chunked.local, 'rb') as src, sftp.open(chunked.remote, 'r+') as dst:
+                    dst.set_pipelined(True)
+                    src.seek(offset)
+                    dst.seek(offset)
+                    remaining = length
+                    blocks = 0
+                    while remaining:
+                        blocks += 1
+                        if blocks % 32 == 0:
+                            job_context.checkpoint()
+                        data = src.read(min(BLOCK, remaining))
+                        if not data:
+                            raise IOError(f"{chunked.local} is shorter than when the upload started")
+                        dst.write(data)
+                        remaining -= len(data)
+                        self.progress.add(chunked.rel, len(data))
+            except job_context.JobCancelled:
+                raise
+            except Exception as e:
+                print(f"Failed to upload bytes {offset}-{offset + length} of {chunked.local} to {chunked.remote}: {e}")
+                chunked.failed = True
+        with chunked.lock:
+            chunked.parts_left -= 1
+            if chunked.parts_left:
+                return
+        # Last part finished: verify the whole file
+        success = False
+        if not chunked.failed:
+            try:
+                remote_size = sftp.stat(chunked.remote).st_size
+                if remote_size == chunked.size:
+                    print(f"Uploaded and verified: {chunked.remote}")
+                    metrics.record('upload', uploaded_files=1, upload_bytes=chunked.size)
+                    success = True
+                else:
+                    print(f"WARNING: Size mismatch for {chunked.remote} (local: {chunked.size}, remote: {remote_size})")
+            except Exception as e:
+                print(f"Could not verify {chunked.remote}: {e}")
+        self._count(success)
+        self.progress.finish(chunked.rel)
+
+    def _work(self, sftp, own_channel: bool) -> None:
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    return
+                job_context.checkpoint()
+                if item[0] == 'part':
+                    self._put_part(sftp, *item[1:])
+                elif item[0] == 'file':
+                    self._put_file(sftp, item[1])
+                else:
+                    for rel in item[1]:
+                        job_context.checkpoint()
+                        self._put_file(sftp, rel)
+        except BaseException as e:
+            with self._lock:
+                self._error = self._error or e
+            self._stop.set()
+        finally:
+            if own_channel:
+                sftp.close()
+
+    def _create_chunked(self, items: List[Tuple[int, tuple]]) -> None:
+        """Create (truncate) each chunked file once, before its parts are written with r+"""
+        created = set()
+        for _, item in items:
+            if item[0] == 'part' and item[1].rel not in created:
+                created.add(item[1].rel)
+                try:
+                    self.sftp.open(item[1].remote, 'w').close()
+                except Exception as e:
+                    print(f"Failed to create {item[1].remote}: {e}")
+                    item[1].failed = True
+
+    def upload(self, sizes: Dict[str, int]) -> bool:
+        """Upload every relative POSIX path in sizes (rel -> bytes); remote directories must exist. True if all did"""
+        items = self._plan(sizes)
+        self.progress = TransferProgress(sizes, self.progress_interval, self.channels)
+        self._create_chunked(items)
+        for _, item in items:
+            self._queue.put(item)
+        # Channel 1 is the caller's session; the others share its SSH transport
+        sessions = [(self.sftp, False)]
+        transport = self.sftp.get_channel().get_transport()
+        for _ in range(min(self.channels, len(items)) - 1):
+            try:
+                sessions.append((transport.open_sftp_client(), True))
+            except Exception as e:
+                print(f"WARNING: Could only open {len(sessions)} SFTP channel(s): {e}")
+                break
+        chunked = sum(1 for _, item in items if item[0] == 'part' and item[2] == 0)
+        print(f"Uploading {len(sizes)} files ({_size(self.progress.total)}) over {len(sessions)} channel(s); "
+              f"{chunked} large file(s) split into parts")
+        threads = [threading.Thread(target=job_context.propagate(self._work), args=session,
+                                    name=f"etx-upload-{i + 1}", daemon=True) for i, session in enumerate(sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if self._error is not None:
+            raise self._error
+        self.progress.report(force=True)
+        return self.failed == 0
+
+
+def upload_files(sftp, local_dir: str, remote_dir: str, sizes: Dict[str, int],
+                 channels: int = UPLOAD_CHANNELS) -> Tuple[int, int]:
+    """Upload sizes' files (rel -> bytes) in parallel; returns (succeeded, failed)"""
+    uploader = ParallelUploader(sftp, local_dir, remote_dir, channels)
+    uploader.upload(sizes)
+    return uploader.ok, uploader.failed
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Include/exclude filters for the files that move through the pipeline
+SYNC_EXCLUDE and SYNC_INCLUDE in settings.txt hold gitignore-style patterns,
+one per line:
+
+  SYNC_EXCLUDE=
+  .git/
+  __pycache__/
+  *.ipynb_checkpoints
+  /data/samples/
+  !/data/samples/tiny.csv
+
+Each pattern is compiled to one regular expression. A pattern without a
+slash matches at any depth, a leading or inner slash anchors it to the
+project root, a trailing slash matches directories only, `*` and `?` stay
+within one path segment and `**` crosses segments. The last matching pattern
+wins and `!` re-includes. As in git, a file inside an excluded directory
+cannot be re-included, so an excluded directory is never entered. When
+SYNC_INCLUDE is set, only files it matches (or that lie in a directory it
+matches) pass. Directory decisions are cached, so each directory is
+evaluated once however many files it holds.
+
+The same filter is applied when the archive is extracted, when files are
+copied to LOCAL_TARGET_DIR and when they are uploaded, so excluded files are
+never decompressed, copied or sent.
+"""
+
+import os
+import re
+import hashlib
+import posixpath
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+
+def _translate(pattern: str) -> str:
+    """Regular expression body for one gitignore glob (without the leading (?:.*/)? of unanchored patterns)"""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                if pattern.startswith('**/', i):
+                    out.append('(?:.*/)?')
+                    i += 3
+                    continue
+                if i + 2 == n:
+                    out.append('.*')
+                    i += 2
+                    continue
+            out.append('[^/]*')
+            while i < n and pattern[i] == '*':
+                i += 1
+            continue
+        if c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 2 if pattern.startswith(('[!', '[^'), i) else i + 1)
+            if end < 0:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                if body[:1] in ('!', '^'):
+                    body = '^' + body[1:]
+                out.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class _Rule:
+    __slots__ = ('pattern', 'regex', 'dir_only', 'negate')
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.negate = pattern.startswith('!')
+        if self.negate:
+            pattern = pattern[1:]
+        elif pattern.startswith('\\'):
+            pattern = pattern[1:]  # \! and \# stand for a literal first character
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        anchored = '/' in pattern
+        body = _translate(pattern.lstrip('/'))
+        self.regex = re.compile(('' if anchored else '(?:.*/)?') + body)
+
+    def matches(self, rel: str, is_dir: bool) -> bool:
+        return (is_dir or not self.dir_only) and self.regex.fullmatch(rel) is not None
+
+
+class _RuleSet:
+    """Ordered rules; decide() returns whether the last matching rule is positive (None if none matches)"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.rules = [_Rule(p) for p in patterns if p.strip() and not p.startswith('#')]
+        # Without negations any match decides, so one combined expression per kind is enough
+        self._combined: Optional[Tuple[Any, Any]] = None
+        if self.rules and not any(r.negate for r in self.rules):
+            any_kind = [r.regex.pattern for r in self.rules if not r.dir_only]
+            dirs = [r.regex.pattern for r in self.rules]
+            self._combined = (re.compile('|'.join(f"(?:{p})" for p in any_kind)) if any_kind else None,
+                              re.compile('|'.join(f"(?:{p})" for p in dirs)))
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def decide(self, rel: str, is_dir: bool) -> Optional[bool]:
+        if self._combined is not None:
+            regex = self._combined[1] if is_dir else self._combined[0]
+            return True if regex is not None and regex.fullmatch(rel) else None
+        for rule in reversed(self.rules):
+            if rule.matches(rel, is_dir):
+                return not rule.negate
+        return None
+
+
+class PathFilter:
+    """Compiled SYNC_INCLUDE / SYNC_EXCLUDE rules for paths relative to the project root"""
+
+    def __init__(self, include: Iterable[str] = (), exclude: Iterable[str] = ()):
+        self.include = _RuleSet(include)
+        self.exclude = _RuleSet(exclude)
+        self._dir_excluded: Dict[str, bool] = {'': False}
+        self._dir_included: Dict[str, bool] = {'': False}
+
+    def __bool__(self) -> bool:
+        return bool(self.include or self.exclude)
+
+    @property
+    def signature(self) -> str:
+        """Short fingerprint of the rules ('' when there are none)"""
+        if not self:
+            return ''
+        text = '\n'.join(['+'] + [r.pattern for r in self.include.rules] + ['-'] + [r.pattern for r in self.exclude.rules])
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+    def _excluded_dir(self, rel_dir: str) -> bool:
+        cached = self._dir_excluded.get(rel_dir)
+        if cached is None:
+            cached = (self._excluded_dir(posixpath.dirname(rel_dir))
+                      or self.exclude.decide(rel_dir, True) is True)
+            self._dir_excluded[rel_dir] = cached
+        return cached
+
+    def _included_dir(self, rel_dir: str) -> bool:
+        cached = self._dir_included.get(rel_dir)
+        if cached is None:
+            decision = self.include.decide(rel_dir, True)
+            cached = decision if decision is not None else self._included_dir(posixpath.dirname(rel_dir))
+            self._dir_included[rel_dir] = cached
+        return cached
+
+    def allows(self, rel: str, is_dir: bool = False) -> bool:
+        """Whether rel (a POSIX path relative to the project root) passes the filters
+
+        Directories are only rejected by SYNC_EXCLUDE: files below them may still match SYNC_INCLUDE.
+        """
+        rel = rel.strip('/')
+        if is_dir:
+            return not self._excluded_dir(rel)
+        parent = posixpath.dirname(rel)
+        if self._excluded_dir(parent) or self.exclude.decide(rel, False) is True:
+            return False
+        if not self.include:
+            return True
+        decision = self.include.decide(rel, False)
+        return decision if decision is not None else self._included_dir(parent)
+
+    def filter_walk(self, rel_dir: str, dirnames: List[str], filenames: List[str]) -> List[str]:
+        """Prune os.walk's dirnames in place; returns the allowed filenames of rel_dir ('' or '.' for the root)"""
+        prefix = '' if rel_dir in ('', '.') else rel_dir.replace(os.sep, '/') + '/'
+        dirnames[:] = [d for d in dirnames if self.allows(prefix + d, True)]
+        return [f for f in filenames if self.allows(prefix + f)]
+
+    def copytree_ignore(self, src_root: str) -> Callable[[str, List[str]], Set[str]]:
+        """`ignore` callable for shutil.copytree rooted at src_root"""
+        def ignore(directory: str, names: List[str]) -> Set[str]:
+            rel_dir = os.path.relpath(directory, src_root)
+            prefix = '' if rel_dir == '.' else rel_dir.replace(os.sep, '/') + '/'
+            return {name for name in names
+                    if not self.allows(prefix + name, os.path.isdir(os.path.join(directory, name)))}
+        return ignore
+
+
+def from_settings(settings: Mapping[str, Any]) -> PathFilter:
+    """PathFilter for the SYNC_INCLUDE / SYNC_EXCLUDE lists of a settings snapshot"""
+    return PathFilter(settings.get('SYNC_INCLUDE', ()), settings.get('SYNC_EXCLUDE', ()))
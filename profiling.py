@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Job profiling
+Opt-in span tracing and profiling for a single dashboard job. Pipeline
+functions are wrapped with @traced; until some job runs under profiled() the
+wrapper only checks one module flag before calling straight through. While a
+job is profiled every traced call in its context becomes a span (stage ->
+sub-step -> per-file/per-command), parented through a context variable, so
+threads started with job_context.propagate keep the hierarchy.
+
+Artifacts are written next to the job log:
+- <job_id>.trace.json  Chrome trace events (chrome://tracing or ui.perfetto.dev)
+- <job_id>.prof        cProfile of the job thread (pstats, snakeviz) - mode 'cprofile'
+- <job_id>.folded      sampled stacks of all the job's threads (flamegraph.pl, speedscope) - mode 'sample'
+"""
+
+import os
+import sys
+import json
+import time
+import inspect
+import cProfile
+import itertools
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+MODES = ('trace', 'cprofile', 'sample')
+ARTIFACTS = {'trace': '.trace.json', 'cprofile': '.prof', 'sample': '.folded'}
+# Spans kept per job; a huge tree records the first ones and counts the rest as dropped
+MAX_SPANS = 100_000
+SAMPLE_INTERVAL = 0.005
+MAX_STACKS = 20_000
+
+_tracer: contextvars.ContextVar = contextvars.ContextVar('etx_tracer', default=None)
+_parent_span: contextvars.ContextVar = contextvars.ContextVar('etx_span', default=None)
+# Number of jobs being profiled; the only thing @traced looks at otherwise
+_active = 0
+_active_lock = threading.Lock()
+
+
+class Tracer:
+    """Finished spans of one profiled job"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: List[tuple] = []
+        self.dropped = 0
+        self.threads: Dict[int, str] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def add(self, span_id, parent, name, detail, start, end, error) -> None:
+        with self._lock:
+            if len(self.spans) >= MAX_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append((span_id, parent, name, detail, start, end, threading.get_ident(), error))
+
+    def register_thread(self) -> None:
+        """Make the calling thread part of the job (named in the trace, sampled in 'sample' mode)"""
+        thread = threading.current_thread()
+        with self._lock:
+            self.threads[thread.ident] = thread.name
+
+    def thread_ids(self) -> List[int]:
+        with self._lock:
+            return list(self.threads)
+
+    def to_chrome(self, job_id: str) -> Dict:
+        """Chrome trace-event JSON: one complete ('X') event per span, times in microseconds"""
+        with self._lock:
+            spans, threads, dropped = list(self.spans), dict(self.threads), self.dropped
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': name}}
+                  for tid, name in threads.items()]
+        for span_id, parent, name, detail, start, end, tid, error in spans:
+            args = {'id': span_id, 'parent': parent}
+            if detail is not None:
+                args['detail'] = str(detail)
+            if error:
+                args['error'] = error
+            events.append({'name': name, 'cat': 'etx', 'ph': 'X', 'pid': 1, 'tid': tid,
+                           'ts': round((start - self.origin) * 1e6, 1),
+                           'dur': round((end - start) * 1e6, 1), 'args': args})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'job_id': job_id, 'spans': len(spans), 'dropped_spans': dropped}}
+
+
+@contextmanager
+def _span(tracer: Tracer, name: str, detail):
+    """One span; spans opened inside it (in this context or copies of it) become its children"""
+    tracer.register_thread()
+    span_id = tracer.next_id()
+    parent = _parent_span.get()
+    token = _parent_span.set(span_id)
+    error = None
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        end = time.perf_counter()
+        _parent_span.reset(token)
+        tracer.add(span_id, parent, name, detail, start, end, error)
+
+
+def traced(name: Optional[str] = None, detail: Optional[str] = None):
+    """Record calls of the wrapped function as spans while its job is profiled
+
+    detail names a parameter (e.g. 'remote_file', 'command') whose value is attached
+    to each span; it is only looked up when tracing is on.
+    """
+    def wrap(func):
+        label = name or func.__name__
+        signature = inspect.signature(func) if detail else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return func(*args, **kwargs)
+            tracer = _tracer.get()
+            if tracer is None:
+                return func(*args, **kwargs)
+            value = None
+            if signature is not None:
+                try:
+                    value = signature.bind(*args, **kwargs).arguments.get(detail)
+                except TypeError:
+                    pass
+            with _span(tracer, label, value):
+                return func(*args, **kwargs)
+        return wrapper
+    return wrap
+
+
+class _Sampler:
+    """Samples the stacks of the job's threads into folded-stack counts"""
+
+    def __init__(self, tracer: Tracer, interval: float = SAMPLE_INTERVAL):
+        self.tracer = tracer
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='etx-profile-sampler', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for tid in self.tracer.thread_ids():
+                frame = frames.get(tid)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(self.tracer.threads.get(tid, str(tid)))
+                key = ';'.join(reversed(stack))
+                if key in self.counts or len(self.counts) < MAX_STACKS:
+                    self.counts[key] = self.counts.get(key, 0) + 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {n}\n" for stack, n in sorted(self.counts.items()))
+
+
+def artifact_path(out_dir: str, job_id: str, kind: str) -> str:
+    return os.path.join(out_dir, job_id + ARTIFACTS[kind])
+
+
+def artifacts(out_dir: str, job_id: str) -> List[str]:
+    """Kinds of profile artifacts present for a job"""
+    return [kind for kind in ARTIFACTS if os.path.exists(artifact_path(out_dir, job_id, kind))]
+
+
+@contextmanager
+def profiled(job_id: str, mode: Optional[str], out_dir: str):
+    """Profile the job run inside this block (mode None: do nothing)
+
+    Every mode records the span trace; 'cprofile' adds a cProfile of this thread,
+    'sample' a sampling profile of every thread the job's spans ran on.
+    """
+    global _active
+    if not mode:
+        yield None
+        return
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}; expected one of {', '.join(MODES)}")
+    tracer = Tracer()
+    token = _tracer.set(tracer)
+    with _active_lock:
+        _active += 1
+    profiler = sampler = None
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif mode == 'sample':
+        sampler = _Sampler(tracer)
+        sampler.start()
+    start = time.perf_counter()
+    try:
+        with _span(tracer, 'job', job_id):
+            yield tracer
+    finally:
+        end = time.perf_counter()
+        if profiler is not None:
+            profiler.disable()
+        if sampler is not None:
+            sampler.stop()
+        with _active_lock:
+            _active -= 1
+        _tracer.reset(token)
+        with open(artifact_path(out_dir, job_id, 'trace'), 'w', encoding='utf-8') as f:
+            json.dump(tracer.to_chrome(job_id), f)
+        written = ['trace']
+        if profiler is not None:
+            profiler.dump_stats(artifact_path(out_dir, job_id, 'cprofile'))
+            written.append('cprofile')
+        if sampler is not None:
+            with open(artifact_path(out_dir, job_id, 'sample'), 'w', encoding='utf-8') as f:
+                f.write(sampler.folded())
+            written.append('sample')
+        print(f"[profile] {len(tracer.spans)} spans ({tracer.dropped} dropped) in {end - start:.1f}s; "
+              f"download: " + ', '.join(f"/download_profile/{job_id}/{kind}" for kind in written))
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Snapshot deployments
+With DEPLOY_MODE=snapshot each REMOTE_TARGET_DIR receives a new release instead
+of having its files overwritten in place:
+
+  <target>/releases/<release id>/      one complete tree per deployment
+  <target>/current -> releases/<id>    what jobs should run from
+
+A release is staged in releases/.<id>.partial. It is seeded with hardlinks to
+the previous release (cp -al on the remote host, so nothing crosses the WAN),
+then only new or changed files are uploaded - to a temporary name renamed over
+the hardlink, so the previous release's files are never written to - and
+removed files are deleted. When the staged tree matches the local manifest it
+gets its final name and `current` is switched with one atomic rename. Jobs that
+already started keep the release they started in, and a failed deployment
+leaves `current` untouched. Releases beyond DEPLOY_KEEP are pruned.
+"""
+
+import os
+import json
+import time
+import shlex
+import posixpath
+from typing import Dict, List, Optional, Tuple
+
+import job_context
+import metrics
+import file_index
+from Github_to_Local_to_ETX import sftp_upload_file, sftp_makedirs
+
+MANIFEST_NAME = '.etx_manifest.json'
+RELEASES_DIR = 'releases'
+CURRENT_LINK = 'current'
+DEFAULT_KEEP = 5
+COMMAND_TIMEOUT = 600
+
+
+def build_manifest(local_dir: str, filters=None) -> Dict[str, List]:
+    """Relative POSIX path -> [size, sha256] of every file below local_dir that filters (a PathFilter) allows
+
+    Hashes come from the local file index, so only files changed since the last deployment are read.
+    """
+    index = file_index.get_index()
+    index.refresh(local_dir)
+    return index.manifest(local_dir, filters.allows if filters else None)
+
+
+def _parent_dirs(paths) -> set:
+    dirs = set()
+    for rel in paths:
+        parent = posixpath.dirname(rel)
+        while parent and parent not in dirs:
+            dirs.add(parent)
+            parent = posixpath.dirname(parent)
+    return dirs
+
+
+class SnapshotDeployer:
+    """Deploys one local tree to one remote target as a release (see module docstring)"""
+
+    def __init__(self, ssh, sftp, target: str, keep: int = DEFAULT_KEEP):
+        self.ssh = ssh
+        self.sftp = sftp
+        self.target = target.rstrip('/') or '/'
+        self.keep = max(1, keep)
+        self.releases = posixpath.join(self.target, RELEASES_DIR)
+        self.current = posixpath.join(self.target, CURRENT_LINK)
+
+    def _exec(self, command: str) -> Tuple[int, str]:
+        """Run a shell command on the remote host; (exit status, output)"""
+        with metrics.stage('remote_command') as stage:
+            _, stdout, stderr = self.ssh.exec_command(command, timeout=COMMAND_TIMEOUT)
+            output = stdout.read().decode('utf-8', errors='replace') + stderr.read().decode('utf-8', errors='replace')
+            status = stdout.channel.recv_exit_status()
+            metrics.record('remote_command', remote_commands=1)
+            if status:
+                stage.outcome = 'failed'
+        return status, output.strip()
+
+    def _rename_over(self, src: str, dst: str) -> None:
+        """Atomically replace dst with src (POSIX rename), via `mv -T` when the server lacks posix-rename"""
+        try:
+            self.sftp.posix_rename(src, dst)
+        except IOError:
+            status, output = self._exec(f"mv -Tf {shlex.quote(src)} {shlex.quote(dst)}")
+            if status:
+                raise IOError(f"Could not rename {src} to {dst}: {output}")
+
+    def _remove_tree(self, paths: List[str]) -> None:
+        if paths:
+            status, output = self._exec('rm -rf -- ' + ' '.join(shlex.quote(p) for p in paths))
+            if status:
+                print(f"WARNING: Could not remove {', '.join(paths)}: {output}")
+
+    def current_release(self) -> Optional[str]:
+        """Name of the release `current` points to, or None"""
+        try:
+            link = self.sftp.readlink(self.current)
+        except IOError:
+            return None
+        return posixpath.basename(link.rstrip('/')) if link else None
+
+    def _read_manifest(self, release_dir: str) -> Optional[Dict[str, List]]:
+        try:
+            with self.sftp.open(posixpath.join(release_dir, MANIFEST_NAME), 'r') as f:
+                return json.loads(f.read().decode('utf-8'))
+        except (IOError, ValueError):
+            return None
+
+    def _write_manifest(self, release_dir: str, manifest: Dict[str, List]) -> None:
+        path = posixpath.join(release_dir, MANIFEST_NAME)
+        with self.sftp.open(path + '.tmp', 'w') as f:
+            f.write(json.dumps(manifest, sort_keys=True).encode('utf-8'))
+        # The seeded manifest is a hardlink into the previous release; replace it, never rewrite it
+        self._rename_over(path + '.tmp', path)
+
+    def _new_release_id(self, existing: List[str]) -> str:
+        release = time.strftime('%Y%m%d_%H%M%S')
+        suffix = 2
+        while release in existing or f".{release}.partial" in existing:
+            release = f"{time.strftime('%Y%m%d_%H%M%S')}_{suffix}"
+            suffix += 1
+        return release
+
+    def _seed(self, previous: Optional[str], previous_manifest: Optional[Dict[str, List]],
+              staging: str) -> Dict[str, List]:
+        """Hardlink the previous release into staging; returns the manifest of what was seeded"""
+        if previous and previous_manifest is not None:
+            previous_dir = posixpath.join(self.releases, previous)
+            status, output = self._exec(f"cp -al {shlex.quote(previous_dir)} {shlex.quote(staging)}")
+            if status == 0:
+                print(f"Seeded {len(previous_manifest)} files from release {previous} with hardlinks")
+                return previous_manifest
+            print(f"WARNING: Could not hardlink release {previous} ({output}); uploading every file")
+            self._remove_tree([staging])
+        self.sftp.mkdir(staging)
+        return {}
+
+    def _remote_sizes(self, root: str) -> Dict[str, int]:
+        sizes = {}
+        pending = ['']
+        while pending:
+            rel_dir = pending.pop()
+            for entry in self.sftp.listdir_attr(posixpath.join(root, rel_dir) if rel_dir else root):
+                rel = posixpath.join(rel_dir, entry.filename) if rel_dir else entry.filename
+                if entry.st_mode is not None and (entry.st_mode & 0o170000) == 0o040000:
+                    pending.append(rel)
+                else:
+                    sizes[rel] = entry.st_size
+        sizes.pop(MANIFEST_NAME, None)
+        return sizes
+
+    def _verify(self, staging: str, manifest: Dict[str, List]) -> List[str]:
+        """Differences between the staged tree and the manifest (paths and sizes)"""
+        remote = self._remote_sizes(staging)
+        problems = [f"missing {rel}" for rel in manifest if rel not in remote]
+        problems += [f"size mismatch {rel} ({remote[rel]} != {entry[0]})"
+                     for rel, entry in manifest.items() if rel in remote and remote[rel] != entry[0]]
+        problems += [f"unexpected {rel}" for rel in remote if rel not in manifest]
+        return problems
+
+    def deploy(self, local_dir: str, manifest: Dict[str, List]) -> bool:
+        """Stage, verify and activate a new release; returns True once `current` points to it"""
+        sftp_makedirs(self.sftp, self.releases)
+        try:
+            attrs = self.sftp.lstat(self.current)
+            if (attrs.st_mode & 0o170000) != 0o120000:
+                print(f"ERROR: {self.current} exists and is not a symlink; move it away to use snapshot deployments")
+                return False
+        except IOError:
+            pass
+        existing = self.sftp.listdir(self.releases)
+        previous = self.current_release()
+        previous_manifest = self._read_manifest(posixpath.join(self.releases, previous)) if previous else None
+        if previous_manifest == manifest:
+            print(f"Nothing changed since release {previous}; {self.current} left as is")
+            return True
+        release = self._new_release_id(existing)
+        staging = posixpath.join(self.releases, f".{release}.partial")
+        print(f"Deploying release {release} to {self.target} (previous: {previous or 'none'})")
+        try:
+            seeded = self._seed(previous, previous_manifest, staging)
+            changed = [rel for rel, entry in manifest.items() if seeded.get(rel) != entry]
+            removed = [rel for rel in seeded if rel not in manifest]
+            print(f"{len(changed)} new or changed, {len(manifest) - len(changed)} unchanged, {len(removed)} removed")
+            for rel in removed:
+                self.sftp.remove(posixpath.join(staging, rel))
+            # Directories only the previous release had, deepest first
+            for rel_dir in sorted(_parent_dirs(seeded) - _parent_dirs(manifest), key=lambda d: -d.count('/')):
+                try:
+                    self.sftp.rmdir(posixpath.join(staging, rel_dir))
+                except IOError:
+                    pass
+            for rel_dir in sorted(_parent_dirs(manifest) - _parent_dirs(seeded)):
+                try:
+                    self.sftp.mkdir(posixpath.join(staging, rel_dir))
+                except IOError:
+                    pass  # already there
+            failed = 0
+            with metrics.stage('upload') as stage:
+                for rel in changed:
+                    job_context.checkpoint()
+                    local_file = os.path.join(local_dir, *rel.split('/'))
+                    remote_file = posixpath.join(staging, rel)
+                    if rel not in seeded:
+                        ok = sftp_upload_file(self.sftp, local_file, remote_file)
+                    else:
+                        ok = sftp_upload_file(self.sftp, local_file, remote_file + '.etx-tmp')
+                        if ok:
+                            self._rename_over(remote_file + '.etx-tmp', remote_file)
+                    failed += not ok
+                if failed:
+                    stage.outcome = 'partial'
+            if failed:
+                raise IOError(f"{failed} file(s) failed to upload")
+            problems = self._verify(staging, manifest)
+            if problems:
+                raise IOError(f"verification failed: {'; '.join(problems[:10])}"
+                              + (f" (+{len(problems) - 10} more)" if len(problems) > 10 else ''))
+            self._write_manifest(staging, manifest)
+            final = posixpath.join(self.releases, release)
+            self.sftp.rename(staging, final)
+        except job_context.JobCancelled:
+            self._remove_tree([staging])
+            raise
+        except Exception as e:
+            print(f"ERROR: Release {release} not activated, {self.current} unchanged: {e}")
+            self._remove_tree([staging])
+            return False
+        link = posixpath.join(self.target, f".{CURRENT_LINK}.{release}.tmp")
+        # Relative, so the link stays valid if the target is reached through another mount path
+        self.sftp.symlink(posixpath.join(RELEASES_DIR, release), link)
+        self._rename_over(link, self.current)
+        print(f"Activated release {release}: {self.current} -> {RELEASES_DIR}/{release}")
+        self.prune()
+        return True
+
+    def prune(self) -> None:
+        """Remove releases beyond the newest `keep` (never the current one) and abandoned staging dirs"""
+        names = self.sftp.listdir(self.releases)
+        current = self.current_release()
+        releases = sorted(name for name in names if not name.startswith('.'))
+        keep = set(releases[-self.keep:]) | {current}
+        stale = [name for name in releases if name not in keep]
+        stale += [name for name in names if name.startswith('.') and name.endswith('.partial')]
+        if stale:
+            print(f"Pruning {len(stale)} old release(s): {', '.join(stale)}")
+            self._remove_tree([posixpath.join(self.releases, name) for name in stale])
+
+
+def deploy_snapshot(ssh, sftp, local_dir: str, target: str, manifest: Dict[str, List],
+                    keep: int = DEFAULT_KEEP) -> bool:
+    return SnapshotDeployer(ssh, sftp, target, keep).deploy(local_dir, manifest)
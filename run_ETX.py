@@ -5,31 +5,50 @@ Executes commands on remote HPC systems via SSH with enhanced compatibility
 Now supports interactive mode like MobaXterm!
 """
 
+from __future__ import annotations
+
 import os
+import re
 import sys
 import time
 import logging
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Mapping, Optional, Tuple
+
+from startup import lazy_import
 
 try:
-    import paramiko
+    # Loaded on first use, so importing this module (and the dashboard) does not pay for it
+    paramiko = lazy_import('paramiko')
 except ImportError:
     print("ERROR: paramiko library not found. Install with: pip install paramiko")
     sys.exit(1)
 
-# Configure logging
+from job_tracker import tracker as job_tracker
+from ssh_pool import SSHTransportPool
+from command_cache import command_cache
+import job_context
+import settings_store
+import metrics
+import profiling
+
+# Configure logging; the log file is only opened when the first record is written
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout),
-        logging.FileHandler('run_etx.log')
+        logging.FileHandler('run_etx.log', delay=True)
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Commands (matched as whole words) whose output is handed to the job tracker
+JOB_COMMANDS = ('ansys_sub', 'phd run', 'sbatch', 'qsub', 'bsub', 'job', 'submit', 'srun', 'mpirun', 'mpiexec')
+# Splits a command line into words at whitespace and shell separators
+_COMMAND_WORDS = re.compile(r'[\s;&|()]+')
+
 class ETXRemoteExecutor:
     """Enhanced SSH executor for HPC systems with MobaXterm-like functionality"""
     
@@ -47,6 +66,8 @@ class ETXRemoteExecutor:
         self.job_command_timeout = 600  # 10 minutes for job commands
         self.shell_init_wait = 3
         self.inter_command_delay = 2
+        # Parallel blocks share this many authenticated transports (one channel per block)
+        self.transport_pool_size = int(config.get('SSH_TRANSPORT_POOL_SIZE', 1))
         
         # Interactive mode settings
         self.interactive_mode = False
@@ -89,12 +110,17 @@ class ETXRemoteExecutor:
         return client, connect_params
     
     def _is_job_command(self, command: str) -> bool:
-        """Check if command is a job submission command"""
-        job_keywords = [
-            'ansys_sub', 'phd run', 'sbatch', 'qsub', 'bsub', 
-            'job', 'submit', 'srun', 'mpirun', 'mpiexec'
-        ]
-        return any(keyword in command.lower() for keyword in job_keywords)
+        """Check if command is a job submission command (whole words, so `bjobs` or `--jobs=` don't count)"""
+        words = ' '.join(os.path.basename(word) for word in _COMMAND_WORDS.split(command.lower()) if word)
+        return any(re.search(rf'(?:^| ){re.escape(keyword)}(?: |$)', words) for keyword in JOB_COMMANDS)
+    
+    def _track_job_submission(self, command: str, output: str, track: bool = True) -> list:
+        """Hand submission output to the job tracker, which polls job state in batches"""
+        if not track or not self._is_job_command(command):
+            return []
+        # A submission changes queue listings cached for the dashboard terminal
+        command_cache.invalidate_host(self.host)
+        return job_tracker.track_submission(command, output, self)
     
     def _get_command_timeout(self, command: str) -> int:
         """Get appropriate timeout for command"""
@@ -193,6 +219,7 @@ class ETXRemoteExecutor:
         print("  exit  - Exit session")
         print("="*50)
     
+    @profiling.traced()
     def _execute_commands_interactively(self, shell: paramiko.Channel, commands: List[str]) -> bool:
         """Execute commands interactively with automatic typing like MobaXterm"""
         success = True
@@ -201,6 +228,8 @@ class ETXRemoteExecutor:
             command = command.strip()
             if not command or command.startswith('#'):
                 continue
+            # Stop between commands when the dashboard job was cancelled
+            job_context.checkpoint()
                 
             print(f"\n📝 Command {i}/{len(commands)}: ", end='', flush=True)
             
@@ -256,24 +285,20 @@ class ETXRemoteExecutor:
                     break
             
             # Handle timeout
-            if time.time() - start_time >= timeout:
+            elapsed = time.time() - start_time
+            if elapsed >= timeout:
                 print(f"\n⏱️  Command {i} timed out after {timeout}s")
                 success = False
+            metrics.observe('remote_command', elapsed, 'timeout' if elapsed >= timeout else 'ok')
+            metrics.record('remote_command', remote_commands=1)
             
             # Job command special handling
             if self._is_job_command(command):
-                print(f"🔍 Job command detected - checking status...")
-                shell.send('echo "Job submission check"\n')
-                time.sleep(2)
-                
-                # Try to check job status
-                shell.send('qstat 2>/dev/null || echo "qstat not available"\n')
-                time.sleep(3)
-                
-                # Capture any additional output
-                if shell.recv_ready():
-                    additional_output = shell.recv(4096).decode('utf-8', errors='ignore')
-                    print(additional_output, end='')
+                jobs = self._track_job_submission(command, output)
+                if jobs:
+                    print(f"🔍 Job command detected - tracking job(s) {', '.join(job.job_id for job in jobs)}")
+                else:
+                    print(f"🔍 Job command detected - no job ID found in output")
             
             # Wait between commands
             print(f"⏳ Waiting {self.inter_command_delay}s before next command...")
@@ -281,6 +306,7 @@ class ETXRemoteExecutor:
         
         return success
 
+    @profiling.traced(detail='command')
     def _execute_command_interactive(self, shell: paramiko.Channel, command: str, 
                                    session_id: str) -> Tuple[str, bool]:
         """Execute single command interactively"""
@@ -321,10 +347,14 @@ class ETXRemoteExecutor:
                 break
         
         # Handle timeout
-        if time.time() - start_time >= timeout:
+        elapsed = time.time() - start_time
+        metrics.observe('remote_command', elapsed, 'timeout' if elapsed >= timeout else 'ok')
+        metrics.record('remote_command', remote_commands=1)
+        if elapsed >= timeout:
             logger.warning(f"[{session_id}] Command timed out after {timeout}s")
             return output, False
         
+        self._track_job_submission(command, output)
         return output, True
     
     def _is_command_complete(self, output: str) -> bool:
@@ -343,19 +373,24 @@ class ETXRemoteExecutor:
         recent_output = output[-200:] if len(output) > 200 else output
         return any(pattern in recent_output for pattern in completion_patterns)
     
-    def _execute_commands_session(self, commands: List[str], session_id: str) -> bool:
-        """Execute commands in a single SSH session"""
+    @profiling.traced(detail='session_id')
+    def _execute_commands_session(self, commands: List[str], session_id: str,
+                                  pool: Optional[SSHTransportPool] = None) -> bool:
+        """Execute commands in a single SSH session
+        
+        With a pool the session is a channel on an already authenticated transport.
+        """
         logger.info(f"[{session_id}] Starting SSH session to {self.host}:{self.port}")
         
-        client, connect_params = self._create_ssh_client()
+        own_pool = pool is None
+        if own_pool:
+            pool = SSHTransportPool(self._create_ssh_client, size=1)
+        transport_index = None
         
         try:
-            # Connect to server
-            client.connect(**connect_params)
-            logger.info(f"[{session_id}] Connected successfully")
-            
-            # Create interactive shell
-            shell = client.invoke_shell(term='xterm', width=132, height=40)
+            # Create interactive shell on a pooled transport
+            shell, transport_index = pool.invoke_shell(term='xterm', width=132, height=40)
+            logger.info(f"[{session_id}] Connected successfully (transport {transport_index + 1})")
             self.shell_active = True
             
             # Setup environment
@@ -433,7 +468,10 @@ class ETXRemoteExecutor:
             return False
         finally:
             self.shell_active = False
-            client.close()
+            if transport_index is not None:
+                pool.release(transport_index)
+            if own_pool:
+                pool.close()
     
     def _ask_user_confirmation(self, command: str, current: int, total: int) -> bool:
         """Ask user for confirmation before executing command"""
@@ -501,27 +539,34 @@ class ETXRemoteExecutor:
         """Enable or disable interactive mode"""
         self.interactive_mode = interactive
     
-    def execute_single_command(self, command: str) -> str:
-        """Execute a single command via SSH and return the output"""
+    @profiling.traced(detail='command')
+    def execute_single_command(self, command: str, track: bool = True) -> str:
+        """Execute a single command via SSH and return the output
+
+        track=False skips job-submission tracking and cache invalidation (the job tracker's own polls).
+        """
         ssh_client = None
         try:
             # Create SSH connection
             ssh_client, connect_params = self._create_ssh_client()
-            ssh_client.connect(**connect_params)
+            metrics.connect_ssh(ssh_client, **connect_params)
             
             # Execute command
             logger.info(f"Executing single command: {command}")
-            stdin, stdout, stderr = ssh_client.exec_command(command)
-            
-            # Get output
-            output = stdout.read().decode('utf-8')
-            error = stderr.read().decode('utf-8')
+            with metrics.stage('remote_command'):
+                stdin, stdout, stderr = ssh_client.exec_command(command)
+                
+                # Get output
+                output = stdout.read().decode('utf-8')
+                error = stderr.read().decode('utf-8')
+            metrics.record('remote_command', remote_commands=1)
             
             # Return combined output
             result = output
             if error:
                 result += f"\nError: {error}"
-                
+            
+            self._track_job_submission(command, output, track)
             return result
             
         except Exception as e:
@@ -531,6 +576,7 @@ class ETXRemoteExecutor:
             if ssh_client:
                 ssh_client.close()
     
+    @profiling.traced()
     def execute_commands(self) -> bool:
         """Execute all commands with appropriate parallelization"""
         if not self.commands and not self.interactive_mode:
@@ -547,14 +593,18 @@ class ETXRemoteExecutor:
         if len(command_blocks) == 1:
             # Single block execution
             return self._execute_commands_session(command_blocks[0], "etx-main")
-        else:
-            # Multi-block parallel execution
-            logger.info(f"Executing {len(command_blocks)} command blocks in parallel")
-            
-            success = True
+        
+        # Multi-block parallel execution: every block is a channel on the shared transport pool,
+        # so connections and password auths stay constant however many blocks there are
+        logger.info(f"Executing {len(command_blocks)} command blocks in parallel "
+                    f"over {self.transport_pool_size} transport(s)")
+        pool = SSHTransportPool(self._create_ssh_client, size=self.transport_pool_size)
+        
+        success = True
+        try:
             with ThreadPoolExecutor(max_workers=min(len(command_blocks), 4)) as executor:
                 future_to_block = {
-                    executor.submit(self._execute_commands_session, block, f"etx-{i}"): i
+                    executor.submit(job_context.propagate(self._execute_commands_session), block, f"etx-{i}", pool): i
                     for i, block in enumerate(command_blocks, 1)
                 }
                 
@@ -570,77 +620,16 @@ class ETXRemoteExecutor:
                     except Exception as e:
                         logger.error(f"Block {block_id} raised exception: {e}")
                         success = False
-            
-            return success
+        finally:
+            logger.info(f"Transport pool: {pool.stats()}")
+            pool.close()
+        
+        return success
 
 
-def load_settings(settings_path: str = "settings.txt") -> Dict[str, Any]:
-    """Load configuration from settings file"""
-    if not os.path.exists(settings_path):
-        raise FileNotFoundError(f"Settings file not found: {settings_path}")
-    
-    settings = {}
-    
-    try:
-        with open(settings_path, "r", encoding='utf-8') as f:
-            lines = f.readlines()
-    except Exception as e:
-        raise RuntimeError(f"Failed to read settings file: {e}")
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        # Skip empty lines and comments
-        if not line or line.startswith("#"):
-            i += 1
-            continue
-        
-        # Handle multi-line values (REMOTE_COMMANDS, REMOTE_TARGET_DIRS)
-        if line.startswith("REMOTE_COMMANDS=") or line.startswith("REMOTE_TARGET_DIRS="):
-            key = line.split("=", 1)[0].strip().upper()
-            values = []
-            
-            # Get initial value if present
-            val = line[len(key)+1:].strip()
-            if val:
-                values.append(val)
-            
-            # Read subsequent lines
-            i += 1
-            while i < len(lines):
-                cmd_line = lines[i].strip()
-                if not cmd_line or cmd_line.startswith('#'):
-                    i += 1
-                    continue
-                # Stop if we hit another setting (must be at start of line and uppercase before =)
-                if '=' in cmd_line and not cmd_line.startswith(' '):
-                    # Check if this looks like a new setting (uppercase key at start)
-                    potential_key = cmd_line.split('=')[0].strip()
-                    if potential_key.isupper() and '_' in potential_key:
-                        break
-                values.append(cmd_line)
-                i += 1
-            
-            settings[key] = values
-            continue
-        
-        # Handle single-line settings
-        if "=" in line:
-            key, value = line.split("=", 1)
-            settings[key.strip().upper()] = value.strip()
-        
-        i += 1
-    
-    # Type conversions
-    if "REMOTE_PORT" in settings:
-        try:
-            settings["REMOTE_PORT"] = int(settings["REMOTE_PORT"])
-        except ValueError:
-            logger.warning("Invalid REMOTE_PORT value, using default 22")
-            settings["REMOTE_PORT"] = 22
-    
-    return settings
+def load_settings(settings_path: Optional[str] = None) -> Mapping[str, Any]:
+    """Load configuration from settings file (cached, immutable snapshot; see settings_store)"""
+    return settings_store.load_settings(settings_path)
 
 
 def show_main_menu() -> str:
@@ -711,6 +700,7 @@ def main():
     return 0
 
 
+@profiling.traced()
 def run_remote_etx():
     """
     Compatibility wrapper for the old run_remote_etx function
@@ -1,15 +1,34 @@
-from app import app
+import startup
+# Timed from here, so the startup report covers Flask, the job modules and everything they import
+with startup.time_imports():
+    from app import app
+    from run_ETX import load_settings
+    import serving
+startup.mark('imports done')
 import threading
 import webbrowser
 import time
 
+# Wait at most this long for the server socket before opening the browser anyway
+READY_TIMEOUT = 30
+
 def run_flask():
     # Port 80 requires admin privileges
-    app.run(host="0.0.0.0", port=5000, debug=False)
+    try:
+        config = load_settings()
+    except Exception:
+        config = {}
+    # Multi-threaded production server (waitress when installed); DASHBOARD_SERVER=werkzeug forces the fallback
+    serving.serve(app, host="0.0.0.0", port=5000,
+                  threads=int(config.get('DASHBOARD_THREADS', serving.DEFAULT_THREADS)),
+                  server=config.get('DASHBOARD_SERVER') or None, ready=startup.set_ready)
 
 if __name__ == "__main__":
     threading.Thread(target=run_flask, daemon=True).start()
-    time.sleep(2)
+    # Open the browser as soon as the server is listening instead of after a fixed sleep
+    startup.ready.wait(READY_TIMEOUT)
     webbrowser.open("http://127.0.0.1:5000")
+    startup.mark('browser opened')
+    print(startup.format_report())
     while True:
-        time.sleep(60) 
\ No newline at end of file
+        time.sleep(60)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Production serving for the dashboard
+Runs the Flask app on waitress (pure Python, so it also works in the PyInstaller
+build) and falls back to werkzeug's threaded server when waitress is missing.
+Large JSON and text responses are gzip-compressed and static assets get
+cache headers; streamed responses (SSE) pass through untouched.
+"""
+
+import gzip
+import logging
+from typing import Callable, Optional
+
+from flask import Flask, request
+
+logger = logging.getLogger(__name__)
+
+# Responses smaller than this are not worth the CPU to compress
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 5
+COMPRESS_MIMETYPES = ('application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript',
+                      'text/javascript')
+STATIC_MAX_AGE = 3600
+# Long-polls and SSE streams each hold a worker thread, so the pool must cover every open browser tab
+DEFAULT_THREADS = 64
+
+
+def _compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Content-Length'] = str(len(response.get_data()))
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def install(app: Flask) -> None:
+    """Enable response compression and static caching on app"""
+    # send_from_directory/send_file already add ETag and Last-Modified and answer 304s
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+    app.after_request(_compress_response)
+
+
+def serve(app: Flask, host: str = '0.0.0.0', port: int = 5000, threads: int = DEFAULT_THREADS,
+          server: Optional[str] = None, ready: Optional[Callable[[], None]] = None) -> None:
+    """Serve app until interrupted; server is 'waitress', 'werkzeug' or None for the best available
+
+    ready is called once the listening socket is bound, before the first request is accepted.
+    """
+    if server in (None, 'waitress'):
+        try:
+            from waitress.server import create_server
+        except ImportError:
+            if server == 'waitress':
+                raise
+            logger.warning("waitress is not installed; falling back to the threaded werkzeug server")
+        else:
+            logger.info(f"Serving on http://{host}:{port} with waitress ({threads} threads)")
+            # channel_timeout outlives the 30 s long-polls and 15 s SSE keep-alives
+            httpd = create_server(app, host=host, port=port, threads=threads, channel_timeout=120,
+                                  ident='ETX Dashboard')
+            httpd.print_listen("Serving on http://{}:{}")
+            if ready:
+                ready()
+            httpd.run()
+            return
+    from werkzeug.serving import make_server
+    logger.info(f"Serving on http://{host}:{port} with werkzeug (threaded)")
+    httpd = make_server(host, port, app, threaded=True)
+    if ready:
+        ready()
+    httpd.serve_forever()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Settings store
+The one parser for settings.txt. The parsed, typed config is cached and handed
+out as an immutable snapshot; it is re-read only when the file's mtime changes
+or after a save, so concurrent jobs see one consistent config without touching
+the disk on every call. The file defaults to settings.txt and can be moved with
+the ETX_SETTINGS_FILE environment variable.
+"""
+
+import os
+import time
+import logging
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS_FILE = os.environ.get('ETX_SETTINGS_FILE', 'settings.txt')
+
+# Keys whose value is the list of lines that follow them
+LIST_KEYS = ('REMOTE_COMMANDS', 'REMOTE_TARGET_DIRS', 'SYNC_INCLUDE', 'SYNC_EXCLUDE')
+BOOL_KEYS = ('DELETE_FILES',)
+INT_KEYS = {'REMOTE_PORT': 22}
+REQUIRED_KEYS = ('REMOTE_HOST', 'REMOTE_USER', 'REMOTE_PASS')
+# The file is stat'ed at most this often; save() invalidates immediately
+CHECK_INTERVAL = 1.0
+
+
+def _is_setting_line(line: str) -> bool:
+    """KEY=value with an upper-case KEY; list items such as `ansys_sub j=jobid` are not settings"""
+    if '=' not in line:
+        return False
+    key = line.split('=', 1)[0].strip()
+    return key.isupper() and '_' in key
+
+
+def parse_settings(text: str) -> Dict[str, Any]:
+    """Parse settings.txt text into a typed dict (list keys become tuples)"""
+    settings: Dict[str, Any] = {}
+    list_key: Optional[str] = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line or line.startswith('#'):
+            continue
+        if list_key is not None and not _is_setting_line(line):
+            settings[list_key].append(line)
+            continue
+        list_key = None
+        if '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        key, value = key.strip().upper(), value.strip()
+        if key in LIST_KEYS:
+            list_key = key
+            settings[key] = [value] if value else []
+        else:
+            settings[key] = value
+    for key in LIST_KEYS:
+        if key in settings:
+            settings[key] = tuple(settings[key])
+    for key in BOOL_KEYS:
+        if key in settings and isinstance(settings[key], str):
+            settings[key] = settings[key].lower() in ('true', '1', 'yes')
+    for key, default in INT_KEYS.items():
+        if key in settings:
+            try:
+                settings[key] = int(settings[key])
+            except ValueError:
+                logger.warning(f"Invalid {key} value {settings[key]!r}, using default {default}")
+                settings[key] = default
+    return settings
+
+
+def validate(settings: Mapping[str, Any]) -> List[str]:
+    """Problems worth warning about; the executor still enforces what it needs"""
+    problems = [f"{key} is not set" for key in REQUIRED_KEYS if not settings.get(key)]
+    port = settings.get('REMOTE_PORT')
+    if port is not None and not 0 < port < 65536:
+        problems.append(f"REMOTE_PORT {port} is out of range")
+    return problems
+
+
+def format_settings(settings: Mapping[str, Any]) -> str:
+    """Inverse of parse_settings, used by the dashboard's form editor"""
+    lines = []
+    for key, value in settings.items():
+        if isinstance(value, (list, tuple)):
+            lines.append(f"{key}=")
+            lines.extend(str(item) for item in value)
+        else:
+            lines.append(f"{key}={value}")
+    return '\n'.join(lines) + '\n'
+
+
+class SettingsStore:
+    """Cached, mtime-invalidated settings for one file"""
+
+    def __init__(self, path: str = DEFAULT_SETTINGS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp: Optional[Tuple[float, int]] = None
+        self._checked = 0.0
+        self._text = ''
+        self._snapshot: Mapping[str, Any] = MappingProxyType({})
+        self.loads = 0
+
+    def _refresh(self) -> None:
+        now = time.time()
+        if self._stamp is not None and now - self._checked < CHECK_INTERVAL:
+            return
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Settings file not found: {self.path}")
+        self._checked = now
+        stamp = (st.st_mtime, st.st_size)
+        if stamp == self._stamp:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except OSError as e:
+            raise RuntimeError(f"Failed to read settings file: {e}")
+        settings = parse_settings(text)
+        for problem in validate(settings):
+            logger.warning(f"{self.path}: {problem}")
+        self._text = text
+        self._snapshot = MappingProxyType(settings)
+        self._stamp = stamp
+        self.loads += 1
+
+    def get(self) -> Mapping[str, Any]:
+        """Immutable snapshot of the current settings"""
+        with self._lock:
+            self._refresh()
+            return self._snapshot
+
+    def text(self) -> str:
+        """Raw file text, for the dashboard's text editor"""
+        with self._lock:
+            self._refresh()
+            return self._text
+
+    def save(self, text: str) -> Mapping[str, Any]:
+        """Atomically replace the file and return the new snapshot"""
+        tmp = self.path + '.tmp'
+        with self._lock:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp, self.path)
+            self._stamp = None
+            self._refresh()
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._stamp = None
+
+
+_stores: Dict[str, SettingsStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: Optional[str] = None) -> SettingsStore:
+    path = path or DEFAULT_SETTINGS_FILE
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = SettingsStore(path)
+        return store
+
+
+def load_settings(path: Optional[str] = None) -> Mapping[str, Any]:
+    """Cached settings snapshot for path (ETX_SETTINGS_FILE or settings.txt by default)"""
+    return get_store(path).get()
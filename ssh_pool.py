@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+SSH transport pool
+Authenticates a small fixed number of transports once and hands out channels
+on them, so parallel command blocks share connections instead of each paying
+for a handshake and password auth.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import List, Dict, Any, Callable, Tuple
+
+import metrics
+from startup import lazy_import
+
+paramiko = lazy_import('paramiko')
+
+logger = logging.getLogger(__name__)
+
+
+class SSHTransportPool:
+    """Fixed-size pool of authenticated SSH transports multiplexing channels"""
+
+    def __init__(self, client_factory: Callable[[], Tuple[paramiko.SSHClient, Dict[str, Any]]], size: int = 1):
+        """client_factory returns (client, connect_params), e.g. ETXRemoteExecutor._create_ssh_client"""
+        self.client_factory = client_factory
+        self.size = max(1, size)
+        self._clients: List[paramiko.SSHClient] = []
+        self._channels: Dict[int, int] = {}  # client index -> open channels
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.channels_opened = 0
+
+    def _connect(self) -> paramiko.SSHClient:
+        client, connect_params = self.client_factory()
+        metrics.connect_ssh(client, **connect_params)
+        self.connections_opened += 1
+        logger.info(f"Pool transport {len(self._clients) + 1}/{self.size} connected to {connect_params['hostname']}")
+        return client
+
+    def _pick_client(self) -> int:
+        """Index of the least loaded live transport, connecting a new one while below size"""
+        live = [i for i, c in enumerate(self._clients)
+                if c.get_transport() is not None and c.get_transport().is_active()]
+        for i in [i for i in range(len(self._clients)) if i not in live]:
+            self._clients[i].close()
+            self._clients[i] = self._connect()
+            self._channels[i] = 0
+        idle = [i for i in range(len(self._clients)) if self._channels.get(i, 0) == 0]
+        if idle:
+            return idle[0]
+        if len(self._clients) < self.size:
+            self._clients.append(self._connect())
+            index = len(self._clients) - 1
+            self._channels[index] = 0
+            return index
+        return min(range(len(self._clients)), key=lambda i: self._channels[i])
+
+    def open_channel(self) -> Tuple[paramiko.Channel, int]:
+        """Open a session channel on the pool; returns (channel, transport index)"""
+        with self._lock:
+            index = self._pick_client()
+            self._channels[index] += 1
+            client = self._clients[index]
+        try:
+            channel = client.get_transport().open_session(timeout=30)
+        except Exception:
+            self.release(index)
+            raise
+        self.channels_opened += 1
+        return channel, index
+
+    def invoke_shell(self, term: str = 'xterm', width: int = 132, height: int = 40) -> Tuple[paramiko.Channel, int]:
+        """Open a channel with a pty and shell, like SSHClient.invoke_shell"""
+        channel, index = self.open_channel()
+        try:
+            channel.get_pty(term=term, width=width, height=height)
+            channel.invoke_shell()
+        except Exception:
+            channel.close()
+            self.release(index)
+            raise
+        return channel, index
+
+    def release(self, index: int) -> None:
+        with self._lock:
+            self._channels[index] = max(0, self._channels.get(index, 0) - 1)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': self.size,
+            'connections_opened': self.connections_opened,
+            'channels_opened': self.channels_opened,
+            'open_channels': sum(self._channels.values()),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+            self._channels = {}
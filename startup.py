@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Startup instrumentation and lazy imports
+Times the dashboard's startup phases and every module imported while
+ImportTimer is active, so the report shows where time to first page goes.
+lazy_import() defers heavy transport libraries (paramiko, requests) to the
+first job that uses them; the deferred load is reported as well. `ready` is
+set once the web server is listening, so the launcher can open the browser
+then instead of after a fixed sleep.
+"""
+
+import sys
+import time
+import builtins
+import itertools
+import importlib
+import importlib.util
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# The clock starts when this module is first imported (run_dashboard imports it first)
+PROCESS_START = time.perf_counter()
+REPORT_TOP = 15
+# Import tree levels listed in the report (0 = imported directly under time_imports())
+REPORT_DEPTH = 1
+
+ready = threading.Event()
+_phases: List[Tuple[str, float]] = []
+_lazy_loads: Dict[str, Tuple[float, float]] = {}  # name -> (load seconds, seconds since start)
+_lock = threading.Lock()
+
+
+def elapsed() -> float:
+    return time.perf_counter() - PROCESS_START
+
+
+def mark(phase: str) -> None:
+    """Record that phase was reached (first time only)"""
+    with _lock:
+        if all(name != phase for name, _ in _phases):
+            _phases.append((phase, elapsed()))
+
+
+def set_ready() -> None:
+    mark('server listening')
+    ready.set()
+
+
+class ImportTimer:
+    """Records inclusive and self time of each module first imported while active (like -X importtime)"""
+
+    def __init__(self):
+        self.modules: Dict[str, dict] = {}
+        self._local = threading.local()
+        self._order = itertools.count()
+        self._original = None
+
+    def _absolute(self, name, globals, level) -> str:
+        if not level:
+            return name
+        try:
+            package = (globals or {}).get('__package__') or (globals or {}).get('__name__', '')
+            return importlib.util.resolve_name('.' * level + name, package)
+        except (ImportError, ValueError):
+            return name
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        absolute = self._absolute(name, globals, level)
+        if absolute in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        order = next(self._order)
+        start = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            took = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += took
+            if absolute in sys.modules and absolute not in self.modules:
+                self.modules[absolute] = {'seconds': took, 'self': took - children, 'depth': len(stack),
+                                         'order': order}
+
+    def __enter__(self) -> 'ImportTimer':
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+        return self
+
+    def __exit__(self, *exc) -> None:
+        builtins.__import__ = self._original
+
+
+_import_timer: Optional[ImportTimer] = None
+
+
+def time_imports() -> ImportTimer:
+    """ImportTimer whose results go into report()"""
+    global _import_timer
+    _import_timer = ImportTimer()
+    return _import_timer
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access"""
+
+    __slots__ = ('_lazy_name', '_lazy_module', '_lazy_lock')
+
+    def __init__(self, name: str):
+        object.__setattr__(self, '_lazy_name', name)
+        object.__setattr__(self, '_lazy_module', None)
+        object.__setattr__(self, '_lazy_lock', threading.Lock())
+
+    def _load(self):
+        with self._lazy_lock:
+            if self._lazy_module is None:
+                start = time.perf_counter()
+                module = importlib.import_module(self._lazy_name)
+                took = time.perf_counter() - start
+                with _lock:
+                    _lazy_loads.setdefault(self._lazy_name, (took, elapsed()))
+                object.__setattr__(self, '_lazy_module', module)
+        return self._lazy_module
+
+    def __getattr__(self, attr):
+        return getattr(self._lazy_module or self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._lazy_module or self._load(), attr, value)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self._lazy_module is not None else 'not loaded'
+        return f"<lazy module {self._lazy_name!r} ({state})>"
+
+
+def lazy_import(name: str):
+    """The module itself if already imported, else a LazyModule; ImportError now if it is not installed"""
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    return LazyModule(name)
+
+
+def report() -> dict:
+    """Phases, slowest imports and deferred loads, in milliseconds"""
+    def ms(seconds: float) -> float:
+        return round(seconds * 1000, 1)
+
+    with _lock:
+        phases = list(_phases)
+        lazy = dict(_lazy_loads)
+    result = {'phases': [{'phase': name, 'at_ms': ms(at)} for name, at in phases],
+              'lazy_loads': [{'module': name, 'ms': ms(took), 'at_ms': ms(at)}
+                             for name, (took, at) in sorted(lazy.items(), key=lambda item: item[1][1])]}
+    if _import_timer is not None:
+        modules = _import_timer.modules
+        result['imports_ms'] = ms(sum(m['seconds'] for m in modules.values() if m['depth'] == 0))
+        # In the order the imports started, so each module is followed by what it imported
+        result['imports'] = [
+            {'module': name, 'ms': ms(m['seconds']), 'depth': m['depth']}
+            for name, m in sorted(modules.items(), key=lambda item: item[1]['order']) if m['depth'] <= REPORT_DEPTH]
+        result['slowest_imports'] = [
+            {'module': name, 'self_ms': ms(m['self']), 'ms': ms(m['seconds'])}
+            for name, m in sorted(modules.items(), key=lambda item: -item[1]['self'])[:REPORT_TOP]]
+    return result
+
+
+def format_report() -> str:
+    data = report()
+    lines = ["Startup report:"]
+    for phase in data['phases']:
+        lines.append(f"  {phase['at_ms']:8.1f} ms  {phase['phase']}")
+    if 'imports' in data:
+        lines.append(f"  Imports ({data['imports_ms']:.1f} ms):")
+        for item in data['imports']:
+            lines.append(f"    {item['ms']:8.1f} ms  {'  ' * item['depth']}{item['module']}")
+        lines.append("  Slowest modules (self time):")
+        for item in data['slowest_imports']:
+            lines.append(f"    {item['self_ms']:8.1f} ms  {item['module']}")
+    for item in data['lazy_loads']:
+        lines.append(f"  Deferred: {item['module']} loaded in {item['ms']:.1f} ms at {item['at_ms']:.1f} ms")
+    return '\n'.join(lines)
@@ -1,10 +1,14 @@
 let currentJobId = null;
 let logInterval = null;
+let logStream = null;
 let settingsSaveTimeout = null;
+let historyOffset = 0;
+const HISTORY_PAGE_SIZE = 20;
 
 // Terminal functionality
 let currentTerminalSession = null;
-let terminalInterval = null;
+let terminalCursor = null;
+let terminalPollGeneration = 0;
 
 function showStatus(msg, type='info') {
     const el = document.getElementById('job-status');
@@ -16,7 +20,7 @@ function startJob(jobType) {
     fetch('/run_job', {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({job_type: jobType})
+        body: JSON.stringify({job_type: jobType, profile: document.getElementById('job-profile').value || null})
     })
     .then(r => r.json())
     .then(data => {
@@ -47,7 +51,8 @@ function startJob(jobType) {
                 
                 showStatus('ETX commands running in terminal - you can add more commands after completion', 'info');
             } else {
-                pollLog();
+                document.getElementById('cancel-job').disabled = false;
+                streamLog();
             }
         } else {
             showStatus('Failed to start job', 'danger');
@@ -55,6 +60,49 @@ function startJob(jobType) {
     });
 }
 
+function finishJob(status) {
+    document.getElementById('cancel-job').disabled = true;
+    if (status === 'success') {
+        showStatus('Job finished successfully!', 'success');
+    } else if (status === 'cancelled') {
+        showStatus('Job cancelled.', 'warning');
+    } else {
+        showStatus('Job failed!', 'danger');
+    }
+    updateHistory();
+}
+
+// Stream only new log text and status changes; falls back to polling without EventSource
+function streamLog() {
+    if (!currentJobId) return;
+    if (!window.EventSource) {
+        pollLog();
+        return;
+    }
+    clearInterval(logInterval);
+    if (logStream) logStream.close();
+    const logEl = document.getElementById('job-log');
+    logEl.textContent = '';
+    logStream = new EventSource(`/job_stream/${currentJobId}`);
+    logStream.addEventListener('log', e => {
+        const atBottom = logEl.scrollTop + logEl.clientHeight >= logEl.scrollHeight - 5;
+        logEl.appendChild(document.createTextNode(JSON.parse(e.data).text));
+        if (atBottom) logEl.scrollTop = logEl.scrollHeight;
+    });
+    logStream.addEventListener('status', e => {
+        const status = JSON.parse(e.data).status;
+        if (status === 'queued') {
+            showStatus('Job queued: ' + currentJobId, 'info');
+        } else if (status === 'running') {
+            showStatus('Job running: ' + currentJobId, 'success');
+        } else {
+            logStream.close();
+            logStream = null;
+            finishJob(status);
+        }
+    });
+}
+
 function pollLog() {
     if (!currentJobId) return;
     clearInterval(logInterval);
@@ -70,42 +118,69 @@ function pollLog() {
         fetch(`/job_status/${currentJobId}`)
             .then(r => r.json())
             .then(data => {
-                if (data.status === 'success') {
-                    showStatus('Job finished successfully!', 'success');
-                    clearInterval(logInterval);
-                    updateHistory();
-                } else if (data.status === 'error') {
-                    showStatus('Job failed!', 'danger');
+                if (['success', 'error', 'cancelled'].includes(data.status)) {
                     clearInterval(logInterval);
-                    updateHistory();
+                    finishJob(data.status);
                 }
             });
     }, 1500);
 }
 
+function cancelJob() {
+    if (!currentJobId) return;
+    fetch(`/cancel_job/${currentJobId}`, {method: 'POST'})
+        .then(r => r.json())
+        .then(data => {
+            if (data.success) {
+                showStatus('Cancelling ' + currentJobId + '...', 'warning');
+            } else {
+                showStatus(data.error || 'Could not cancel job', 'danger');
+            }
+        });
+}
+
+function formatDuration(seconds) {
+    if (seconds === null || seconds === undefined) return '';
+    if (seconds < 60) return seconds.toFixed(1) + 's';
+    return Math.floor(seconds / 60) + 'm ' + Math.round(seconds % 60) + 's';
+}
+
 function updateHistory() {
-    fetch('/job_history')
+    const params = new URLSearchParams({limit: HISTORY_PAGE_SIZE, offset: historyOffset});
+    const type = document.getElementById('history-type').value;
+    const status = document.getElementById('history-status').value;
+    if (type) params.set('type', type);
+    if (status) params.set('status', status);
+    fetch(`/job_history?${params}`)
         .then(r => r.json())
         .then(data => {
             const tbody = document.querySelector('#history-table tbody');
             tbody.innerHTML = '';
-            for (const job of data.history.reverse()) {
+            for (const job of data.history) {
                 const tr = document.createElement('tr');
                 tr.innerHTML = `
                     <td>${job.type}</td>
                     <td>${job.start}</td>
                     <td>${job.end}</td>
-                    <td><span class="badge bg-${job.status === 'success' ? 'success' : (job.status === 'error' ? 'danger' : 'secondary')}">${job.status}</span></td>
-                    <td><a href="/download_log/${job.id}" class="btn btn-sm btn-outline-secondary">Log</a></td>
+                    <td>${formatDuration(job.duration)}</td>
+                    <td><span class="badge bg-${job.status === 'success' ? 'success' : (job.status === 'error' ? 'danger' : (job.status === 'cancelled' ? 'warning' : 'secondary'))}">${job.status}</span></td>
+                    <td><a href="/download_log/${job.id}" class="btn btn-sm btn-outline-secondary">Log</a>${(job.profiles || []).map(kind =>
+                        ` <a href="/download_profile/${job.id}/${kind}" class="btn btn-sm btn-outline-info">${kind}</a>`).join('')}</td>
                 `;
                 tbody.appendChild(tr);
             }
+            const last = Math.min(data.offset + data.history.length, data.total);
+            document.getElementById('history-page').textContent =
+                data.total ? `${data.offset + 1}-${last} of ${data.total}` : 'No jobs';
+            document.getElementById('history-newer').disabled = historyOffset === 0;
+            document.getElementById('history-older').disabled = last >= data.total;
         });
 }
 
 function setJobButtonsEnabled(enabled) {
     document.getElementById('run-github-to-local').disabled = !enabled;
     document.getElementById('run-local-to-etx').disabled = !enabled;
+    document.getElementById('run-watch').disabled = !enabled;
     document.getElementById('run-etx-commands').disabled = !enabled;
     document.getElementById('delete-local-folders').disabled = !enabled;
     document.getElementById('run-pipeline').disabled = !enabled;
@@ -222,7 +297,7 @@ function stopTerminal() {
     .then(data => {
         if (data.success) {
             setTerminalStatus('Disconnected', 'secondary');
-            clearInterval(terminalInterval);
+            terminalPollGeneration++;
             currentTerminalSession = null;
             
             // Hide input container
@@ -265,22 +340,36 @@ function sendTerminalCommand() {
     });
 }
 
+// Long-poll with a cursor: each response carries only output after our cursor
 function pollTerminalOutput() {
     if (!currentTerminalSession) return;
     
-    clearInterval(terminalInterval);
-    terminalInterval = setInterval(() => {
-        fetch(`/terminal/output/${currentTerminalSession}`)
+    const session = currentTerminalSession;
+    const generation = ++terminalPollGeneration;
+    terminalCursor = null;
+    
+    const poll = () => {
+        if (generation !== terminalPollGeneration || session !== currentTerminalSession) return;
+        const url = terminalCursor === null
+            ? `/terminal/output/${session}?cursor=0`
+            : `/terminal/output/${session}?cursor=${terminalCursor}&wait=25`;
+        fetch(url)
             .then(r => r.json())
             .then(data => {
+                if (generation !== terminalPollGeneration) return;
                 if (data.output !== undefined) {
-                    showTerminalOutput(data.output);
+                    if (data.reset || terminalCursor === null) {
+                        showTerminalOutput(data.output);
+                    } else if (data.output) {
+                        appendTerminalOutput(data.output);
+                    }
+                    terminalCursor = data.cursor;
                 }
                 
                 // Check if session is still active
                 if (!data.active && currentTerminalSession) {
                     setTerminalStatus('Finished', 'info');
-                    clearInterval(terminalInterval);
+                    terminalPollGeneration++;
                     
                     // Reset terminal buttons after session ends
                     setTimeout(() => {
@@ -299,12 +388,23 @@ function pollTerminalOutput() {
                         document.getElementById('terminal-input').disabled = false;
                         document.getElementById('send-command').disabled = false;
                     }, 2000); // Wait 2 seconds before resetting
+                    return;
                 }
+                poll();
             })
             .catch(err => {
                 console.error('Terminal polling error:', err);
+                setTimeout(poll, 2000);
             });
-    }, 1000);
+    };
+    poll();
+}
+
+function appendTerminalOutput(text) {
+    const output = document.getElementById('terminal-output');
+    const atBottom = output.scrollTop + output.clientHeight >= output.scrollHeight - 5;
+    output.appendChild(document.createTextNode(text));
+    if (atBottom) output.scrollTop = output.scrollHeight;
 }
 
 function showTerminalOutput(text) {
@@ -320,9 +420,27 @@ window.onload = function() {
     // Set up job button handlers
     document.getElementById('run-github-to-local').onclick = () => startJob('github_to_local');
     document.getElementById('run-local-to-etx').onclick = () => startJob('local_to_etx');
+    document.getElementById('run-watch').onclick = () => startJob('watch');
     document.getElementById('run-etx-commands').onclick = () => startJob('run_etx_commands');
     document.getElementById('delete-local-folders').onclick = () => startJob('delete_local_folders');
     document.getElementById('run-pipeline').onclick = () => startJob('pipeline');
+    document.getElementById('cancel-job').onclick = cancelJob;
+    
+    // History paging and filters
+    document.getElementById('history-newer').onclick = () => {
+        historyOffset = Math.max(0, historyOffset - HISTORY_PAGE_SIZE);
+        updateHistory();
+    };
+    document.getElementById('history-older').onclick = () => {
+        historyOffset += HISTORY_PAGE_SIZE;
+        updateHistory();
+    };
+    for (const id of ['history-type', 'history-status']) {
+        document.getElementById(id).onchange = () => {
+            historyOffset = 0;
+            updateHistory();
+        };
+    }
     
     // Set up terminal button handlers
     document.getElementById('start-interactive').onclick = () => startTerminal('interactive');
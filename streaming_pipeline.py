@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Streaming pipeline
+Overlaps the pipeline stages: while the archive downloads, the SFTP session is
+opened and the remote target directories are prepared; then every file is
+uploaded as soon as it has been extracted and copied, instead of after the whole
+tree is done. Files pass from the extractor to the uploaders through a bounded
+queue, so a slow link throttles extraction instead of letting it run ahead.
+"""
+
+import os
+import time
+import queue
+import posixpath
+import shutil
+import zipfile
+import threading
+from typing import List, Optional, Tuple
+
+import job_context
+import fast_delete
+import metrics
+import profiling
+from command_cache import command_cache
+from startup import lazy_import
+import path_filter
+from Github_to_Local_to_ETX import (load_settings, download_github_zip, github_zip_url_from_project_url,
+                                    archive_prefix, sftp_upload_file, sftp_makedirs)
+
+paramiko = lazy_import('paramiko')
+
+QUEUE_SIZE = 64
+UPLOAD_WORKERS = 2
+DOWNLOAD_RETRIES = 5
+
+_DONE = None  # end-of-stream marker, one per uploader
+
+
+def _safe_join(base: str, rel: str) -> Optional[str]:
+    """base/rel, or None when rel would escape base (zip slip)"""
+    path = os.path.normpath(os.path.join(base, rel))
+    return path if os.path.commonpath([os.path.abspath(path), os.path.abspath(base)]) == os.path.abspath(base) else None
+
+
+class _Uploader:
+    """SFTP channels on one SSH transport, each fed from the shared file queue"""
+
+    def __init__(self, settings, local_dir: str, remote_dirs: List[str], workers: int):
+        self.local_dir = local_dir
+        self.remote_dirs = remote_dirs
+        self.workers = workers
+        self.queue: 'queue.Queue[Optional[Tuple[str, bool]]]' = queue.Queue(maxsize=QUEUE_SIZE)
+        self.failed = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.ok = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._remote_dirs_made = set()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.ssh = paramiko.SSHClient()
+        self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.settings = settings
+
+    @profiling.traced('sftp_connect')
+    def connect(self) -> None:
+        s = self.settings
+        metrics.connect_ssh(self.ssh, hostname=s["REMOTE_HOST"], port=s["REMOTE_PORT"], username=s["REMOTE_USER"],
+                            password=s["REMOTE_PASS"], timeout=10)
+        sftp = self.ssh.open_sftp()
+        try:
+            for remote_dir in self.remote_dirs:
+                try:
+                    sftp.stat(remote_dir)
+                except FileNotFoundError:
+                    sftp_makedirs(sftp, remote_dir)
+                self._remote_dirs_made.add(remote_dir)
+        finally:
+            sftp.close()
+        print(f"SFTP ready for {len(self.remote_dirs)} remote target(s).")
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            t = threading.Thread(target=job_context.propagate(self._work), name=f"etx-stream-upload-{i + 1}",
+                                 daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def put(self, rel: str, is_dir: bool) -> None:
+        """Hand a file to the uploaders, blocking while the queue is full"""
+        while True:
+            if self.failed.is_set():
+                raise RuntimeError(f"Uploader stopped: {self.error}")
+            job_context.checkpoint()
+            try:
+                self.queue.put((rel, is_dir), timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def finish(self) -> None:
+        """Send one end marker per uploader and wait for them to empty the queue"""
+        for _ in self._threads:
+            while True:
+                try:
+                    self.queue.put(_DONE, timeout=0.5)
+                    break
+                except queue.Full:
+                    if self.failed.is_set():
+                        self._drain()  # uploaders may be gone; nobody else will empty it
+        for t in self._threads:
+            t.join()
+
+    def abort(self) -> None:
+        """Stop the uploaders without waiting for queued files"""
+        self.failed.set()
+        self._drain()
+        self.finish()
+
+    def _mkdir(self, sftp, remote_dir: str) -> None:
+        with self._lock:
+            if remote_dir in self._remote_dirs_made:
+                return
+        # Archives need not list directories before their files, so parents may be missing too
+        parent = posixpath.dirname(remote_dir)
+        if parent and parent != remote_dir:
+            self._mkdir(sftp, parent)
+        try:
+            sftp.stat(remote_dir)
+        except FileNotFoundError:
+            try:
+                sftp.mkdir(remote_dir)
+            except IOError:
+                sftp.stat(remote_dir)  # another uploader created it first
+        with self._lock:
+            self._remote_dirs_made.add(remote_dir)
+
+    @profiling.traced('upload_worker')
+    def _work(self) -> None:
+        try:
+            sftp = self.ssh.open_sftp()
+        except Exception as e:
+            self.error = e
+            self.failed.set()
+            return
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _DONE or self.failed.is_set():
+                    if item is _DONE:
+                        return
+                    continue
+                rel, is_dir = item
+                started = time.time()
+                for remote_dir in self.remote_dirs:
+                    remote_path = f"{remote_dir.rstrip('/')}/{rel}".replace('\\', '/')
+                    if is_dir:
+                        self._mkdir(sftp, remote_path)
+                        continue
+                    self._mkdir(sftp, os.path.dirname(remote_path))
+                    success = sftp_upload_file(sftp, os.path.join(self.local_dir, rel), remote_path)
+                    with self._lock:
+                        if success:
+                            self.ok += 1
+                        else:
+                            self.errors += 1
+                with self._lock:
+                    self.busy_seconds += time.time() - started
+        except BaseException as e:
+            self.error = e
+            self.failed.set()
+        finally:
+            sftp.close()
+
+    def close(self) -> None:
+        self.ssh.close()
+
+
+@profiling.traced('download')
+def _download(zip_url: str, zip_path: str) -> None:
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        try:
+            print(f"[Attempt {attempt}] Downloading {zip_url} to {zip_path}...")
+            download_github_zip(zip_url, zip_path)
+            if not zipfile.is_zipfile(zip_path):
+                raise RuntimeError(f"{zip_path} is not a valid zip archive")
+            return
+        except Exception as e:
+            print(f"[Attempt {attempt}] Error: {e}")
+            if attempt == DOWNLOAD_RETRIES:
+                raise
+            print("Retrying in 2 seconds...")
+            time.sleep(2)
+
+
+@profiling.traced(detail='zip_path')
+def _extract_and_stream(zip_path: str, unzip_dir: str, target_dir: str, uploader: _Uploader,
+                        filters: Optional[path_filter.PathFilter] = None) -> int:
+    """Extract each member filters allows into unzip_dir, copy it to target_dir and queue it for upload"""
+    for path in {unzip_dir, target_dir}:
+        fast_delete.remove(path)
+    os.makedirs(target_dir, exist_ok=True)
+    emitted = 0
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        members = zip_ref.infolist()
+        # GitHub archives hold one top-level folder (e.g. repo-main/); its contents become unzip_dir
+        prefix = archive_prefix(members)
+        for member in members:
+            job_context.checkpoint()
+            rel = member.filename[len(prefix):].rstrip('/')
+            if not rel:
+                continue
+            if filters and not filters.allows(rel, member.is_dir()):
+                continue
+            extracted = _safe_join(unzip_dir, rel)
+            copied = _safe_join(target_dir, rel)
+            if extracted is None or copied is None:
+                print(f"Skipping unsafe archive path: {member.filename}")
+                continue
+            if member.is_dir():
+                os.makedirs(extracted, exist_ok=True)
+                os.makedirs(copied, exist_ok=True)
+            else:
+                os.makedirs(os.path.dirname(extracted), exist_ok=True)
+                with zip_ref.open(member) as src, open(extracted, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                metrics.record('unzip', extracted_files=1)
+                if copied != extracted:
+                    os.makedirs(os.path.dirname(copied), exist_ok=True)
+                    shutil.copy2(extracted, copied)
+                    metrics.record('copy', copied_files=1)
+            uploader.put(rel, member.is_dir())
+            emitted += 1
+    return emitted
+
+
+def streaming_supported(settings) -> bool:
+    """Streaming needs the uploaded directory to be the one the archive is copied into
+
+    Snapshot deployments (DEPLOY_MODE=snapshot) stage whole releases, so they run sequentially.
+    """
+    if str(settings.get("DEPLOY_MODE", "inplace")).lower() == "snapshot":
+        return False
+    source, target = settings.get("LOCAL_SOURCE_DIR"), settings.get("LOCAL_TARGET_DIR")
+    return bool(source and target) and os.path.abspath(source) == os.path.abspath(target)
+
+
+@profiling.traced()
+def run_streaming_pipeline(upload_workers: Optional[int] = None) -> bool:
+    """Download, extract/copy and upload with overlapping stages; returns True if every file uploaded"""
+    settings = load_settings()
+    zip_url = github_zip_url_from_project_url(settings["PROJECT_URL"])
+    zip_path = settings["ZIP_PATH"]
+    unzip_dir = settings["UNZIP_DIR"]
+    target_dir = settings["LOCAL_TARGET_DIR"]
+    remote_dirs = list(settings["REMOTE_TARGET_DIRS"])
+    workers = upload_workers or int(settings.get("PIPELINE_UPLOAD_WORKERS", UPLOAD_WORKERS))
+    started = time.time()
+
+    uploader = _Uploader(settings, target_dir, remote_dirs, workers)
+    # SSH handshake, auth and remote mkdirs run while the archive downloads
+    connect_error: List[BaseException] = []
+
+    def connect():
+        try:
+            uploader.connect()
+        except BaseException as e:
+            connect_error.append(e)
+    connector = threading.Thread(target=job_context.propagate(connect), name='etx-stream-connect', daemon=True)
+    connector.start()
+    try:
+        _download(zip_url, zip_path)
+        downloaded = time.time()
+        connector.join()
+        if connect_error:
+            raise RuntimeError(f"Unable to establish SFTP session: {connect_error[0]}")
+        print(f"Streaming {zip_path} into {target_dir} and {len(remote_dirs)} remote target(s) "
+              f"with {workers} uploader(s)...")
+        # 'upload' spans the whole overlapped phase; 'unzip' is extract+copy, including queue waits
+        with metrics.stage('upload') as upload_stage:
+            uploader.start()
+            try:
+                with metrics.stage('unzip'):
+                    emitted = _extract_and_stream(zip_path, unzip_dir, target_dir, uploader,
+                                                  path_filter.from_settings(settings))
+            except BaseException:
+                uploader.abort()
+                raise
+            extracted = time.time()
+            uploader.finish()
+            if uploader.failed.is_set():
+                raise RuntimeError(f"Upload failed: {uploader.error}")
+            if uploader.errors:
+                upload_stage.outcome = 'partial'
+    finally:
+        connector.join()
+        uploader.close()
+        # Remote listings cached for the dashboard terminal are stale now
+        command_cache.invalidate_host(settings["REMOTE_HOST"])
+    finished = time.time()
+    print(f"Upload summary: {uploader.ok} file uploads succeeded, {uploader.errors} failed "
+          f"({emitted} archive entries streamed).")
+    print(f"Stage times: download {downloaded - started:.1f}s, extract+copy {extracted - downloaded:.1f}s, "
+          f"upload busy {uploader.busy_seconds / workers:.1f}s per uploader, "
+          f"extract-to-upload-done {finished - downloaded:.1f}s, total {finished - started:.1f}s")
+    return uploader.errors == 0
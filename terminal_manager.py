@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Terminal session manager
+Owns the dashboard's terminal sessions and their transcripts. Idle sessions are
+reaped after a TTL, the session count is capped with least-recently-used
+eviction, and transcripts are spilled to disk when they grow large or the
+session closes, so a week of terminal use no longer grows the process.
+"""
+
+import os
+import time
+import queue
+import logging
+import bisect
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IDLE_TTL = 30 * 60
+# Stopped sessions stay in memory this long so the browser can fetch the final output
+STOPPED_TTL = 60
+MAX_SESSIONS = 20
+MAX_TRANSCRIPT_CHARS = 1024 * 1024
+REAP_INTERVAL = 30
+# Closed sessions remembered (transcript path and final cursor) for late readers
+MAX_CLOSED = 1000
+
+
+class TerminalSessionManager:
+    """Terminal sessions with idle expiry, LRU eviction and transcript spill-to-disk"""
+
+    def __init__(self, spill_dir: str, idle_ttl: float = IDLE_TTL, max_sessions: int = MAX_SESSIONS,
+                 max_transcript_chars: int = MAX_TRANSCRIPT_CHARS, stopped_ttl: float = STOPPED_TTL):
+        self.spill_dir = spill_dir
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max(1, max_sessions)
+        self.max_transcript_chars = max_transcript_chars
+        self.stopped_ttl = stopped_ttl
+        os.makedirs(spill_dir, exist_ok=True)
+        self.sessions: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()  # least recently used first
+        self.outputs: Dict[str, str] = {}  # in-memory tail of each transcript
+        self.output_base: Dict[str, int] = {}  # cursor of the first character still held in outputs
+        self._closed: 'OrderedDict[str, int]' = OrderedDict()  # session_id -> final cursor
+        # (cursor, byte offset) at the start of each spilled segment, so reads can seek into the file
+        self._spill_marks: Dict[str, List[Tuple[int, int]]] = {}
+        # Notified on output appends, clears and session state changes
+        self.updated = threading.Condition()
+        self._reaper: Optional[threading.Thread] = None
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.spilled_chars = 0
+
+    def spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{session_id}.log")
+
+    # ---------- lifecycle ----------
+
+    def create(self, session_id: str, executor, mode: str) -> Dict[str, Any]:
+        """Register a session, evicting the least recently used one when at capacity"""
+        with self.updated:
+            while len(self.sessions) >= self.max_sessions:
+                # Prefer stopped sessions; otherwise the longest unused one goes
+                victim = next((sid for sid, s in self.sessions.items() if not s['active']),
+                              next(iter(self.sessions)))
+                self._write(victim, "\n⏏️ Session closed to make room for a new one.\n")
+                self._close(victim)
+                self.evicted += 1
+            now = time.time()
+            session = self.sessions[session_id] = {
+                'executor': executor,
+                'input_queue': queue.Queue(),
+                'output_queue': queue.Queue(),
+                'active': True,
+                'mode': mode,
+                'thread': None,
+                'tasks': set(),  # futures of the session's work on the async backend's event loop
+                'created': now,
+                'last_used': now,
+            }
+            self.outputs[session_id] = ''
+            self.output_base[session_id] = 0
+            self.created += 1
+        self._ensure_reaper()
+        return session
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Live session by id, marking it as recently used"""
+        with self.updated:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session['last_used'] = time.time()
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def set_inactive(self, session_id: str) -> None:
+        with self.updated:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session['active'] = False
+                session['last_used'] = time.time()
+            self.updated.notify_all()
+
+    def close(self, session_id: str) -> None:
+        with self.updated:
+            self._close(session_id)
+
+    def _close(self, session_id: str) -> None:
+        """Spill the transcript, drop the session and stop its executor's shell or event loop task"""
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return
+        session['active'] = False
+        # Ends the executor's shell loop, which closes the channel and releases its transport
+        session['executor'].shell_active = False
+        for task in list(session['tasks']):
+            task.cancel()
+        output = self.outputs.pop(session_id, '')
+        self._spill(session_id, output)
+        self._closed[session_id] = self.output_base.pop(session_id, 0) + len(output)
+        while len(self._closed) > MAX_CLOSED:
+            old_id, _ = self._closed.popitem(last=False)
+            self._spill_marks.pop(old_id, None)
+            try:
+                os.remove(self.spill_path(old_id))
+            except OSError:
+                pass
+        self.updated.notify_all()
+
+    def _spill(self, session_id: str, text: str) -> None:
+        if not text:
+            return
+        marks = self._spill_marks.setdefault(session_id, [(0, 0)])
+        cursor, offset = marks[-1]
+        data = text.encode('utf-8')
+        try:
+            with open(self.spill_path(session_id), 'ab') as f:
+                f.write(data)
+            marks.append((cursor + len(text), offset + len(data)))
+            self.spilled_chars += len(text)
+        except OSError as e:
+            logger.error(f"Failed to spill terminal transcript {session_id}: {e}")
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap_loop, name='etx-terminal-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        while True:
+            time.sleep(REAP_INTERVAL)
+            self.reap()
+
+    def reap(self) -> int:
+        """Close sessions idle past the TTL (stopped sessions after a short grace); returns count"""
+        now = time.time()
+        with self.updated:
+            expired = [sid for sid, s in self.sessions.items()
+                       if now - s['last_used'] > (self.idle_ttl if s['active'] else self.stopped_ttl)]
+            for sid in expired:
+                self._close(sid)
+            self.expired += len(expired)
+        if expired:
+            logger.info(f"Closed {len(expired)} idle terminal session(s)")
+        return len(expired)
+
+    # ---------- transcript ----------
+
+    def write(self, session_id: str, text: str) -> None:
+        """Append to a session transcript and wake long-polling readers (no-op once closed)"""
+        with self.updated:
+            self._write(session_id, text)
+
+    def _write(self, session_id: str, text: str) -> None:
+        if session_id not in self.outputs:
+            return
+        output = self.outputs[session_id] + text
+        if len(output) > self.max_transcript_chars:
+            # Older half goes to disk; readers behind the new base get a reset
+            cut = len(output) - self.max_transcript_chars // 2
+            self._spill(session_id, output[:cut])
+            self.output_base[session_id] += cut
+            output = output[cut:]
+        self.outputs[session_id] = output
+        # Output from a running command keeps the session alive
+        self.sessions[session_id]['last_used'] = time.time()
+        self.updated.notify_all()
+
+    def reset(self, session_id: str, text: str = '') -> None:
+        """Replace the transcript (new session or 'clear'); cursors keep increasing across resets"""
+        with self.updated:
+            if session_id not in self.outputs:
+                return
+            self._spill(session_id, self.outputs[session_id])
+            self.output_base[session_id] += len(self.outputs[session_id])
+            self.outputs[session_id] = text
+            self.updated.notify_all()
+
+    def exists(self, session_id: str) -> bool:
+        return session_id in self.outputs or session_id in self._closed
+
+    def read(self, session_id: str, cursor: Optional[int] = None, wait: float = 0) -> Dict[str, Any]:
+        """Output after cursor (all held output when cursor is None), long-polling up to wait seconds"""
+        deadline = time.time() + wait
+        with self.updated:
+            # Polling alone doesn't count as use, so an abandoned open tab still expires
+            session = self.sessions.get(session_id)
+            was_active = bool(session and session['active'])
+            closed = False
+            while True:
+                if session_id not in self.outputs:
+                    # Snapshot under the lock; the spill file is read after it is released
+                    closed = True
+                    end = self._closed.get(session_id, 0)
+                    marks = list(self._spill_marks.get(session_id, [(0, 0)]))
+                    break
+                base = self.output_base[session_id]
+                output = self.outputs[session_id]
+                end = base + len(output)
+                active = self.sessions[session_id]['active']
+                remaining = deadline - time.time()
+                if cursor is None or cursor != end or active != was_active or remaining <= 0:
+                    break
+                self.updated.wait(remaining)
+        if closed:
+            return self._read_closed(session_id, cursor, end, marks)
+        if cursor is None:
+            return {'output': output, 'cursor': end, 'active': active}
+        reset = cursor < base or cursor > end
+        return {'output': output if reset else output[cursor - base:], 'cursor': end, 'reset': reset,
+                'active': active}
+
+    def _read_closed(self, session_id: str, cursor: Optional[int], end: int,
+                     marks: List[Tuple[int, int]]) -> Dict[str, Any]:
+        """Closed sessions are served from the spilled transcript, at most max_transcript_chars of it
+
+        A reader further behind than that (or without a cursor) gets a reset with the tail,
+        like a live reader whose cursor fell behind the in-memory base.
+        """
+        if cursor == end:
+            return {'output': '', 'cursor': end, 'reset': False, 'active': False}
+        reset = cursor is None or cursor > end or end - cursor > self.max_transcript_chars
+        start = max(0, end - self.max_transcript_chars) if reset else cursor
+        mark_cursor, offset = marks[bisect.bisect_right(marks, (start, float('inf'))) - 1]
+        try:
+            # newline='' keeps the \r in PTY \r\n output, so character offsets match the cursors
+            with open(self.spill_path(session_id), 'r', encoding='utf-8', newline='') as f:
+                f.seek(offset)
+                # Marks are at most one spilled segment apart, so the skip is bounded too
+                f.read(start - mark_cursor)
+                text = f.read(end - start)
+        except OSError:
+            text = ''
+        return {'output': text, 'cursor': end, 'reset': reset, 'active': False}
+
+    # ---------- metrics ----------
+
+    def stats(self) -> Dict[str, Any]:
+        with self.updated:
+            now = time.time()
+            return {
+                'live_sessions': len(self.sessions),
+                'active_sessions': sum(1 for s in self.sessions.values() if s['active']),
+                'max_sessions': self.max_sessions,
+                'transcript_chars_in_memory': sum(len(o) for o in self.outputs.values()),
+                'spilled_chars': self.spilled_chars,
+                'closed_sessions_on_disk': len(self._closed),
+                'created': self.created,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'idle_ttl': self.idle_ttl,
+                'oldest_idle_seconds': round(max((now - s['last_used'] for s in self.sessions.values()),
+                                                 default=0), 1),
+            }
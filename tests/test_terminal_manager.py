@@ -0,0 +1,35 @@
+"""Closed-session reads from the spilled terminal transcript"""
+
+import types
+
+from terminal_manager import TerminalSessionManager
+
+
+def _closed_session(tmp_path, chunks, **kwargs):
+    manager = TerminalSessionManager(str(tmp_path), **kwargs)
+    manager.create('s', types.SimpleNamespace(shell_active=True), 'interactive')
+    for chunk in chunks:
+        manager.write('s', chunk)
+    manager.close('s')
+    return manager
+
+
+def test_closed_read_keeps_crlf(tmp_path):
+    manager = _closed_session(tmp_path, ['a\r\nb\r\nc\r\nd'])
+    assert manager.read('s', 3) == {'output': 'b\r\nc\r\nd', 'cursor': 10, 'reset': False, 'active': False}
+    assert manager.read('s', None)['output'] == 'a\r\nb\r\nc\r\nd'
+    assert manager.read('s', 10)['output'] == ''
+
+
+def test_closed_read_seeks_across_spilled_segments(tmp_path):
+    chunks = [f"é{i}✓\r\n" for i in range(50)]
+    full = ''.join(chunks)
+    manager = _closed_session(tmp_path, chunks, max_transcript_chars=100)
+    end = len(full)
+    for cursor in (end - 3, end - 57, end - 100):
+        result = manager.read('s', cursor)
+        assert result['output'] == full[cursor:] and not result['reset']
+    # Readers further behind than max_transcript_chars get the tail
+    for cursor in (None, 0, end - 101, end + 5):
+        result = manager.read('s', cursor)
+        assert result['output'] == full[-100:] and result['reset'] and result['cursor'] == end